@@ -7,7 +7,8 @@ from Cocoa import (
     NSWindowStyleMaskMiniaturizable, NSWindowStyleMaskResizable, NSBackingStoreBuffered,
     NSApplicationActivationPolicyRegular, NSFont, NSColor, NSPasteboard,
     NSStringPboardType, NSLayoutConstraint, NSLayoutConstraintOrientationHorizontal,
-    NSMutableAttributedString, NSMakeSize, NSMakeRect, NSMakeRange,
+    NSMutableAttributedString, NSAttributedString, NSFontAttributeName, NSForegroundColorAttributeName,
+    NSMakeSize, NSMakeRect, NSMakeRange,
     NSUserInterfaceLayoutOrientationHorizontal, NSBoxCustom, NSMomentaryPushInButton, NSControlSizeLarge,
     NSBezelStyleShadowlessSquare, NSImageOnly, NSFocusRingTypeNone, NSBezelStyleRounded, NSProgressIndicatorStyleSpinning,
     NSTextLayoutOrientationHorizontal, NSLineBreakByTruncatingMiddle, NSFontWeightMedium,
@@ -20,7 +21,8 @@ from Cocoa import (
     NSUserDefaults
 )
 from AppKit import (
-    NSTableView, NSTableColumn, NSImageSymbolConfiguration, NSBeep
+    NSMenu, NSMenuItem,
+    NSTableView, NSTableColumn, NSImageSymbolConfiguration, NSBeep, NSAlertFirstButtonReturn
 )
 from UserNotifications import (
     UNUserNotificationCenter,
@@ -31,50 +33,95 @@ from UserNotifications import (
     UNNotificationPresentationOptionSound,
 )
 from Foundation import (
-    NSMutableIndexSet, NSNotificationCenter, NSBundle
+    NSMutableIndexSet, NSNotificationCenter, NSBundle, NSTimer, NSURL
 )
 import objc
 import os
-import threading
+import shutil
+import time
 from sys import argv
-from datetime import datetime
 from database import MediaDB, DB_FILENAME
-from downloader import Downloader
+from job_queue import JobQueue, JobState
 from user_defaults import UserDefaults
-from models import MediaItem, HistoryFormatter
+from models import HistoryModel
+from logs import LogPipeline
+from events import EventBus, ProgressEvent, ThroughputMetrics, format_rate
+from concurrency import Deferred
+from urls import canonical_id, canonical_url, validate_url, warm_up
 from db_path import db_path
+from naming import sweep_staging
 from notifications import send_notification
 from menu import buildMenus
 from settings import SettingsWindowController
 
+# Sidebar history is loaded a page at a time as the table scrolls
+HISTORY_PAGE_SIZE = 100
+HISTORY_CACHED_PAGES = 16
+# How often the sidebar moves entries that aged into an older group
+HISTORY_REGROUP_INTERVAL = 60.0
+# Log view keeps this many lines and redraws at most this often per second
+LOG_CAPACITY = 5000
+LOG_FPS = 30.0
+# Minimum seconds between status pill updates driven by download progress
+PROGRESS_INTERVAL = 0.5
 
-class DownloaderLogger:
-    def __init__(self, handler):
-        self.content = ""
-        self.handler = handler
 
-    def output(self, text):
-        self.content += text + "\n"
-
-        if "--dev" in argv:
-            print(text)
-
-        self.handler(self.content)
+# -----------------------------
+# Sidebar cells
+# -----------------------------
 
-    def debug(self, msg):
-        self.output(f"{msg}")
+class HistoryGroupCell(NSTableCellView):
+    IDENTIFIER = "historyGroup"
 
-    def info(self, msg):
-        self.output(f"[INFO] {msg}")
+    def init(self):
+        self = objc.super(HistoryGroupCell, self).init()
+        if self is None:
+            return None
+        self.setIdentifier_(self.IDENTIFIER)
+        self.titleLabel = NSTextField.labelWithString_("")
+        self.titleLabel.setFont_(NSFont.boldSystemFontOfSize_(NSFont.systemFontSize()))
+        self.titleLabel.setTextColor_(NSColor.secondaryLabelColor())
+        self.addSubview_(self.titleLabel)
+        self.titleLabel.setTranslatesAutoresizingMaskIntoConstraints_(False)
+        NSLayoutConstraint.activateConstraints_([
+            self.titleLabel.leadingAnchor().constraintEqualToAnchor_constant_(self.leadingAnchor(), 12.0),
+            self.titleLabel.centerYAnchor().constraintEqualToAnchor_(self.centerYAnchor())
+        ])
+        return self
 
-    def warning(self, msg):
-        self.output(f"[WARNING] {msg}")
 
-    def error(self, msg):
-        self.output(f"[ERROR] {msg}")
+class HistoryItemCell(NSTableCellView):
+    IDENTIFIER = "historyItem"
 
-    def reset(self):
-        self.content = ""
+    def init(self):
+        self = objc.super(HistoryItemCell, self).init()
+        if self is None:
+            return None
+        self.setIdentifier_(self.IDENTIFIER)
+        self.titleLabel = NSTextField.labelWithString_("")
+        self.titleLabel.setFont_(NSFont.systemFontOfSize_(12.0))
+        self.titleLabel.setLineBreakMode_(NSLineBreakByTruncatingMiddle)  # byTruncatingMiddle
+        # TODO: add tooltip to title label
+
+        self.subtitleLabel = NSTextField.labelWithString_("")
+        self.subtitleLabel.setFont_(NSFont.systemFontOfSize_(10.0))
+        self.subtitleLabel.setTextColor_(NSColor.secondaryLabelColor())
+
+        title, sub = self.titleLabel, self.subtitleLabel
+        self.addSubview_(title)
+        self.addSubview_(sub)
+        title.setTranslatesAutoresizingMaskIntoConstraints_(False)
+        sub.setTranslatesAutoresizingMaskIntoConstraints_(False)
+        NSLayoutConstraint.activateConstraints_([
+            title.leadingAnchor().constraintEqualToAnchor_constant_(self.leadingAnchor(), 12.0),
+            title.trailingAnchor().constraintEqualToAnchor_constant_(self.trailingAnchor(), -12.0),
+            title.topAnchor().constraintEqualToAnchor_constant_(self.topAnchor(), 6.0),
+            sub.leadingAnchor().constraintEqualToAnchor_(title.leadingAnchor()),
+            sub.trailingAnchor().constraintEqualToAnchor_(title.trailingAnchor()),
+            sub.topAnchor().constraintEqualToAnchor_constant_(title.bottomAnchor(), 0.0),
+            sub.bottomAnchor().constraintEqualToAnchor_constant_(self.bottomAnchor(), -6.0),
+        ])
+        return self
 
 
 # -----------------------------
@@ -92,7 +139,8 @@ class SidebarVC(NSViewController, protocols=[objc.protocolNamed("NSTableViewData
         self.visualEffect = NSVisualEffectView.alloc().init()
 
         self.db = MediaDB(db_path=db_path(DB_FILENAME, dev_env="--dev" in argv))
-        self.data = []
+        # Windowed history: counts up front, entries fetched a page at a time as rows are shown
+        self.model = HistoryModel(self.db, page_size=HISTORY_PAGE_SIZE, max_pages=HISTORY_CACHED_PAGES)
 
         # center = NSNotificationCenter.defaultCenter()
         # center.addObserver_selector_name_object_(
@@ -132,6 +180,12 @@ class SidebarVC(NSViewController, protocols=[objc.protocolNamed("NSTableViewData
         self.table.addTableColumn_(col)
         self.table.setDelegate_(self)
         self.table.setDataSource_(self)
+
+        menu = NSMenu.alloc().initWithTitle_("History")
+        removeItem = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Remove from History", "removeHistoryRow:", "")
+        removeItem.setTarget_(self)
+        menu.addItem_(removeItem)
+        self.table.setMenu_(menu)
         
         # Configure scroll view
         self.scroll.setDocumentView_(self.table)
@@ -157,99 +211,82 @@ class SidebarVC(NSViewController, protocols=[objc.protocolNamed("NSTableViewData
     def viewDidLoad(self):
         objc.super(SidebarVC, self).viewDidLoad()
         self.getHistoryData_(None)
+        self.groupTimer = NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
+            HISTORY_REGROUP_INTERVAL, self, "refreshGroups:", None, True
+        )
 
     # Data source
     def numberOfRowsInTableView_(self, tableView):
-        return len(self.data)
+        return len(self.model)
 
     # Group rows
     def tableView_isGroupRow_(self, tableView, row):
-        return bool(self.data[row].isGroup)
+        return self.model.is_group(row)
 
     def tableView_shouldSelectRow_(self, tableView, row):
-        return self.data[row].isGroup == False
+        return not self.model.is_group(row)
 
-    # Views per row
+    # Views per row, recycled through the table's reuse queue
     def tableView_viewForTableColumn_row_(self, tableView, tableColumn, row):
-        item = self.data[row]
-        v = NSTableCellView.alloc().init()
+        item = self.model.item(row)
         if item.isGroup:
-            label = NSTextField.labelWithString_(item.title)
-            label.setFont_(NSFont.boldSystemFontOfSize_(NSFont.systemFontSize()))
-            label.setTextColor_(NSColor.secondaryLabelColor())
-            v.addSubview_(label)
-            label.setTranslatesAutoresizingMaskIntoConstraints_(False)
-            NSLayoutConstraint.activateConstraints_([
-                label.leadingAnchor().constraintEqualToAnchor_constant_(v.leadingAnchor(), 12.0),
-                label.centerYAnchor().constraintEqualToAnchor_(v.centerYAnchor())
-            ])
+            v = tableView.makeViewWithIdentifier_owner_(HistoryGroupCell.IDENTIFIER, self)
+            if v is None:
+                v = HistoryGroupCell.alloc().init()
+            v.titleLabel.setStringValue_(item.title)
             return v
         else:
-            title = NSTextField.labelWithString_(item.title)
-            title.setFont_(NSFont.systemFontOfSize_(12.0))
-            title.setLineBreakMode_(NSLineBreakByTruncatingMiddle)  # byTruncatingMiddle
-            # TODO: add tooltip to title label
-
-            sub = NSTextField.labelWithString_(item.timestamp)
-            sub.setFont_(NSFont.systemFontOfSize_(10.0))
-            sub.setTextColor_(NSColor.secondaryLabelColor())
-
-            v.addSubview_(title)
-            v.addSubview_(sub)
-            title.setTranslatesAutoresizingMaskIntoConstraints_(False)
-            sub.setTranslatesAutoresizingMaskIntoConstraints_(False)
-            NSLayoutConstraint.activateConstraints_([
-                title.leadingAnchor().constraintEqualToAnchor_constant_(v.leadingAnchor(), 12.0),
-                title.trailingAnchor().constraintEqualToAnchor_constant_(v.trailingAnchor(), -12.0),
-                title.topAnchor().constraintEqualToAnchor_constant_(v.topAnchor(), 6.0),
-                sub.leadingAnchor().constraintEqualToAnchor_(title.leadingAnchor()),
-                sub.trailingAnchor().constraintEqualToAnchor_(title.trailingAnchor()),
-                sub.topAnchor().constraintEqualToAnchor_constant_(title.bottomAnchor(), 0.0),
-                sub.bottomAnchor().constraintEqualToAnchor_constant_(v.bottomAnchor(), -6.0),
-            ])
+            v = tableView.makeViewWithIdentifier_owner_(HistoryItemCell.IDENTIFIER, self)
+            if v is None:
+                v = HistoryItemCell.alloc().init()
+            v.titleLabel.setStringValue_(item.title)
+            v.subtitleLabel.setStringValue_(item.timestamp)
             return v
         
     def addRow_(self, obj):
         if obj is None:
             return
-        
-        idxs = NSMutableIndexSet.indexSet()
 
-        if len(self.data) > 0:
-            firstIndex = self.data[0]
-            addGroup = not (firstIndex.isGroup and firstIndex.title == "Just now")
-        else:
-            addGroup = True
+        obj["ts"] = int(time.time())
+        self.applyHistoryDiff_(self.model.insert_recent(obj["file"], obj["ts"]))
+        self.table.scrollRowToVisible_(0)
 
-        items = [MediaItem.item(obj["file"], datetime.now().strftime("%y/%m/%d, %H:%M:%S"))]
-        if (addGroup):
-            items.insert(0, MediaItem.group("Just now"))
+        # Only queues the row for the writer thread, so it can be done right away
+        self.addHistoryData_(obj)
 
-            self.data[0:0] = items[:2]
+    def removeHistoryRow_(self, sender):
+        row = self.table.clickedRow()
+        if row < 0 or self.model.is_group(row):
+            return
+        self.applyHistoryDiff_(self.model.remove(row))
 
-            idxs.addIndex_(0)
-            idxs.addIndex_(1)
-        else:
-            self.data[1:1] = items
+    def refreshGroups_(self, timer):
+        # Entries age across group boundaries ("Just now" -> "Last 24 hours" -> ...); only headers move
+        self.applyHistoryDiff_(self.model.refresh())
 
-            idxs.addIndex_(1)
+    def applyHistoryDiff_(self, diff):
+        if not diff:
+            return
+        removed = NSMutableIndexSet.indexSet()
+        for row in diff.removed:
+            removed.addIndex_(row)
+        inserted = NSMutableIndexSet.indexSet()
+        for row in diff.inserted:
+            inserted.addIndex_(row)
 
         self.table.beginUpdates()
+        self.table.removeRowsAtIndexes_withAnimation_(removed, NSTableViewAnimationEffectFade)
         self.table.insertRowsAtIndexes_withAnimation_(
-            idxs, (NSTableViewAnimationSlideDown | NSTableViewAnimationEffectFade)
+            inserted, (NSTableViewAnimationSlideDown | NSTableViewAnimationEffectFade)
         )
         self.table.endUpdates()
 
-        self.table.scrollRowToVisible_(0)
-
-        self.performSelectorOnMainThread_withObject_waitUntilDone_("addHistoryData:", obj, False)
-
     def getHistoryData_(self, sender=None):
-        self.data = HistoryFormatter().format(self.db.select_history())
+        self.model.reload()
         self.table.reloadData()
 
     def addHistoryData_(self, obj):
-        self.db.insert_history(obj["file"], obj["url"])
+        self.db.insert_history_async(obj["file"], obj["url"], obj.get("ts"), **obj.get("details", {}))
 
     def _appWillTerminate_(self, note):
         self.db.close()
@@ -375,9 +412,19 @@ class ContentVC(NSViewController):
         self.statusPill = StatusPill.alloc().init()
 
         # Logger / worker
-        self.logger = DownloaderLogger(self._enqueue_log)
+        self.logger = LogPipeline(capacity=LOG_CAPACITY, fps=LOG_FPS, echo="--dev" in argv)
+        self.logger.subscribe(self._enqueue_log)
         self.userDefaults = UserDefaults()
-        self.downloader = Downloader(self.logger)
+        # yt-dlp and ffmpeg load in the background after launch (or on first use), not before the window paints
+        self.events = EventBus()
+        self.engine = Deferred(self._makeDownloader, name="engine", on_ready=self._engineReady)
+        self.metrics = ThroughputMetrics(self.events)
+        self.events.subscribe(self._on_progress, ProgressEvent)
+        self._lastProgress = 0.0
+        self.journal = MediaDB(db_path=db_path(DB_FILENAME, dev_env="--dev" in argv))
+        self.jobQueue = JobQueue(max_workers=self.userDefaults.getMaxConcurrentDownloads(), name="download")
+        self.lookups = JobQueue(max_workers=1, name="lookup")
+        self._resumable = []  # journal rows to re-queue once the engine is up
 
         # Log text view inside a scroll view
         self.logScroll = NSTextView.scrollablePlainDocumentContentTextView()
@@ -386,6 +433,40 @@ class ContentVC(NSViewController):
 
         return self
 
+    def viewDidLoad(self):
+        objc.super(ContentVC, self).viewDidLoad()
+        self.engine.start()
+
+    def _makeDownloader(self):
+        from downloader import Downloader  # pulls in yt_dlp, so only on the warm-up thread
+
+        cacheDir = db_path("cache", dev_env="--dev" in argv)
+        cacheDir.mkdir(parents=True, exist_ok=True)
+        workRoot = db_path("partials", dev_env="--dev" in argv)
+        downloader = Downloader(self.logger, cache_dir=str(cacheDir), work_root=str(workRoot),
+                                fragment_concurrency=self.userDefaults.getFragmentConcurrency(),
+                                adaptive_fragments=self.userDefaults.getAdaptiveFragments(), events=self.events)
+        warm_up()  # so the first duplicate check doesn't compile yt-dlp's URL patterns
+        # Snapshot the journal before `engine.get()` can return: rows an early extract_ adds after this
+        # are its own jobs, not interrupted ones, and their work dirs must not be reclaimed
+        self._resumable = self.journal.journal_unfinished()
+        removed = downloader.reclaim_orphans(keep=[j["work_dir"] for j in self._resumable])
+        if removed:
+            self.logger.info(f"Reclaimed {removed} orphaned temp folder(s).")
+        saveFolder = self.userDefaults.getSaveFolder()
+        swept = sweep_staging(saveFolder)
+        if swept:
+            self.logger.info(f"Removed {swept} unfinished file(s) left in {saveFolder}.")
+        return downloader
+
+    def _engineReady(self, downloader):
+        self.performSelectorOnMainThread_withObject_waitUntilDone_("resumeJournal:", None, False)
+        # Still on the warm-up thread: index history rows from before canonical ids were recorded
+        try:
+            self.journal.backfill_canonical_ids(canonical_id)
+        except Exception as e:
+            self.logger.warning(f"Could not index older history for duplicate detection: {e}")
+
     def viewDidAppear(self):
         objc.super(ContentVC, self).viewDidAppear()
         self.extractButton.setKeyEquivalent_("\r")
@@ -469,6 +550,8 @@ class ContentVC(NSViewController):
         self.logText.setLayoutOrientation_(NSTextLayoutOrientationHorizontal)
         self.logText.setFont_(NSFont.userFixedPitchFontOfSize_(13.0))
         self.logText.setTextColor_(NSColor.labelColor())
+        self.logAttributes = {NSFontAttributeName: self.logText.font(),
+                              NSForegroundColorAttributeName: NSColor.labelColor()}
         self.logText.setDrawsBackground_(False)
         self.logText.setTextContainerInset_(NSMakeSize(10.0, 10.0))
         if self.logText.textContainer() is not None:
@@ -560,12 +643,22 @@ class ContentVC(NSViewController):
             return
         self.urlField.setStringValue_(s)
 
-    def _enqueue_log(self, text):
-        self.performSelectorOnMainThread_withObject_waitUntilDone_("appendLog:", text, False)
-
-    def appendLog_(self, text):
-        self.logText.setString_(text)
-        self.logText.scrollRangeToVisible_(NSMakeRange(len(text), 0))
+    def _enqueue_log(self, delta):
+        self.performSelectorOnMainThread_withObject_waitUntilDone_("appendLog:", delta, False)
+
+    def appendLog_(self, delta):
+        # Deltas only: trim what fell out of the ring, append the new lines
+        storage = self.logText.textStorage()
+        storage.beginEditing()
+        if delta.reset:
+            storage.deleteCharactersInRange_(NSMakeRange(0, storage.length()))
+        if delta.dropped:
+            storage.deleteCharactersInRange_(NSMakeRange(0, min(delta.dropped, storage.length())))
+        if delta.text:
+            storage.appendAttributedString_(
+                NSAttributedString.alloc().initWithString_attributes_(delta.text, self.logAttributes))
+        storage.endEditing()
+        self.logText.scrollRangeToVisible_(NSMakeRange(storage.length(), 0))
 
     def extract_(self, sender):
         text = self.urlField.stringValue().strip()
@@ -573,38 +666,182 @@ class ContentVC(NSViewController):
             NSBeep()
             return
 
-        if not text.lower().startswith("https://"):  # TODO: add proper validation
+        try:
+            text = validate_url(text)
+        except ValueError as e:
             alert = NSAlert.alloc().init()
             alert.setMessageText_("Invalid URL")
-            alert.setInformativeText_("Please enter a valid URL.")
+            alert.setInformativeText_(str(e))
             alert.addButtonWithTitle_("OK")
             alert.runModal()
             return
 
-        self.statusPill.setKind_message_(StatusPill.KindProgress, "Downloading")
-        self.logger.reset()
-        self.logger.info("Extract started.")
-        self.setBusy_(True)
-        threading.Thread(target=self._download_thread, args=(text,), daemon=True).start()
+        # Waiting for the engine and the duplicate lookup (a history flush and query) happen off the
+        # main thread; one worker, so checks and submissions keep the order the user asked in
+        self.lookups.submit(self._queueExtract, text)
 
-    def _download_thread(self, url):
+    def _queueExtract(self, job, url):
+        """Lookup queue: queue `url` unless it is a duplicate the user doesn't want again."""
         try:
-            normalization = self.userDefaults.getNormalization()
-            self.logger.info(f"Using normalization: {normalization}")
-
-            path = self.downloader.download(url, normalization=normalization)
-            self.logger.info(f"Download finished successfully: {path}")
-            send_notification("Download Completed", os.path.basename(path))
+            downloader = self.engine.get()
+        except Exception as e:
+            self.logger.error(f"Download engine failed to load: {e}")
+            self.performSelectorOnMainThread_withObject_waitUntilDone_("extractFailed:", None, False)
+            return
+        if not self._confirmDuplicate(url):
+            return
 
-            self.performSelectorOnMainThread_withObject_waitUntilDone_("finishExtract:", path, True)
+        if self.jobQueue.active_count() + self.jobQueue.pending_count() == 0:
+            self.logger.reset()
+        normalization = self.userDefaults.getNormalization()
+        journalId = self.journal.journal_add(url, normalization)
+        workDir = downloader.job_dir(journalId)
+        self.journal.journal_update(journalId, MediaDB.JOB_PENDING, work_dir=workDir)
+        self._submit(url, normalization, journalId, workDir)
+        self.performSelectorOnMainThread_withObject_waitUntilDone_("extractQueued:", url, False)
+
+    def _confirmDuplicate(self, url):
+        """Lookup queue: False if `url` is queued, or downloaded before and the user doesn't want it again."""
+        key = canonical_id(url)
+        if any(canonical_id(j.args[0]) == key for j in self.jobQueue.jobs()
+               if j.state in (JobState.PENDING, JobState.RUNNING)):
+            self.logger.warning(f"Already downloading {url}")
+            self.performSelectorOnMainThread_withObject_waitUntilDone_("beep:", None, False)
+            return False
+        # The sidebar's database owns the history writer; find_history flushes it, so just-saved files count.
+        # Rows the backfill hasn't reached yet match on the URL itself
+        previous = self.sidebarVC.db.find_history(key, tuple(dict.fromkeys((url, canonical_url(url)))))
+        if previous is None:
+            return True
+        # Blocks this queue, not the UI, until the user answers
+        question = {"previous": previous}
+        self.performSelectorOnMainThread_withObject_waitUntilDone_("askDownloadAgain:", question, True)
+        return question.get("again", False)
+
+    def askDownloadAgain_(self, question):
+        previous = question["previous"]
+        alert = NSAlert.alloc().init()
+        alert.setMessageText_("Already downloaded")
+        when = time.strftime("%x", time.localtime(previous["ts"]))
+        alert.setInformativeText_(f"“{previous['title'] or previous['file']}” was saved as {previous['file']} on {when}.")
+        alert.addButtonWithTitle_("Download Again")
+        alert.addButtonWithTitle_("Cancel")
+        # Served from the cache when it still has the file, so "again" is usually instant
+        question["again"] = alert.runModal() == NSAlertFirstButtonReturn
+
+    def extractQueued_(self, url):
+        # The user may have typed the next URL meanwhile
+        if self.urlField.stringValue().strip() == url:
+            self.urlField.setStringValue_("")
 
-        except Exception as e:
-            self.logger.error(f"Download failed: {e}")
+    def extractFailed_(self, sender):
+        self.statusPill.setKind_message_(StatusPill.KindError, "Failed")
+
+    def beep_(self, sender):
+        NSBeep()
+
+    def resumeJournal_(self, sender):
+        """Re-queue the jobs a crash/quit interrupted, as found by _makeDownloader."""
+        unfinished, self._resumable = self._resumable, []
+        queued = {j.args[2] for j in self.jobQueue.jobs()}
+        for j in unfinished:
+            if j["id"] in queued:
+                continue
+            self.logger.info(f"Resuming interrupted download: {j['url']}")
+            self._submit(j["url"], j["normalization"], j["id"], j["work_dir"])
+
+    def _submit(self, url, normalization, journalId, workDir):
+        self.jobQueue.set_max_workers(self.userDefaults.getMaxConcurrentDownloads())
+        job = self.jobQueue.submit(self._download_job, url, normalization, journalId, workDir, on_done=self._job_done)
+        self.logger.info(f"[job {job.id}] Extract queued: {url}")
+        self.refreshStatus_(None)
+
+    def _download_job(self, job, url, normalization, journalId, workDir):
+        # Everything this worker thread logs (yt-dlp included) lands in the job's channel
+        with self.logger.bind(f"job {job.id}"):
+            return self._run_download(job, url, normalization, journalId, workDir)
+
+    def _run_download(self, job, url, normalization, journalId, workDir):
+        downloader = self.engine.get()
+        downloader.fragments.configure(self.userDefaults.getFragmentConcurrency(),
+                                       self.userDefaults.getAdaptiveFragments())
+        self.journal.journal_update(journalId, MediaDB.JOB_RUNNING)
+        codec = self.userDefaults.getOutputCodec()
+        self.logger.info(f"[job {job.id}] Using normalization: {normalization}, format: {codec}")
+        # Files go straight to the save folder unless the user opted into a save panel per file
+        outputDir = None if self.userDefaults.getAskWhereToSave() else self.userDefaults.getSaveFolder()
+
+        def finished(result):
+            if not result.ok:
+                self.logger.error(f"[job {job.id}] Entry {result.index} failed: {result.error}")
+                return
+            self.logger.info(f"[job {job.id}] Download finished successfully: {result.path}")
+            send_notification("Download Completed", os.path.basename(result.path))
+            info = {
+                "path": result.path, "url": url, "title": result.title, "extractor": result.extractor,
+                "duration": result.duration, "normalization": normalization,
+                "timings": result.timings, "elapsed": result.elapsed,
+                "canonical_id": result.source_id or canonical_id(url),
+            }
+            if outputDir:
+                self.performSelectorOnMainThread_withObject_waitUntilDone_("recordSaved:", info, False)
+            else:
+                self.performSelectorOnMainThread_withObject_waitUntilDone_("finishExtract:", info, True)
+
+        # Playlists expand into one save per entry
+        results = downloader.download_batch([url], normalization, on_result=finished,
+                                            cancel_event=job.cancel_event, work_dir=workDir, job=job.id,
+                                            output_dir=outputDir,
+                                            name_template=self.userDefaults.getFileNameTemplate(), codec=codec)
+        if not any(r.ok for r in results):
+            raise RuntimeError(results[0].error if results else "Nothing was downloaded")
+        return results
+
+    def _job_done(self, job):
+        if job.state is JobState.FAILED:
+            self.logger.error(f"[job {job.id}] Download failed: {job.error}")
+        elif job.state is JobState.CANCELLED:
+            self.logger.warning(f"[job {job.id}] Download cancelled.")
+        _, _, journalId, workDir = job.args
+        self.journal.journal_update(journalId, job.state.value, error=str(job.error) if job.error else None)
+        if workDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+        self.jobQueue.forget(job.id)
+        self.metrics.forget(job.id)
+        self.performSelectorOnMainThread_withObject_waitUntilDone_("jobFinished:", job.state.value, False)
+
+    def jobFinished_(self, state):
+        if self.refreshStatus_(None):
+            return
+        if state == JobState.FAILED.value:
             self.statusPill.setKind_message_(StatusPill.KindError, "Failed")
-        finally:
-            self.performSelectorOnMainThread_withObject_waitUntilDone_("setBusy:", False, False)
+        elif state == JobState.CANCELLED.value:
+            self.statusPill.setKind_message_(StatusPill.KindError, "Cancelled")
+
+    def refreshStatus_(self, sender):
+        """Show the number of queued/running jobs; returns True while the queue is busy."""
+        busy = self.jobQueue.active_count() + self.jobQueue.pending_count()
+        if busy:
+            message = f"Downloading ({busy})"
+            fraction = self.metrics.fraction()
+            if fraction is not None:
+                message += f" · {fraction:.0%}"
+            rate = format_rate(self.metrics.bytes_per_sec())
+            if rate:
+                message += f" · {rate}"
+            self.statusPill.setKind_message_(StatusPill.KindProgress, message)
+        return busy > 0
+
+    def _on_progress(self, event):
+        # Called on download threads for every yt-dlp progress tick; redraw at a human pace
+        now = time.monotonic()
+        if now - self._lastProgress < PROGRESS_INTERVAL:
+            return
+        self._lastProgress = now
+        self.performSelectorOnMainThread_withObject_waitUntilDone_("refreshStatus:", None, False)
 
-    def finishExtract_(self, src_path):
+    def finishExtract_(self, info):
+        src_path = info["path"]
         try:
             self.statusPill.setKind_message_(StatusPill.KindProgress, "Saving File")
             file = self.presentSavePanelForPath_(src_path)
@@ -614,23 +851,25 @@ class ContentVC(NSViewController):
                 self.statusPill.setKind_message_(StatusPill.KindError, "User Cancelled")
                 return
 
-            self.addToSidebar_({
-                "file": os.path.basename(file),
-                "url": self.urlField.stringValue().strip()
-            })
-            self.statusPill.setKind_message_(StatusPill.KindSuccess, "Success")
+            self.recordSaved_(dict(info, path=file))
         except Exception as e:
             self.logger.error(f"Save failed: {e}")
             self.statusPill.setKind_message_(StatusPill.KindError, "Failed")
-        finally:
-            self.setBusy_(False)
-
-    def setBusy_(self, is_busy):
-        self.extractButton.setEnabled_(not is_busy)
-        self.pasteButton.setEnabled_(not is_busy)
-        self.urlField.setEnabled_(not is_busy)
-        if not is_busy:
-            self.urlField.setStringValue_("")
+
+    def recordSaved_(self, info):
+        """Add a file that reached its final place to history and the sidebar."""
+        file = info["path"]
+        self.addToSidebar_({
+            "file": os.path.basename(file),
+            "url": info["url"],
+            "details": {
+                "title": info.get("title"), "extractor": info.get("extractor"),
+                "duration": info.get("duration"), "normalization": info.get("normalization"),
+                "timings": info.get("timings"), "elapsed": info.get("elapsed"),
+                "bytes": os.path.getsize(file), "canonical_id": info.get("canonical_id"),
+            },
+        })
+        self.statusPill.setKind_message_(StatusPill.KindSuccess, "Success")
 
     def presentSavePanelForPath_(self, src_path):
         save_path = self.openSavePanel_(src_path)
@@ -638,7 +877,7 @@ class ContentVC(NSViewController):
             return None
 
         self.logger.info(f"Saving to: {save_path}")
-        self.downloader.move_file(src_path, save_path)
+        self.engine.get().move_file(src_path, save_path)
         self.logger.info("File saved successfully.")
         return save_path
 
@@ -646,9 +885,10 @@ class ContentVC(NSViewController):
         try:
             panel = NSSavePanel.savePanel()
             panel.setAllowsOtherFileTypes_(False)
-            panel.setAllowedFileTypes_(["mp3"])
+            panel.setAllowedFileTypes_([os.path.splitext(src_path)[1].lstrip(".") or "mp3"])
             suggested = os.path.basename(src_path)
             panel.setNameFieldStringValue_(suggested)
+            panel.setDirectoryURL_(NSURL.fileURLWithPath_(self.userDefaults.getSaveFolder()))
             resp = panel.runModal()
             if not resp or resp != NSModalResponseOK:
                 return None
@@ -671,6 +911,8 @@ class RootSplitVC(NSSplitViewController):
         leftVC = SidebarVC.alloc().init()
         rightVC = ContentVC.alloc().init()
         rightVC.sidebarVC = leftVC
+        leftVC.db.logger = rightVC.logger  # before the first save starts its history writer
+        self.sidebarVC = leftVC
         left = NSSplitViewItem.sidebarWithViewController_(leftVC)
         right = NSSplitViewItem.splitViewItemWithViewController_(rightVC)
         self.addSplitViewItem_(left)
@@ -733,6 +975,12 @@ class AppDelegate(NSObject):
 
     def applicationShouldTerminateAfterLastWindowClosed_(self, app):
         return True
+
+    def applicationWillTerminate_(self, notification):
+        # Commit any history rows still queued in the write-behind writer
+        sidebar = getattr(self.splitVC, "sidebarVC", None)
+        if sidebar is not None:
+            sidebar._appWillTerminate_(notification)
     
     def showPreferences_(self, sender):
         SettingsWindowController.sharedController().showWindow_(sender)
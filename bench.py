@@ -0,0 +1,442 @@
+"""
+Micro-benchmarks for the download engine.
+
+    python bench.py sessions [--jobs N] [--url URL]
+    python bench.py fragments [--segments N] [--latency MS] [--limit N]
+    python bench.py history-writes [--rows N]
+    python bench.py history-search [--rows N]
+    python bench.py history-format [--rows N]
+    python bench.py logs [--lines N]
+    python bench.py transcode [--seconds S] [--runs N]
+    python bench.py startup [--budget-ms MS]
+"""
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+
+class QuietLogger:
+    def debug(self, msg): pass
+    def info(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): pass
+
+
+def _timeit(fn: Callable[[], None], runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _report(name: str, samples: List[float]) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"{name:<28} mean {statistics.mean(ms):8.2f} ms   median {statistics.median(ms):8.2f} ms   "
+          f"first {ms[0]:8.2f} ms   n={len(ms)}")
+
+
+# --- sessions: per-job YoutubeDL setup cost, fresh instance vs pooled session ---
+def bench_sessions(args) -> None:
+    import yt_dlp
+    from downloader import Downloader
+
+    downloader = Downloader(QuietLogger())
+
+    def cold():
+        with yt_dlp.YoutubeDL(downloader._ydl_opts()) as ydl:
+            if args.url:
+                ydl.extract_info(args.url, download=False)
+
+    def warm():
+        with downloader._session() as session:
+            session.bind(outtmpl="%(title)s.%(ext)s")
+            if args.url:
+                session.ydl.extract_info(args.url, download=False)
+
+    print(f"Per-job setup cost over {args.jobs} jobs" + (f" (with extract_info on {args.url})" if args.url else ""))
+    _report("fresh YoutubeDL per job", _timeit(cold, args.jobs))
+    _report("pooled session", _timeit(warm, args.jobs))
+    print("pool stats:", downloader.pool.stats())
+    downloader.close()
+
+
+# --- fragments: segmented (HLS) download time vs concurrent_fragment_downloads ---
+def _hls_fixture(root: str, segments: int, segment_bytes: int) -> None:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(segments):
+        with open(os.path.join(root, f"seg{i:04d}.ts"), "wb") as f:
+            f.write(os.urandom(segment_bytes))
+        lines += ["#EXTINF:4.0,", f"seg{i:04d}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    with open(os.path.join(root, "index.m3u8"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _fixture_server(root: str, latency: float, limit: int) -> ThreadingHTTPServer:
+    """Serves `root` with a fixed per-request latency; beyond `limit` in-flight requests it answers 429."""
+
+    in_flight = threading.BoundedSemaphore(limit) if limit else None
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, directory=root, **kw)
+
+        def log_message(self, *a):
+            pass
+
+        def do_GET(self):
+            if in_flight is not None and not in_flight.acquire(blocking=False):
+                self.send_error(429, "Too Many Requests")
+                return
+            try:
+                time.sleep(latency)
+                super().do_GET()
+            finally:
+                if in_flight is not None:
+                    in_flight.release()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_fragments(args) -> None:
+    import yt_dlp
+    from concurrency import AdaptiveConcurrency, ThrottleWatcher, backoff_delay
+
+    with tempfile.TemporaryDirectory(prefix="mediaext-bench-") as root:
+        fixture = os.path.join(root, "www")
+        os.makedirs(fixture)
+        _hls_fixture(fixture, args.segments, args.segment_kb * 1024)
+        server = _fixture_server(fixture, args.latency / 1000.0, args.limit)
+        url = f"http://127.0.0.1:{server.server_address[1]}/index.m3u8"
+
+        def fetch(n: int, logger) -> None:
+            out = tempfile.mkdtemp(dir=root)
+            opts = {'format': 'best', 'logger': logger, 'fixup': 'never', 'quiet': True,
+                    'concurrent_fragment_downloads': n, 'fragment_retries': 10,
+                    'retry_sleep_functions': {'fragment': lambda n: backoff_delay(n, base=0.05)},
+                    'outtmpl': os.path.join(out, '%(id)s.%(ext)s')}
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                ydl.download([url])
+
+        print(f"HLS fixture: {args.segments} x {args.segment_kb} KiB segments, {args.latency:.0f} ms per request"
+              + (f", 429 above {args.limit} in-flight" if args.limit else ""))
+        for n in (1, 2, 4, 8):
+            _report(f"{n} concurrent fragment(s)", _timeit(lambda: fetch(n, QuietLogger()), args.runs))
+
+        # Same downloads driven by the adaptive controller Downloader uses
+        controller = AdaptiveConcurrency(maximum=16)
+        trace = []
+        for _ in range(args.runs * 3):
+            watcher = ThrottleWatcher(QuietLogger())
+            n = controller.current
+            fetch(n, watcher)
+            after = controller.on_throttled() if watcher.throttled else controller.on_success()
+            trace.append(f"{n}{'!' if watcher.throttled else ''}->{after}")
+        print("adaptive (max 16):", " ".join(trace))
+        server.shutdown()
+
+
+# --- history-writes: commit per row vs write-behind batching ---
+def bench_history_writes(args) -> None:
+    from database import MediaDB
+
+    with tempfile.TemporaryDirectory(prefix="mediaext-bench-") as root:
+        def run(name: str, insert: Callable[[MediaDB, int], None]) -> None:
+            db = MediaDB(db_path=os.path.join(root, f"{name}.db"))
+            start = time.perf_counter()
+            for i in range(args.rows):
+                insert(db, i)
+            queued = time.perf_counter() - start
+            db.flush()
+            total = time.perf_counter() - start
+            db.close()
+            print(f"{name:<14} caller blocked {queued * 1000:9.2f} ms   "
+                  f"committed {total * 1000:9.2f} ms   {args.rows / total:10.0f} rows/s")
+
+        print(f"{args.rows} history inserts")
+        run("sync", lambda db, i: db.insert_history(f"file-{i}.mp3", f"https://example.com/{i}"))
+        run("write-behind", lambda db, i: db.insert_history_async(f"file-{i}.mp3", f"https://example.com/{i}"))
+
+
+# --- history-search: FTS5 ranked search on a large history ---
+def bench_history_search(args) -> None:
+    import random
+    from database import MediaDB
+
+    words = ["live", "mix", "remix", "official", "audio", "podcast", "episode", "lofi", "beats", "jazz",
+             "piano", "session", "interview", "chill", "summer", "night", "acoustic", "cover", "radio", "edit"]
+    hosts = ["youtube.com", "soundcloud.com", "vimeo.com", "bandcamp.com", "twitch.tv"]
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory(prefix="mediaext-bench-") as root:
+        db = MediaDB(db_path=os.path.join(root, "search.db"))
+        rows = [(" ".join(rng.sample(words, 4)).title() + f" {i}.mp3",
+                 f"https://www.{rng.choice(hosts)}/watch?v={i:08x}", 1_600_000_000 + i) for i in range(args.rows)]
+        start = time.perf_counter()
+        with db._lock:
+            db.conn.executemany("INSERT INTO history (file, url, ts) VALUES (?, ?, ?)", rows)
+            db.conn.commit()
+        print(f"{args.rows} rows inserted and indexed in {time.perf_counter() - start:.2f} s "
+              f"(fts5: {'yes' if db.fts else 'no, LIKE fallback'})")
+
+        for query in ("jazz", "pia", "chill summer", "soundcloud lofi", "acoustic zzz", "acoustc sumer"):
+            hits = []
+            samples = _timeit(lambda: hits.append(len(db.search_history(query))), args.runs)
+            _report(f"search {query!r} ({hits[-1]} hits)", samples)
+        db.close()
+
+
+# --- history-format: sidebar grouping of a large history ---
+def _legacy_format(formatter, rows, now: int):
+    """The pre-bisect HistoryFormatter.format: linear scan over the groups and eager strftime per row."""
+    from datetime import datetime
+    from models import MediaItem
+
+    buckets = {label: [] for label, _ in formatter._GROUPS}
+    for r in rows:
+        ts = int(r["ts"])
+        age = max(0, now - ts)
+        for label, (lo, hi) in formatter._GROUPS:
+            if lo <= age < hi:
+                buckets[label].append(MediaItem.item(r["file"], datetime.fromtimestamp(ts).strftime("%d/%m/%y, %H:%M:%S")))
+                break
+    out = []
+    for label, _ in formatter._GROUPS:
+        if buckets[label]:
+            out.append(MediaItem.group(label))
+            out.extend(buckets[label])
+    return out
+
+
+def bench_history_format(args) -> None:
+    import random
+    from models import HistoryFormatter
+
+    now = int(time.time())
+    rng = random.Random(0)
+    rows = [{"id": i, "file": f"file-{i}.mp3", "ts": now - rng.randint(0, 3 * 365 * 24 * 3600)}
+            for i in range(args.rows)]
+    rows.sort(key=lambda r: r["ts"], reverse=True)
+    formatter = HistoryFormatter()
+
+    def first_screen(items):
+        # What the sidebar actually shows at launch
+        for item in items[:args.visible]:
+            item.timestamp
+
+    print(f"{args.rows} synthetic history rows, {args.visible} visible")
+    _report("legacy format", _timeit(lambda: first_screen(_legacy_format(formatter, rows, now)), args.runs))
+    _report("bisect + lazy timestamps", _timeit(lambda: first_screen(formatter.format(rows, now)), args.runs))
+    _report("bucket bounds only", _timeit(lambda: formatter.bucket_bounds(rows, now), args.runs))
+
+
+# --- logs: full-text redraw per line vs ring buffer + coalesced deltas ---
+class _LegacyLogger:
+    # What the log view used to do: accumulate everything, hand over the whole text per line
+    def __init__(self, handler: Callable[[str], None]) -> None:
+        self.content = ""
+        self.handler = handler
+
+    def debug(self, msg):
+        self.content += f"{msg}\n"
+        self.handler(self.content)
+
+
+def _log_lines(count: int, progress_every: int):
+    for i in range(count):
+        if progress_every and i % progress_every:
+            yield f"[download] {100.0 * (i % progress_every) / progress_every:5.1f}% of 10.00MiB at 2.00MiB/s ETA 00:03"
+        else:
+            yield f"[info] job {i // max(progress_every, 1)}: line {i}"
+
+
+def bench_logs(args) -> None:
+    from logs import LogPipeline
+
+    def consume(text: str) -> None:
+        # Stand-in for the NSString bridge copy the text view pays per update
+        text.encode("utf-16-le")
+
+    print(f"{args.lines} log lines, every {args.progress_every}th a regular line, the rest progress")
+
+    delivered = [0]
+    legacy = _LegacyLogger(lambda text: (consume(text), delivered.__setitem__(0, delivered[0] + 1)))
+    start = time.perf_counter()
+    for line in _log_lines(args.lines, args.progress_every):
+        legacy.debug(line)
+    elapsed = time.perf_counter() - start
+    print(f"{'legacy full redraw':<28} {args.lines / elapsed:12,.0f} lines/s   {delivered[0]:7} view updates")
+
+    delivered = [0]
+    pipeline = LogPipeline(capacity=args.capacity, fps=args.fps)
+    pipeline.subscribe(lambda delta: (consume(delta.text), delivered.__setitem__(0, delivered[0] + 1)))
+    start = time.perf_counter()
+    for line in _log_lines(args.lines, args.progress_every):
+        pipeline.debug(line)
+    pipeline.close()
+    elapsed = time.perf_counter() - start
+    print(f"{'ring buffer + deltas':<28} {args.lines / elapsed:12,.0f} lines/s   {delivered[0]:7} view updates   "
+          f"{len(pipeline.tail())} lines kept")
+
+
+# --- transcode: ffmpeg CPU time per job, always normalizing to MP3 vs the cheapest path (see formats.py) ---
+TRANSCODE_SOURCES = (("opus", "webm", ['-c:a', 'libopus', '-b:a', '160k']),
+                     ("aac", "m4a", ['-c:a', 'aac', '-b:a', '128k']),
+                     ("mp3", "mp3", ['-c:a', 'libmp3lame', '-q:a', '2']))
+
+
+def _child_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_transcode(args) -> None:
+    from formats import OUTPUT_CODECS, can_copy, output_format
+    from models import Normalization
+    from transcoder import LoudnormStatsCache, Transcoder, find_ffmpeg
+
+    ffmpeg = find_ffmpeg()
+    with tempfile.TemporaryDirectory() as root:
+        sources = []
+        for codec, ext, encoder in TRANSCODE_SOURCES:
+            path = os.path.join(root, f"source-{codec}.{ext}")
+            subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error',
+                            '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={args.seconds}",
+                            '-f', 'lavfi', '-i', f"anoisesrc=amplitude=0.05:sample_rate=48000:duration={args.seconds}",
+                            '-filter_complex', 'amix=inputs=2', '-ac', '2', *encoder, path], check=True)
+            sources.append((codec, path))
+
+        def job(src: str, codec: str, normalization: str) -> str:
+            # Fresh stats: the first download of a source, which pays for the measuring pass
+            transcoder = Transcoder(ffmpeg, LoudnormStatsCache())
+            output = output_format(codec)
+            dest = os.path.join(root, "out" + output.ext)
+            copy = can_copy({}, output, normalization)
+            if copy is None:
+                copy = can_copy({"acodec": transcoder.audio_codec(src)}, output, normalization)
+            transcoder.normalize(src, dest, normalization, "bench", output=output, copy=copy)
+            os.remove(dest)
+            return "remux" if copy else "encode" if normalization == Normalization.OFF.value else "normalize"
+
+        plans = [(Normalization.HIGH.value, "mp3")] + [(Normalization.OFF.value, c) for c in OUTPUT_CODECS]
+        print(f"{args.seconds:.0f} s stereo sources, ffmpeg CPU (user+sys) per job, mean of {args.runs}")
+        for source_codec, src in sources:
+            for normalization, codec in plans:
+                cpu, wall = [], []
+                for _ in range(args.runs):
+                    before, start = _child_cpu(), time.perf_counter()
+                    how = job(src, codec, normalization)
+                    cpu.append(_child_cpu() - before)
+                    wall.append(time.perf_counter() - start)
+                print(f"{source_codec:>4} -> {codec:<4} ({normalization:<4}) {how:<9} "
+                      f"cpu {statistics.mean(cpu):7.3f} s   wall {statistics.mean(wall):7.3f} s")
+
+
+# --- startup: `python -X importtime` of the app module, against a budget ---
+# Loaded on the warm-up thread / first extract, never while the window is being built
+STARTUP_FORBIDDEN = ("yt_dlp", "imageio_ffmpeg", "downloader", "session_pool")
+
+
+def _import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """{module: (self us, cumulative us)} for a fresh interpreter importing `module`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def bench_startup(args) -> None:
+    _import_times(args.module)  # compile .pyc files first
+    runs = [_import_times(args.module) for _ in range(args.runs)]
+    total_ms = statistics.median(r[args.module][1] for r in runs) / 1000
+    last = runs[-1]
+    print(f"import {args.module}: median {total_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    for name, (_, cumulative) in sorted(last.items(), key=lambda kv: -kv[1][1])[1:args.top + 1]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failures = [f"{name} is imported at startup" for name in STARTUP_FORBIDDEN if name in last]
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sessions", help="YoutubeDL setup cost: fresh instance vs pooled session")
+    p.add_argument("--jobs", type=int, default=20)
+    p.add_argument("--url", help="also run extract_info(download=False) on this URL (needs network)")
+    p.set_defaults(func=bench_sessions)
+
+    p = sub.add_parser("fragments", help="segmented download time per concurrent_fragment_downloads (local HLS fixture)")
+    p.add_argument("--segments", type=int, default=40)
+    p.add_argument("--segment-kb", type=int, default=64)
+    p.add_argument("--latency", type=float, default=50.0, help="per-request server latency in ms")
+    p.add_argument("--limit", type=int, default=0, help="answer 429 above this many in-flight requests (0 = off)")
+    p.add_argument("--runs", type=int, default=3)
+    p.set_defaults(func=bench_fragments)
+
+    p = sub.add_parser("history-writes", help="history insert throughput: commit per row vs write-behind")
+    p.add_argument("--rows", type=int, default=5000)
+    p.set_defaults(func=bench_history_writes)
+
+    p = sub.add_parser("history-search", help="ranked full-text history search latency")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--runs", type=int, default=20)
+    p.set_defaults(func=bench_history_search)
+
+    p = sub.add_parser("history-format", help="sidebar grouping: legacy formatter vs bisect + lazy timestamps")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--visible", type=int, default=40)
+    p.add_argument("--runs", type=int, default=3)
+    p.set_defaults(func=bench_history_format)
+
+    p = sub.add_parser("logs", help="log view throughput: full-text redraw per line vs ring buffer + coalesced deltas")
+    p.add_argument("--lines", type=int, default=50_000)
+    p.add_argument("--progress-every", type=int, default=20, help="one regular line per this many (0 = no progress lines)")
+    p.add_argument("--capacity", type=int, default=5000)
+    p.add_argument("--fps", type=float, default=30.0)
+    p.set_defaults(func=bench_logs)
+
+    p = sub.add_parser("transcode", help="ffmpeg CPU seconds per job: always normalizing to MP3 vs remux/encode-only")
+    p.add_argument("--seconds", type=float, default=180.0, help="length of the generated sources")
+    p.add_argument("--runs", type=int, default=3)
+    p.set_defaults(func=bench_transcode)
+
+    p = sub.add_parser("startup", help="app import time (-X importtime) against a budget; exits 1 when over")
+    p.add_argument("--module", default="app")
+    p.add_argument("--budget-ms", type=float, default=400.0)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=15, help="show the slowest N imports")
+    p.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
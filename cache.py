@@ -0,0 +1,335 @@
+import ctypes
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+INDEX_FILENAME = "index.db"
+
+# ioctl that makes a file share another's blocks copy-on-write (Btrfs, XFS; linux/fs.h)
+_FICLONE = 0x40049409
+
+
+def cache_key(*parts: str) -> str:
+    """Stable key from the parts that determine a cached file (source, format, normalization...)."""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def normalize_url(url: str) -> str:
+    """Cheap, offline URL normalization: lowercase scheme/host, drop fragment and utm_* params, sort query."""
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith("utm_"))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def clone_file(src: str, dest: str) -> None:
+    """
+    Copy `src` to a new file `dest` that shares nothing with it afterwards: a copy-on-write
+    clone where the filesystem has them (APFS, Btrfs, XFS), so it costs no data copy, else a copy.
+    """
+    if sys.platform == "darwin":
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dest), 0) == 0:
+            return
+    elif sys.platform.startswith("linux"):
+        import fcntl
+        try:
+            with open(src, "rb") as s, open(dest, "xb") as d:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            return
+        except OSError:
+            pass  # not supported here; the copy below overwrites the empty file
+    shutil.copyfile(src, dest)
+
+
+class CacheEntry(object):
+    __slots__ = ("key", "sha256", "size", "filename", "title", "path", "meta")
+
+    def __init__(self, key: str, sha256: str, size: int, filename: str, title: str, path: str,
+                 meta: Optional[Dict[str, Any]] = None):
+        self.key = key
+        self.sha256 = sha256
+        self.size = size
+        self.filename = filename
+        self.title = title
+        self.path = path
+        self.meta = meta or {}
+
+
+class FileCache:
+    """
+    Content-addressed on-disk file cache with size-bounded LRU eviction.
+
+    Files are stored once under objects/<sha256[:2]>/<sha256>; any number
+    of keys can point at the same object. Objects are clones or copies, never
+    hardlinks, in both directions (`put` and `materialize`), so editing a saved
+    file can't change what the cache hands out. Reads check size and mtime;
+    an object's checksum is verified the first time it is read in a process,
+    outside the index lock.
+
+    Index schema (index.db, table `entries`):
+      - key         TEXT PRIMARY KEY
+      - sha256      TEXT NOT NULL
+      - size        INTEGER NOT NULL
+      - filename    TEXT NOT NULL  (original file name, e.g. "<title>.mp3")
+      - title       TEXT
+      - meta        TEXT           (JSON, caller-defined)
+      - created     INTEGER NOT NULL
+      - last_access REAL NOT NULL
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3, verify: bool = True) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.verify = verify
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._verified: Dict[str, Tuple[int, int]] = {}  # object path -> (size, mtime_ns) when its hash matched
+        self.conn = sqlite3.connect(os.path.join(root, INDEX_FILENAME), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key         TEXT PRIMARY KEY,
+                sha256      TEXT    NOT NULL,
+                size        INTEGER NOT NULL,
+                filename    TEXT    NOT NULL,
+                title       TEXT,
+                meta        TEXT,
+                created     INTEGER NOT NULL,
+                last_access REAL    NOT NULL
+            )
+        """)
+        columns = {r["name"] for r in self.conn.execute("PRAGMA table_info(entries)")}
+        if "meta" not in columns:
+            self.conn.execute("ALTER TABLE entries ADD COLUMN meta TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_sha ON entries(sha256)")
+        self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if getattr(self, "conn", None):
+                self.conn.close()
+                self.conn = None
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    # --- lookup ---
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for `key` if its object is present and intact; broken entries are dropped."""
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT key, sha256, size, filename, title, meta FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        path = self._object_path(row["sha256"])
+        intact = self._intact(path, row["sha256"], row["size"])
+        with self._lock:
+            if not intact:
+                self.conn.execute("DELETE FROM entries WHERE key = ? AND sha256 = ?", (key, row["sha256"]))
+                self._drop_object_if_unused(row["sha256"], path)
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return CacheEntry(row["key"], row["sha256"], row["size"], row["filename"], row["title"] or "", path,
+                          json.loads(row["meta"]) if row["meta"] else None)
+
+    def _intact(self, path: str, sha256: str, size: int) -> bool:
+        """Size matches, and the hash did when the file last had this size and mtime (hashed once per process)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if not self.verify or self._verified.get(path) == (st.st_size, st.st_mtime_ns):
+            return True
+        if file_sha256(path) != sha256:
+            return False
+        self._verified[path] = (st.st_size, st.st_mtime_ns)
+        return True
+
+    def materialize(self, entry: CacheEntry, dest_dir: str, filename: Optional[str] = None) -> str:
+        """Place a clone (or copy) of a cached file into `dest_dir`."""
+
+        os.makedirs(dest_dir, exist_ok=True)
+        dest = os.path.join(dest_dir, filename or entry.filename)
+        clone_file(entry.path, dest)
+        return dest
+
+    # --- insertion ---
+    def put(self, key: str, src_path: str, title: str = "", aliases: Iterable[str] = (),
+            meta: Optional[Dict[str, Any]] = None, filename: Optional[str] = None) -> CacheEntry:
+        """
+        Store a copy of `src_path` under `key` (and any `aliases`), then evict down to `max_bytes`.
+        `filename` overrides the name handed back by `materialize` (defaults to the source's basename).
+        """
+
+        sha256 = file_sha256(src_path)
+        size = os.path.getsize(src_path)
+        filename = filename or os.path.basename(src_path)
+        meta_json = json.dumps(meta) if meta else None
+        path = self._object_path(sha256)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                clone_file(src_path, tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                self._remove_object(tmp)
+                raise
+
+        now = time.time()
+        with self._lock:
+            for k in (key, *aliases):
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, sha256, size, filename, title, meta, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (k, sha256, size, filename, title, meta_json, int(now), now),
+                )
+            self.conn.commit()
+            self._evict_locked()
+        return CacheEntry(key, sha256, size, filename, title, path, meta)
+
+    # --- eviction ---
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes_locked()
+
+    def _total_bytes_locked(self) -> int:
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT sha256, MAX(size) AS size FROM entries GROUP BY sha256)"
+        ).fetchone()
+        return int(row[0])
+
+    def _evict_locked(self) -> None:
+        total = self._total_bytes_locked()
+        if total <= self.max_bytes:
+            return
+        # Least recently used objects first (an object is as fresh as its freshest key)
+        rows = self.conn.execute(
+            "SELECT sha256, MAX(size) AS size, MAX(last_access) AS last_access "
+            "FROM entries GROUP BY sha256 ORDER BY last_access ASC"
+        ).fetchall()
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM entries WHERE sha256 = ?", (row["sha256"],))
+            self._remove_object(self._object_path(row["sha256"]))
+            total -= int(row["size"])
+        self.conn.commit()
+
+    def _drop_object_if_unused(self, sha256: str, path: str) -> None:
+        if self.conn.execute("SELECT 1 FROM entries WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone() is None:
+            self._remove_object(path)
+
+    @staticmethod
+    def _remove_object(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+            self._verified.clear()
+        shutil.rmtree(os.path.join(self.root, "objects"), ignore_errors=True)
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+
+
+class InfoCache:
+    """
+    yt-dlp info dicts (`extract_info(download=False)`, sanitized to JSON) with a TTL,
+    so probing a URL and downloading it later resolves it only once.
+
+    The dicts hold signed stream URLs that expire (hours on YouTube), which is what
+    bounds `ttl`. Subtitles, captions and thumbnails are dropped before storing,
+    and the JSON is zlib-compressed: a YouTube info dict shrinks from ~500 KB to ~30 KB.
+
+    Schema (table `infos`):
+      - key     TEXT PRIMARY KEY
+      - info    BLOB NOT NULL  (zlib-compressed JSON)
+      - created REAL NOT NULL
+    """
+
+    # Large and never used for downloading audio
+    DROP_KEYS = ("automatic_captions", "subtitles", "requested_subtitles", "thumbnails", "heatmap")
+
+    def __init__(self, path: str, ttl: float = 1800.0, max_entries: int = 1000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS infos (
+                key     TEXT PRIMARY KEY,
+                info    BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_infos_created ON infos(created)")
+        self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if getattr(self, "conn", None):
+                self.conn.close()
+                self.conn = None
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The info stored under `key` if it is younger than `max_age` (default: the TTL)."""
+        limit = time.time() - (self.ttl if max_age is None else min(max_age, self.ttl))
+        with self._lock:
+            row = self.conn.execute("SELECT info, created FROM infos WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < limit:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, info: Dict[str, Any]) -> None:
+        blob = zlib.compress(json.dumps(self._slim(info), separators=(",", ":")).encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO infos (key, info, created) VALUES (?, ?, ?)", (key, blob, now))
+            self.conn.execute("DELETE FROM infos WHERE created < ?", (now - self.ttl,))
+            self.conn.execute(
+                "DELETE FROM infos WHERE key IN (SELECT key FROM infos ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            self.conn.commit()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM infos WHERE key = ?", (key,))
+            self.conn.commit()
+
+    @classmethod
+    def _slim(cls, info: Dict[str, Any]) -> Dict[str, Any]:
+        slim = {k: v for k, v in info.items() if k not in cls.DROP_KEYS}
+        if isinstance(slim.get("entries"), list):
+            slim["entries"] = [cls._slim(e) if isinstance(e, dict) else e for e in slim["entries"]]
+        return slim
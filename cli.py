@@ -0,0 +1,201 @@
+"""
+Headless front end for the download engine (no PyObjC needed).
+
+    python cli.py download URL... [-i FILE|-] [-o DIR] [-t '{uploader}/{title}'] [-c mp3] [-n High] [-j 4]
+                           [--schedule shortest] [--max-size MB] [--max-duration MIN]
+    python cli.py daemon [-i FIFO|FILE|-]... [-o DIR]
+    python cli.py serve [--port 8787] [--token SECRET] [-o DIR]
+
+`download` runs the given URLs (and those listed in the input files, one per
+line, '#' comments allowed) and exits: 0 if everything was saved, 1 otherwise.
+`daemon` first resumes jobs an earlier run left unfinished, then keeps taking
+URLs; FIFO inputs are reopened whenever a writer closes them, so it runs until
+SIGINT/SIGTERM. `serve` does the same behind the local HTTP/JSON API in
+server.py instead of reading inputs. Saved files are printed to stdout ("path<TAB>url", or JSON
+lines with --json), logs go to stderr, history and the job journal to the
+database in --data-dir. File names come from --template, which can use
+{title}, {uploader}, {date} and {id}; a '/' in it makes subfolders.
+--codec picks mp3, aac, opus or flac; with '-n Off' sources already in
+that codec are remuxed instead of re-encoded.
+--schedule shortest|bandwidth probes each URL first and runs the smallest
+(or quickest to fetch) ones first; --max-size/--max-duration fail sources over
+the limit before they are downloaded.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import stat
+import sys
+import threading
+from typing import Iterator, List
+
+from logs import LogPipeline
+from formats import DEFAULT_CODEC, OUTPUT_CODECS
+from models import Normalization
+from naming import DEFAULT_TEMPLATE, validate_template
+from service import SCHEDULES, ExtractionService, default_data_dir
+
+
+def _read_urls(stream) -> Iterator[str]:
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def _feed(service: ExtractionService, source: str, normalization: str, skip_duplicates: bool) -> None:
+    """Submit every URL in `source` ('-' for stdin); FIFOs are read again after each writer leaves."""
+    if source == "-":
+        for url in _read_urls(sys.stdin):
+            service.submit(url, normalization, skip_duplicates)
+        return
+    fifo = stat.S_ISFIFO(os.stat(source).st_mode)
+    while True:
+        with open(source, "r", encoding="utf-8") as f:
+            for url in _read_urls(f):
+                service.submit(url, normalization, skip_duplicates)
+        if not fifo:
+            return
+
+
+class _Output:
+    """Prints one line per entry on stdout and remembers whether anything failed."""
+
+    def __init__(self, as_json: bool) -> None:
+        self.as_json = as_json
+        self.failed = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, job, result) -> None:
+        with self._lock:
+            if result.ok:
+                self.saved += 1
+            else:
+                self.failed += 1
+            if self.as_json:
+                line = json.dumps({"job": job.id, "url": result.url, "index": result.index, "path": result.path,
+                                   "title": result.title, "error": result.error, "elapsed": result.elapsed})
+            elif result.ok:
+                line = f"{result.path}\t{result.url}"
+            else:
+                line = f"FAILED\t{result.url}\t{result.error}"
+            print(line, flush=True)
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run(args) -> int:
+    logger = LogPipeline(fps=10.0)
+    if not args.quiet:
+        logger.subscribe(lambda delta: (sys.stderr.write(delta.text), sys.stderr.flush()))
+    output = _Output(args.json)
+    service = ExtractionService(args.data_dir, args.output, logger, workers=args.jobs,
+                                fragment_concurrency=args.fragments,
+                                adaptive_fragments=not args.no_adaptive_fragments,
+                                name_template=args.template, codec=args.codec, schedule=args.schedule,
+                                max_bytes=int(args.max_size * 1e6) if args.max_size else None,
+                                max_duration=args.max_duration * 60 if args.max_duration else None,
+                                on_result=output)
+    signal.signal(signal.SIGTERM, _terminate)
+
+    inputs: List[str] = list(getattr(args, "input", None) or [])
+    if args.command == "download" and not args.urls and not inputs:
+        if sys.stdin.isatty():
+            service.close()
+            logger.close()
+            print("No URLs given (pass them as arguments, with -i FILE, or on stdin)", file=sys.stderr)
+            return 2
+        inputs = ["-"]
+    if args.command == "daemon" and not inputs:
+        inputs = ["-"]
+
+    try:
+        if args.command == "serve":
+            from server import ApiServer
+            server = ApiServer(service, args.host, args.port, args.token, args.normalization)
+            if server.generated_token:
+                print(f"API token: {server.token}", file=sys.stderr)
+            asyncio.run(server.serve())
+        if args.command == "daemon":
+            service.resume()
+        for url in args.urls:
+            service.submit(url, args.normalization, args.skip_duplicates)
+        readers = [threading.Thread(target=_feed, args=(service, source, args.normalization, args.skip_duplicates),
+                                    name=f"input {source}", daemon=True) for source in inputs]
+        for t in readers:
+            t.start()
+        for t in readers:
+            while t.is_alive():
+                t.join(0.5)
+        while not service.wait_idle(0.5):
+            pass
+    except KeyboardInterrupt:
+        logger.warning("Stopping; unfinished jobs stay journaled and resume with `cli.py daemon`.")
+        service.close()
+        logger.close()
+        # Being stopped is how a daemon ends normally
+        return 130 if args.command == "download" else 0
+    service.close()
+    logger.close()
+    if not args.quiet:
+        print(f"{output.saved} saved, {output.failed} failed", file=sys.stderr)
+    return 1 if output.failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    engine = argparse.ArgumentParser(add_help=False)
+    engine.add_argument("-o", "--output", default=os.getcwd(), help="where saved files go (default: cwd)")
+    engine.add_argument("-t", "--template", default=DEFAULT_TEMPLATE,
+                        help="file name template, e.g. '{uploader}/{date} {title}' (default: %(default)s)")
+    engine.add_argument("-c", "--codec", default=DEFAULT_CODEC, choices=OUTPUT_CODECS,
+                        help="output format (default: %(default)s)")
+    engine.add_argument("-n", "--normalization", default=Normalization.HIGH.value,
+                        choices=[n.value for n in Normalization],
+                        help="loudness normalization; Off skips re-encoding where it can (default: %(default)s)")
+    engine.add_argument("-j", "--jobs", type=int, default=4, help="concurrent downloads")
+    engine.add_argument("--fragments", type=int, default=4, help="parallel fragments per HLS/DASH download")
+    engine.add_argument("--no-adaptive-fragments", action="store_true", help="don't back off when throttled")
+    engine.add_argument("--schedule", default="fifo", choices=SCHEDULES,
+                        help="job order: as given, smallest first, or quickest to fetch first (default: %(default)s)")
+    engine.add_argument("--max-size", type=float, metavar="MB", help="skip sources larger than this")
+    engine.add_argument("--max-duration", type=float, metavar="MIN", help="skip sources longer than this")
+    engine.add_argument("--data-dir", default=default_data_dir(), help="database, caches and partial downloads")
+    engine.add_argument("-q", "--quiet", action="store_true", help="no log output on stderr")
+
+    common = argparse.ArgumentParser(add_help=False, parents=[engine])
+    common.add_argument("-i", "--input", action="append", metavar="FILE",
+                        help="file or FIFO with one URL per line, '-' for stdin (repeatable)")
+    common.add_argument("--json", action="store_true", help="print results as JSON lines")
+    common.add_argument("--skip-duplicates", action="store_true",
+                        help="skip URLs already in the history or queued (matched by video, not spelling)")
+
+    p = sub.add_parser("download", parents=[common], help="download URLs, then exit")
+    p.add_argument("urls", nargs="*", metavar="URL")
+
+    p = sub.add_parser("daemon", parents=[common], help="resume unfinished jobs and keep taking URLs from the inputs")
+    p.set_defaults(urls=[])
+
+    p = sub.add_parser("serve", parents=[engine], help="resume unfinished jobs and serve the local HTTP/JSON API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8787)
+    p.add_argument("--token", help="token for 'Authorization: Bearer TOKEN' (default: generated and logged)")
+    p.set_defaults(urls=[], json=False, skip_duplicates=False)
+
+    args = parser.parse_args()
+    try:
+        validate_template(args.template)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import re
+import threading
+
+# Messages yt-dlp emits when a host pushes back on us (fragment retries included)
+_THROTTLE_PATTERN = re.compile(r"HTTP Error (429|403|503)|Too Many Requests|rate[- ]limit|throttl", re.I)
+
+
+def backoff_delay(n: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential retry delay for yt-dlp's `retry_sleep_functions` (n is the 0-based retry number)."""
+    return min(cap, base * 2 ** n)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for yt-dlp's `concurrent_fragment_downloads`.
+
+    Every job reads `current`. A job that saw throttling halves it
+    (multiplicative decrease); a clean job raises it by one (additive increase)
+    until `maximum`. With `adaptive` off, `current` is simply `maximum`.
+    """
+
+    def __init__(self, maximum: int = 4, minimum: int = 1, adaptive: bool = True) -> None:
+        self._lock = threading.Lock()
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.adaptive = adaptive
+        self._current = self.maximum
+
+    @property
+    def current(self) -> int:
+        with self._lock:
+            return self._current if self.adaptive else self.maximum
+
+    def configure(self, maximum: int, adaptive: bool) -> None:
+        with self._lock:
+            self.maximum = max(self.minimum, maximum)
+            self.adaptive = adaptive
+            self._current = min(self._current, self.maximum) if adaptive else self.maximum
+
+    def on_throttled(self) -> int:
+        with self._lock:
+            self._current = max(self.minimum, self._current // 2)
+            return self._current
+
+    def on_success(self) -> int:
+        with self._lock:
+            self._current = min(self.maximum, self._current + 1)
+            return self._current
+
+
+class ThrottleWatcher:
+    """
+    Logger proxy for one job: forwards everything to `logger` and remembers
+    whether yt-dlp reported throttling (HTTP 429/403/503, "Too Many Requests"...).
+    """
+
+    def __init__(self, logger) -> None:
+        self.logger = logger
+        self.throttled = False
+
+    def _check(self, msg) -> None:
+        if not self.throttled and _THROTTLE_PATTERN.search(str(msg)):
+            self.throttled = True
+
+    def debug(self, msg):
+        self._check(msg)
+        self.logger.debug(msg)
+
+    def info(self, msg):
+        self._check(msg)
+        self.logger.info(msg)
+
+    def warning(self, msg):
+        self._check(msg)
+        self.logger.warning(msg)
+
+    def error(self, msg):
+        self._check(msg)
+        self.logger.error(msg)
+
+
+class Deferred:
+    """
+    A value built once by `factory` on a background thread.
+
+    `start` kicks the build off early (e.g. right after launch) and `get`
+    blocks until the value is there, building it on the caller's thread if
+    nobody started it. A failed build is re-raised by every `get`.
+    `on_ready(value)` runs on the building thread once the value is set.
+    """
+
+    def __init__(self, factory, name: str = "deferred", on_ready=None) -> None:
+        self.factory = factory
+        self.name = name
+        self.on_ready = on_ready
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._started = False
+        self._value = None
+        self._error = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self._error is None
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+            return True
+
+    def start(self) -> None:
+        if self._claim():
+            threading.Thread(target=self._build, name=f"{self.name}-warmup", daemon=True).start()
+
+    def get(self):
+        if self._claim():
+            self._build()
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _build(self) -> None:
+        try:
+            self._value = self.factory()
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._done.set()
+        if self._error is None and self.on_ready is not None:
+            self.on_ready(self._value)
@@ -1,41 +1,373 @@
+import atexit
+import json
+import math
+from difflib import SequenceMatcher
+import queue
+import re
 import sqlite3
+import sys
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Sequence, Tuple
 
 DB_FILENAME = "media.db"
 
+_FLUSH_STOP = object()
+
+# Optional per-download details stored alongside file/url/ts (schema v3, canonical_id since v4)
+HISTORY_DETAILS = ("title", "duration", "bytes", "extractor", "normalization", "timings", "elapsed",
+                   "canonical_id")
+
+_INSERT_HISTORY = (f"INSERT INTO history (file, url, ts, {', '.join(HISTORY_DETAILS)}) "
+                   f"VALUES ({', '.join('?' * (3 + len(HISTORY_DETAILS)))})")
+
+
+def _history_row(file: str, url: str, ts: Optional[int], details: Dict[str, Any]) -> tuple:
+    unknown = set(details) - set(HISTORY_DETAILS)
+    if unknown:
+        raise TypeError(f"Unknown history fields: {', '.join(sorted(unknown))}")
+    values = dict(details)
+    if isinstance(values.get("timings"), dict):
+        values["timings"] = json.dumps(values["timings"])
+    return (file, url, int(time.time() if ts is None else ts), *(values.get(k) for k in HISTORY_DETAILS))
+
+
+# --- schema migrations ---
+# Each migration runs once, in order, inside one transaction together with the
+# `PRAGMA user_version` bump that records it. Append new steps; never edit old ones.
+
+def _m001_base(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            id   INTEGER PRIMARY KEY AUTOINCREMENT,
+            file TEXT    NOT NULL,
+            url  TEXT    NOT NULL,
+            ts   INTEGER NOT NULL
+        )
+    """)
+    # Helpful index for time-ordered queries
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_ts ON history(ts)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            url           TEXT    NOT NULL,
+            normalization TEXT    NOT NULL,
+            state         TEXT    NOT NULL,
+            work_dir      TEXT,
+            error         TEXT,
+            created       INTEGER NOT NULL,
+            updated       INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)")
+
+
+def _create_history_fts(conn: sqlite3.Connection, columns: Tuple[str, ...]) -> None:
+    """(Re)build the external-content FTS5 index over `columns` of history, with its sync triggers."""
+    for trigger in ("history_ai", "history_ad", "history_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS history_fts")
+    try:
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE history_fts USING fts5(
+                {', '.join(columns)},
+                content='history', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return  # no FTS5 in this SQLite build; search falls back to LIKE
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    conn.execute(f"""CREATE TRIGGER history_ai AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts(rowid, {cols}) VALUES (new.id, {new});
+    END""")
+    conn.execute(f"""CREATE TRIGGER history_ad AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, {cols}) VALUES ('delete', old.id, {old});
+    END""")
+    conn.execute(f"""CREATE TRIGGER history_au AFTER UPDATE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, {cols}) VALUES ('delete', old.id, {old});
+        INSERT INTO history_fts(rowid, {cols}) VALUES (new.id, {new});
+    END""")
+    conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+
+def _m002_history_fts(conn: sqlite3.Connection) -> None:
+    _create_history_fts(conn, ("file", "url"))
+
+
+def _m003_history_details(conn: sqlite3.Connection) -> None:
+    for column, kind in (("title", "TEXT"), ("duration", "REAL"), ("bytes", "INTEGER"), ("extractor", "TEXT"),
+                         ("normalization", "TEXT"), ("timings", "TEXT"), ("elapsed", "REAL")):
+        conn.execute(f"ALTER TABLE history ADD COLUMN {column} {kind}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_extractor ON history(extractor)")
+    _create_history_fts(conn, ("file", "title", "url"))
+
+
+def _m004_history_canonical_id(conn: sqlite3.Connection) -> None:
+    # Filled in for older rows by `backfill_canonical_ids`, which needs yt-dlp
+    conn.execute("ALTER TABLE history ADD COLUMN canonical_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_canonical_id ON history(canonical_id, ts)")
+    # Re-index only when indexed text changes, not when the backfill sets canonical_id
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'history_au'").fetchone():
+        conn.execute("DROP TRIGGER history_au")
+        conn.execute("""CREATE TRIGGER history_au AFTER UPDATE OF file, title, url ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, file, title, url)
+                VALUES ('delete', old.id, old.file, old.title, old.url);
+            INSERT INTO history_fts(rowid, file, title, url) VALUES (new.id, new.file, new.title, new.url);
+        END""")
+
+
+def _m005_history_search_ranking(conn: sqlite3.Connection) -> None:
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'").fetchone():
+        return
+    # `ORDER BY rank` weights file and title over url; lets FTS5 keep only the top rows while scoring
+    conn.execute("INSERT INTO history_fts(history_fts, rank) VALUES ('rank', 'bm25(2.0, 2.0, 1.0)')")
+    # Character trigrams of the same columns, to find rows despite a typo (SQLite 3.34+)
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE history_trigram USING fts5(
+                file, title, url, content='history', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return  # no trigram tokenizer in this SQLite build; no typo tolerance
+    conn.execute("""CREATE TRIGGER history_trigram_ai AFTER INSERT ON history BEGIN
+        INSERT INTO history_trigram(rowid, file, title, url) VALUES (new.id, new.file, new.title, new.url);
+    END""")
+    conn.execute("""CREATE TRIGGER history_trigram_ad AFTER DELETE ON history BEGIN
+        INSERT INTO history_trigram(history_trigram, rowid, file, title, url)
+            VALUES ('delete', old.id, old.file, old.title, old.url);
+    END""")
+    conn.execute("""CREATE TRIGGER history_trigram_au AFTER UPDATE OF file, title, url ON history BEGIN
+        INSERT INTO history_trigram(history_trigram, rowid, file, title, url)
+            VALUES ('delete', old.id, old.file, old.title, old.url);
+        INSERT INTO history_trigram(rowid, file, title, url) VALUES (new.id, new.file, new.title, new.url);
+    END""")
+    conn.execute("INSERT INTO history_trigram(history_trigram) VALUES ('rebuild')")
+
+
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _m001_base,
+    _m002_history_fts,
+    _m003_history_details,
+    _m004_history_canonical_id,
+    _m005_history_search_ranking,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending MIGRATIONS to `conn` and return the resulting schema version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another connection may have migrated while we waited for the write lock
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                conn.rollback()
+                continue
+            MIGRATIONS[number - 1](conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return max(version, conn.execute("PRAGMA user_version").fetchone()[0])
+
+# Word characters a search term is made of; everything else separates terms
+_SEARCH_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+class HistoryWriter:
+    """
+    Write-behind inserter for the `history` table.
+
+    Rows are queued from any thread and written by a dedicated thread on its
+    own WAL connection, grouping whatever is queued (up to `max_batch` rows)
+    into a single transaction, so a burst of finished jobs costs one commit
+    instead of one fsync each. `flush` blocks until everything queued before it
+    is committed; `close` flushes and stops the thread (also run at exit).
+
+    A batch that fails is retried while the database is busy, then written one
+    row per transaction so a single bad row loses only itself; each row that
+    still can't be written is reported to `logger` (stderr without one).
+    """
+
+    # Attempts for a whole batch on a busy/locked database, doubling the delay each time
+    RETRIES = 3
+    RETRY_DELAY = 0.1
+
+    def __init__(self, db_path: str, max_batch: int = 1000, logger=None) -> None:
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.logger = logger
+        self.last_error: Optional[Exception] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, file: str, url: str, ts: Optional[int] = None, **details: Any) -> None:
+        if self._closed:
+            raise RuntimeError("HistoryWriter is closed")
+        self._queue.put(_history_row(file, url, ts, details))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every row submitted so far is committed. Returns False on timeout."""
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_FLUSH_STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            stop = False
+            while not stop:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                rows = [item for item in batch if isinstance(item, tuple)]
+                if rows:
+                    self._write(conn, rows)
+                for item in batch:
+                    if item is _FLUSH_STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        item.set()
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, rows: List[tuple]) -> None:
+        for attempt in range(self.RETRIES):
+            try:
+                with conn:
+                    conn.executemany(_INSERT_HISTORY, rows)
+                return
+            except sqlite3.OperationalError as e:
+                # Busy or locked past the connection's timeout: the same batch may go through shortly
+                self.last_error = e
+                time.sleep(self.RETRY_DELAY * 2 ** attempt)
+            except sqlite3.Error as e:
+                self.last_error = e
+                break
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(_INSERT_HISTORY, row)
+            except sqlite3.Error as e:
+                self.last_error = e
+                self._report(f"Could not save {row[0]} to history: {e}")
+
+    def _report(self, message: str) -> None:
+        if self.logger is not None:
+            self.logger.error(message)
+        else:
+            print(message, file=sys.stderr)
+
+
 class MediaDB:
     """
-    SQLite helper for ./media.db with a single table: history.
+    SQLite helper for ./media.db with tables: history, jobs.
+    The schema is versioned with `PRAGMA user_version` and brought up to date by `migrate`.
 
-    Table schema:
+    Table schema (history):
       - id INTEGER PRIMARY KEY AUTOINCREMENT
       - file TEXT NOT NULL
       - url  TEXT NOT NULL
       - ts   INTEGER NOT NULL  (Unix epoch seconds)
+      - title         TEXT     (source title)
+      - duration      REAL     (source duration, seconds)
+      - bytes         INTEGER  (size of the saved file)
+      - extractor     TEXT     (yt-dlp extractor key, e.g. "Youtube")
+      - normalization TEXT     (loudness profile)
+      - timings       TEXT     (JSON: seconds per pipeline stage)
+      - elapsed       REAL     (wall-clock seconds for the whole job)
+      - canonical_id  TEXT     (what was downloaded, e.g. "Youtube:dQw4w9WgXcQ", see urls.py; indexed)
+
+    Virtual table history_fts (FTS5, external content = history, rowid = history.id):
+      - file, title, url  — kept in sync by the history_ai/ad/au triggers, backfilled on creation.
+      When the SQLite build lacks FTS5, `search_history` falls back to LIKE scans.
+
+    Virtual table history_trigram (FTS5 trigram tokenizer, same content and columns; schema v5):
+      - used by `search_history` for typo-tolerant matches; absent without the trigram tokenizer.
+
+    Table schema (jobs) — journal of submitted downloads, used to resume after a crash/quit:
+      - id            INTEGER PRIMARY KEY AUTOINCREMENT
+      - url           TEXT NOT NULL
+      - normalization TEXT NOT NULL
+      - state         TEXT NOT NULL  (pending | running | done | failed | cancelled)
+      - work_dir      TEXT           (persistent directory holding partial files)
+      - error         TEXT
+      - created       INTEGER NOT NULL
+      - updated       INTEGER NOT NULL
 
     Methods:
-      - insert_history(file, url, ts=None) -> int
+      - insert_history(file, url, ts=None, **details) -> int
+      - insert_history_async(file, url, ts=None, **details)  (write-behind, see HistoryWriter)
+      - flush(timeout=None) -> bool
       - select_history() -> List[Dict[str, Any]]
+      - select_history_page(before=None, limit=100, offset=0) -> List[Dict[str, Any]]
+      - history_head() -> Optional[Tuple[int, int]]
+      - count_history_newer(thresholds, before=None) -> List[int]
+      - count_history_between(newer_than, until, before=None) -> int
+      - delete_history(ids) -> int
+      - delete_history_entry(file, ts) -> int
+      - search_history(text, limit=50) -> List[Dict[str, Any]]
+      - find_history(canonical_id, urls=()) -> Optional[Dict[str, Any]]
+      - backfill_canonical_ids(canonicalize, batch=500) -> int
+      - bytes_per_day(days=30) / throughput_by_extractor(since=None) / latency_percentile(95.0, since=None)
+      - journal_add(url, normalization, work_dir=None) -> int
+      - journal_update(job_id, state, error=None, work_dir=None)
+      - journal_unfinished() -> List[Dict[str, Any]]
+
+    The connection may be shared between threads; every statement runs under one lock.
+    File-backed databases use WAL, so the write-behind thread never blocks readers.
     """
 
-    def __init__(self, db_path: str = "./media.db") -> None:
+    JOB_PENDING = "pending"
+    JOB_RUNNING = "running"
+    JOB_FINISHED_STATES = ("done", "failed", "cancelled")
+
+    # Typo-tolerant search: candidates are this many best-ranked trigram matches per result asked for,
+    # kept when their words are this similar to the query's on average (difflib ratio)
+    FUZZY_CANDIDATES = 4
+    FUZZY_MIN_SIMILARITY = 0.75
+
+    def __init__(self, db_path: str = "./media.db", logger=None) -> None:
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.logger = logger  # where the history writer reports rows it couldn't save
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._writer: Optional[HistoryWriter] = None
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
 
-        # Initialize schema
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS history (
-                id   INTEGER PRIMARY KEY AUTOINCREMENT,
-                file TEXT    NOT NULL,
-                url  TEXT    NOT NULL,
-                ts   INTEGER NOT NULL
-            )
-        """)
-        # Helpful index for time-ordered queries
-        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_ts ON history(ts)")
-        self.conn.commit()
+        self.schema_version = migrate(self.conn)
+        self.fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+        ).fetchone() is not None
+        self.trigram = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_trigram'"
+        ).fetchone() is not None
 
     # context-manager niceties
     def __enter__(self) -> "MediaDB":
@@ -45,33 +377,323 @@ class MediaDB:
         self.close()
 
     def close(self) -> None:
-        if getattr(self, "conn", None):
-            self.conn.close()
-            self.conn = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            if getattr(self, "conn", None):
+                self.conn.close()
+                self.conn = None
 
     # --- API dedicated to the `history` table ---
-    def insert_history(self, file: str, url: str, ts: Optional[int] = None) -> int:
+    def insert_history(self, file: str, url: str, ts: Optional[int] = None, **details: Any) -> int:
         """
         Insert one history row. If `ts` is None, uses current Unix epoch seconds.
-        Returns the inserted row id.
+        `details` are any of HISTORY_DETAILS (timings may be a dict). Returns the inserted row id.
         """
-        if ts is None:
-            ts = int(time.time())
-
-        cur = self.conn.execute(
-            "INSERT INTO history (file, url, ts) VALUES (?, ?, ?)",
-            (file, url, int(ts)),
-        )
-        self.conn.commit()
+        with self._lock:
+            cur = self.conn.execute(_INSERT_HISTORY, _history_row(file, url, ts, details))
+            self.conn.commit()
         return int(cur.lastrowid or 0)
 
+    def insert_history_async(self, file: str, url: str, ts: Optional[int] = None, **details: Any) -> None:
+        """
+        Queue one history row for the background writer and return immediately.
+        In-memory databases can't be shared with the writer's connection, so they insert synchronously.
+        """
+        if self.db_path == ":memory:":
+            self.insert_history(file, url, ts, **details)
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = HistoryWriter(self.db_path, logger=self.logger)
+        self._writer.submit(file, url, ts, **details)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until queued async history writes are committed."""
+        writer = self._writer
+        return writer.flush(timeout) if writer is not None else True
+
     def select_history(self, newest_first: bool = True) -> List[Dict[str, Any]]:
         
         order = "DESC" if newest_first else "ASC"
         sql = f"SELECT id, file, url, ts FROM history ORDER BY ts {order}"
-        rows = self.conn.execute(sql).fetchall()
+        with self._lock:
+            rows = self.conn.execute(sql).fetchall()
+        return [dict(r) for r in rows]
+
+    def select_history_page(self, before: Optional[Tuple[int, int]] = None,
+                            limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        One page of history, newest first, using keyset pagination on (ts, id).
+        `before` is the (ts, id) of the last row of the previous page; None starts at the newest row.
+        Each page is an index range scan on idx_history_ts (which carries the rowid), so its cost does
+        not depend on how deep into the history it is. `offset` skips rows past `before` for random
+        access (a scrollbar jump), at O(offset) cost.
+        """
+        sql = "SELECT id, file, url, ts FROM history"
+        params: tuple = ()
+        if before is not None:
+            sql += " WHERE (ts, id) < (?, ?)"
+            params = (int(before[0]), int(before[1]))
+        sql += " ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self.conn.execute(sql, (*params, int(limit), int(offset))).fetchall()
+        return [dict(r) for r in rows]
+
+    def history_head(self) -> Optional[Tuple[int, int]]:
+        """(ts, id) of the newest history row, or None when the history is empty."""
+        with self._lock:
+            row = self.conn.execute("SELECT ts, id FROM history ORDER BY ts DESC, id DESC LIMIT 1").fetchone()
+        return (int(row[0]), int(row[1])) if row else None
+
+    def count_history_newer(self, thresholds: List[int], before: Optional[Tuple[int, int]] = None) -> List[int]:
+        """
+        For each ts threshold (newest first), how many rows have ts > threshold, limited to rows
+        older than `before` like select_history_page. Each band between consecutive thresholds is
+        counted once as an index range, so the cost follows the rows counted, not the table size.
+        """
+        counts: List[int] = []
+        total = 0
+        upper: Optional[int] = None
+        with self._lock:
+            for threshold in thresholds:
+                sql = "SELECT COUNT(*) FROM history WHERE ts > ?"
+                params: tuple = (int(threshold),)
+                if upper is not None:
+                    sql += " AND ts <= ?"
+                    params += (upper,)
+                if before is not None:
+                    sql += " AND (ts, id) < (?, ?)"
+                    params += (int(before[0]), int(before[1]))
+                total += self.conn.execute(sql, params).fetchone()[0]
+                counts.append(total)
+                upper = int(threshold)
+        return counts
+
+    def count_history_between(self, newer_than: int, until: int, before: Optional[Tuple[int, int]] = None) -> int:
+        """Rows with newer_than < ts <= until (and older than `before`); an index range count."""
+        sql = "SELECT COUNT(*) FROM history WHERE ts > ? AND ts <= ?"
+        params: tuple = (int(newer_than), int(until))
+        if before is not None:
+            sql += " AND (ts, id) < (?, ?)"
+            params += (int(before[0]), int(before[1]))
+        with self._lock:
+            return int(self.conn.execute(sql, params).fetchone()[0])
+
+    def delete_history(self, ids: List[int]) -> int:
+        """Delete history rows by id (the search index follows via trigger). Returns the number deleted."""
+        if not ids:
+            return 0
+        with self._lock:
+            cur = self.conn.execute(
+                f"DELETE FROM history WHERE id IN ({','.join('?' * len(ids))})", [int(i) for i in ids]
+            )
+            self.conn.commit()
+        return cur.rowcount
+
+    def delete_history_entry(self, file: str, ts: int) -> int:
+        """Delete a row known only by file and ts (e.g. one still queued for the writer, so no id yet)."""
+        self.flush()
+        with self._lock:
+            cur = self.conn.execute("DELETE FROM history WHERE file = ? AND ts = ?", (file, int(ts)))
+            self.conn.commit()
+        return cur.rowcount
+
+    def search_history(self, text: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Ranked history search over file names, titles and URLs; every term matches as a word prefix
+        ("lo fi" finds "Lo-Fi Mix.mp3", "beat" finds "Beats"). When no row contains all terms,
+        rows matching any of them are returned instead, best match first. When nothing matches
+        at all, rows sharing enough character trigrams with the query are returned ("beatels"
+        finds "Beatles"), if the SQLite build has the trigram tokenizer.
+        """
+        terms = _SEARCH_TERM.findall(text)
+        if not terms:
+            return []
+        for op in ("AND", "OR"):
+            rows = self._search_fts(terms, op, limit) if self.fts else self._search_like(terms, op, limit)
+            if rows:
+                return rows
+            if len(terms) == 1:
+                break
+        return self._search_fuzzy(terms, limit) if self.trigram else []
+
+    def find_history(self, canonical_id: str, urls: Sequence[str] = ()) -> Optional[Dict[str, Any]]:
+        """
+        The newest download of `canonical_id` (see urls.canonical_id), via its index; None if never.
+        Rows `backfill_canonical_ids` hasn't reached yet match when their URL is one of `urls`.
+        """
+        self.flush()
+        sql = "SELECT id, file, url, ts, title FROM history WHERE canonical_id = ?"
+        if urls:
+            # One statement, so a row the backfill indexes meanwhile matches one way or the other
+            sql += f" OR (canonical_id IS NULL AND url IN ({', '.join('?' * len(urls))}))"
+        with self._lock:
+            row = self.conn.execute(sql + " ORDER BY ts DESC LIMIT 1", (canonical_id, *urls)).fetchone()
+        return dict(row) if row else None
+
+    def backfill_canonical_ids(self, canonicalize: Callable[[str], str], batch: int = 500) -> int:
+        """
+        Fill in canonical_id for rows written before schema v4, from their URL, a batch
+        per transaction so other writers get in between. Returns the number of rows updated;
+        stops early if the database is closed meanwhile.
+        """
+        done = 0
+        while True:
+            with self._lock:
+                if self.conn is None:
+                    return done
+                rows = self.conn.execute(
+                    "SELECT id, url FROM history WHERE canonical_id IS NULL LIMIT ?", (int(batch),)
+                ).fetchall()
+            if not rows:
+                return done
+            updates = [(canonicalize(r["url"]), r["id"]) for r in rows]
+            with self._lock:
+                if self.conn is None:
+                    return done
+                self.conn.executemany("UPDATE history SET canonical_id = ? WHERE id = ?", updates)
+                self.conn.commit()
+            done += len(updates)
+
+    def _search_fts(self, terms: List[str], op: str, limit: int) -> List[Dict[str, Any]]:
+        query = f" {op} ".join('"{}"*'.format(t.replace('"', '""')) for t in terms)
+        with self._lock:
+            rows = self.conn.execute(
+                # FTS5 ranks every match (rank is bm25 with the weights set in migration 5) and keeps
+                # only the top `limit` as it goes; just those are joined back to history
+                "SELECT h.id, h.file, h.url, h.ts, f.score FROM ("
+                "  SELECT rowid, rank AS score FROM history_fts WHERE history_fts MATCH ? ORDER BY rank LIMIT ?"
+                ") f JOIN history h ON h.id = f.rowid ORDER BY f.score, h.id DESC",
+                (query, int(limit)),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _search_fuzzy(self, terms: List[str], limit: int) -> List[Dict[str, Any]]:
+        grams = {t[i:i + 3] for t in (t.lower() for t in terms) for i in range(len(t) - 2)}
+        if not grams:
+            return []  # trigrams can't match anything shorter
+        query = " OR ".join('"{}"'.format(g.replace('"', '""')) for g in grams)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT h.id, h.file, h.url, h.ts, h.title, f.score FROM ("
+                "  SELECT rowid, rank AS score FROM history_trigram WHERE history_trigram MATCH ? "
+                "  ORDER BY rank LIMIT ?"
+                ") f JOIN history h ON h.id = f.rowid ORDER BY f.score, h.id DESC",
+                (query, int(limit) * self.FUZZY_CANDIDATES),
+            ).fetchall()
+        # Sharing one trigram is too loose: rank by how close each term comes to some word of the row
+        ratios: Dict[Tuple[str, str], float] = {}  # words repeat across rows; compare each pair once
+
+        def ratio(term: str, word: str) -> float:
+            if (term, word) not in ratios:
+                ratios[term, word] = SequenceMatcher(None, term, word).ratio()
+            return ratios[term, word]
+
+        lowered = [t.lower() for t in terms]
+        scored = []
+        for r in rows:
+            words = set(_SEARCH_TERM.findall(f"{r['file']} {r['title'] or ''}".lower()))
+            similarity = sum(max((ratio(t, w) for w in words), default=0.0) for t in lowered) / len(terms)
+            if similarity >= self.FUZZY_MIN_SIMILARITY:
+                scored.append((-similarity, r["score"], -r["id"], {k: r[k] for k in ("id", "file", "url", "ts")}))
+        scored.sort(key=lambda s: s[:3])
+        return [dict(row, score=-similarity) for similarity, _, _, row in scored[:limit]]
+
+    def _search_like(self, terms: List[str], op: str, limit: int) -> List[Dict[str, Any]]:
+        where = f" {op} ".join("(file LIKE ? OR title LIKE ? OR url LIKE ?)" for _ in terms)
+        params = [f"%{t}%" for t in terms for _ in range(3)]
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, file, url, ts FROM history WHERE {where} ORDER BY ts DESC LIMIT ?",
+                (*params, int(limit)),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    # --- analytics over `history` ---
+    def bytes_per_day(self, days: int = 30, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Downloads and output bytes per local calendar day over the last `days` days, oldest first."""
+        since = int((time.time() if now is None else now) - days * 24 * 60 * 60)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT date(ts, 'unixepoch', 'localtime') AS day, COUNT(*) AS jobs, "
+                "COALESCE(SUM(bytes), 0) AS bytes FROM history WHERE ts >= ? GROUP BY day ORDER BY day",
+                (since,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def throughput_by_extractor(self, since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Mean per-job throughput (output bytes per second of pipeline time) for each extractor,
+        fastest first. Rows recorded before schema v3 carry no bytes/elapsed and are skipped.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT COALESCE(extractor, 'unknown') AS extractor, COUNT(*) AS jobs, SUM(bytes) AS bytes, "
+                "AVG(bytes / elapsed) AS bytes_per_sec FROM history "
+                "WHERE bytes > 0 AND elapsed > 0 AND ts >= ? GROUP BY 1 ORDER BY bytes_per_sec DESC",
+                (int(since or 0),),
+            ).fetchall()
         return [dict(r) for r in rows]
 
+    def latency_percentile(self, percentile: float = 95.0, since: Optional[int] = None) -> Optional[float]:
+        """Nearest-rank percentile of per-job wall-clock time in seconds (p95 by default); None without data."""
+        with self._lock:
+            n = self.conn.execute(
+                "SELECT COUNT(*) FROM history WHERE elapsed IS NOT NULL AND ts >= ?", (int(since or 0),)
+            ).fetchone()[0]
+            if not n:
+                return None
+            rank = max(0, math.ceil(percentile / 100.0 * n) - 1)
+            row = self.conn.execute(
+                "SELECT elapsed FROM history WHERE elapsed IS NOT NULL AND ts >= ? "
+                "ORDER BY elapsed LIMIT 1 OFFSET ?",
+                (int(since or 0), rank),
+            ).fetchone()
+        return float(row[0])
+
+    # --- API dedicated to the `jobs` journal ---
+    def journal_add(self, url: str, normalization: str, work_dir: Optional[str] = None) -> int:
+        """Record a newly submitted job as pending. Returns the journal id."""
+        now = int(time.time())
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (url, normalization, state, work_dir, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, normalization, self.JOB_PENDING, work_dir, now, now),
+            )
+            self.conn.commit()
+        return int(cur.lastrowid or 0)
+
+    def journal_update(self, job_id: int, state: str, error: Optional[str] = None,
+                       work_dir: Optional[str] = None) -> None:
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, work_dir = COALESCE(?, work_dir), updated = ? WHERE id = ?",
+                (state, error, work_dir, int(time.time()), job_id),
+            )
+            self.conn.commit()
+
+    def journal_unfinished(self) -> List[Dict[str, Any]]:
+        """Jobs that were pending or running when the app last stopped, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, url, normalization, state, work_dir, created FROM jobs "
+                "WHERE state IN (?, ?) ORDER BY id",
+                (self.JOB_PENDING, self.JOB_RUNNING),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def journal_prune(self, older_than: int) -> int:
+        """Delete finished journal rows last updated before `older_than` (epoch seconds)."""
+        with self._lock:
+            cur = self.conn.execute(
+                f"DELETE FROM jobs WHERE state IN ({','.join('?' * len(self.JOB_FINISHED_STATES))}) AND updated < ?",
+                (*self.JOB_FINISHED_STATES, int(older_than)),
+            )
+            self.conn.commit()
+        return cur.rowcount
+
 
 # --- Example usage ---
 if __name__ == "__main__":
@@ -1,57 +1,899 @@
 import tempfile
+import errno
 import os
+import queue
 import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import yt_dlp
-import imageio_ffmpeg
-from user_defaults import Normalization
+from yt_dlp.networking import Request
+from session_pool import Session, YoutubeDLPool, pool_key
+from transcoder import Transcoder, LoudnormStatsCache, StageTimer, find_ffmpeg
+from cache import CacheEntry, FileCache, InfoCache, cache_key, normalize_url
+from concurrency import AdaptiveConcurrency, ThrottleWatcher, backoff_delay
+from events import EventBus, ProgressReporter
+from logs import ErrorRecorder
+from urls import canonical_id, canonical_url
+from formats import DEFAULT_CODEC, DEFAULT_SELECTOR, OutputFormat, can_copy, format_selector, output_format
+from naming import DEFAULT_TEMPLATE, naming_fields, publish, render_name, staging_path, validate_template
+
+
+class DownloadResult(object):
+    """Outcome of one entry of a batch: either `path` or `error` is set."""
+
+    __slots__ = ("url", "index", "path", "title", "error", "timings", "elapsed", "extractor", "duration",
+                 "source_id")
+
+    def __init__(self, url: str, index: int = 0, path: Optional[str] = None,
+                 title: str = "", error: Optional[str] = None, timings: Optional[Dict[str, float]] = None,
+                 elapsed: Optional[float] = None, extractor: Optional[str] = None,
+                 duration: Optional[float] = None, source_id: Optional[str] = None):
+        self.url = url
+        self.index = index
+        self.path = path
+        self.title = title
+        self.error = error
+        self.timings = timings or {}
+        self.elapsed = elapsed
+        self.extractor = extractor
+        self.duration = duration
+        # What was downloaded, e.g. 'Youtube:dQw4w9WgXcQ' (see source_id and urls.canonical_id)
+        self.source_id = source_id
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None and self.error is None
+
+    def __repr__(self) -> str:
+        return f"<DownloadResult {self.url!r} #{self.index} path={self.path!r} error={self.error!r}>"
+
+
+class ProbeResult(object):
+    """
+    What a URL resolves to, learned without downloading (see `Downloader.probe`).
+    For playlists `duration` and `size` are totals; `size` is None when any entry's is unknown.
+    """
+
+    __slots__ = ("url", "title", "extractor", "source_id", "duration", "size", "entries", "cached")
+
+    # Used to guess a size from the duration when a site reports neither size nor bitrate (~128 kbit/s)
+    FALLBACK_BYTES_PER_SEC = 16000
+
+    def __init__(self, url: str, title: str = "", extractor: Optional[str] = None, source_id: Optional[str] = None,
+                 duration: Optional[float] = None, size: Optional[int] = None, entries: int = 1,
+                 cached: bool = False):
+        self.url = url
+        self.title = title
+        self.extractor = extractor
+        self.source_id = source_id
+        self.duration = duration
+        self.size = size
+        self.entries = entries
+        self.cached = cached
+
+    @property
+    def estimated_bytes(self) -> Optional[int]:
+        if self.size:
+            return self.size
+        if self.duration:
+            return int(self.duration * self.FALLBACK_BYTES_PER_SEC)
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {name: getattr(self, name) for name in self.__slots__}
+        d["estimated_bytes"] = self.estimated_bytes
+        return d
+
+    def __repr__(self) -> str:
+        return f"<ProbeResult {self.url!r} entries={self.entries} duration={self.duration} size={self.size}>"
+
+
+TEMP_PREFIX = "mediaext-"
+# Written into every temp/work dir in use: the pid of the process working in it
+OWNER_FILE = ".owner"
+
 
 class Downloader:
-    def __init__(self, logger):
-        self.ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+    # yt-dlp format for probes and normalized jobs; see formats.format_selector
+    FORMAT = DEFAULT_SELECTOR
+
+    # Containers ffmpeg can demux from a pipe (no seeking back to a trailing moov atom)
+    STREAMABLE_EXTS = ('webm', 'weba', 'ogg', 'opus', 'mp3', 'aac', 'flac', 'wav', 'mka')
+    STREAM_CHUNK_SIZE = 256 * 1024
+    FRAGMENT_RETRIES = 10
+
+    def __init__(self, logger, pool: Optional[YoutubeDLPool] = None, cache_dir: Optional[str] = None,
+                 streaming: bool = True, cache_max_bytes: int = 2 * 1024 ** 3,
+                 source_cache_max_bytes: int = 1024 ** 3, work_root: Optional[str] = None,
+                 fragment_concurrency: int = 4, adaptive_fragments: bool = True,
+                 events: Optional[EventBus] = None, ffmpeg_path: Optional[str] = None, info_ttl: float = 1800.0):
+        self.ffmpeg_path = ffmpeg_path or find_ffmpeg(os.path.join(cache_dir, 'ffmpeg.json') if cache_dir else None)
         self.logger = logger
+        self.pool = pool if pool is not None else YoutubeDLPool()
+        self.streaming = streaming
+        # Parallel fragment fetching for segmented (HLS/DASH) sources, backing off when throttled
+        self.fragments = AdaptiveConcurrency(fragment_concurrency, adaptive=adaptive_fragments)
+        # Typed progress/stage/result events for every batch, see events.py
+        self.events = events if events is not None else EventBus()
 
-    def download(self, url: str, normalization: str) -> str:
-        """Download best audio only as MP3, no metadata, no thumbnail"""
+        stats_path = os.path.join(cache_dir, 'loudnorm.json') if cache_dir else None
+        self.transcoder = Transcoder(self.ffmpeg_path, LoudnormStatsCache(stats_path), logger)
+        # Finished files, keyed by URL and by extractor/video id + format + normalization
+        self.cache = FileCache(os.path.join(cache_dir, 'downloads'), cache_max_bytes) if cache_dir else None
+        # Untouched source audio, so a different normalization is a local re-encode instead of a re-download
+        self.sources = FileCache(os.path.join(cache_dir, 'sources'), source_cache_max_bytes) if cache_dir else None
+        # Resolved metadata, so a probe and the download after it cost one extract_info
+        self.infos = InfoCache(os.path.join(cache_dir, 'info.db'), info_ttl) if cache_dir else None
+        # Persistent per-job directories, so partial downloads survive a crash or quit
+        self.work_root = work_root
+        self._running_tmpdirs = set()  # temp dirs of batches still in progress
+        if work_root:
+            os.makedirs(work_root, exist_ok=True)
 
-        normalization_map = { # TODO: check if these makes sense
-            Normalization.LOW.value: "loudnorm=I=-16:TP=-1.5:LRA=11",
-            Normalization.MEDIUM.value: "loudnorm=I=-14:TP=-1.0:LRA=7",
-            Normalization.HIGH.value: "loudnorm=I=-13:TP=-1.0:LRA=6",
+    def _ydl_opts(self, selector: Optional[str] = None) -> dict:
+        """
+        Options shared by every job; per-job bits go through Session.bind.
+        yt-dlp only fetches the source audio, normalization happens in the Transcoder stage.
+        """
+        return {
+            'format': selector or self.FORMAT,
+            'logger': self.logger,
+            'ffmpeg_location': self.ffmpeg_path,
+            'addmetadata': False,
+            'writethumbnail': False,
+            'embedthumbnail': False,
+            # yt-dlp's API default is 0 fragment retries, which silently skips throttled fragments
+            'fragment_retries': self.FRAGMENT_RETRIES,
+            'retry_sleep_functions': {'fragment': backoff_delay},
         }
 
-        with tempfile.TemporaryDirectory(delete=False) as tmpdir:
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'logger': self.logger,
-                'outtmpl': os.path.join(tmpdir, '%(title)s.%(ext)s'),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '0',
-                }],
-                'ffmpeg_location': self.ffmpeg_path,
-                'postprocessor_args': {
-                    'ffmpeg': ['-af', normalization_map[normalization]],
-                },
-                'addmetadata': False,
-                'writethumbnail': False,
-                'embedthumbnail': False,
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-
-            for file in os.listdir(tmpdir):
-                if file.endswith('.mp3'):
-                    return os.path.join(tmpdir, file)
-            
+    def _session(self, selector: Optional[str] = None):
+        selector = selector or self.FORMAT
+        return self.pool.session(pool_key(selector), lambda: self._ydl_opts(selector))
+
+    def download(self, url: str, normalization: str, cancel_event: Optional[threading.Event] = None,
+                 codec: str = DEFAULT_CODEC) -> str:
+        """
+        Download best audio only as `codec` (MP3 by default), no metadata, no thumbnail.
+        If `cancel_event` gets set, the download is aborted with yt_dlp's DownloadCancelled.
+        Playlist URLs only fetch the single video they point at; use `download_batch` for playlists.
+        The file is left in a temp dir for the caller to `move_file` out; if there is no file,
+        that dir is removed right away instead of waiting for `reclaim_orphans`.
+        """
+
+        tmpdir = tempfile.mkdtemp(prefix=TEMP_PREFIX)
+        try:
+            results = self.download_batch([url], normalization, cancel_event=cancel_event, noplaylist=True,
+                                          work_dir=tmpdir, codec=codec)
+            if not results:
+                raise FileNotFoundError("Downloaded file not found")
+            if not results[0].ok:
+                raise yt_dlp.utils.DownloadError(results[0].error)
+        except BaseException:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+        return results[0].path
+
+    def probe(self, url: str, noplaylist: bool = False, max_age: Optional[float] = None,
+              normalization: Optional[str] = None, codec: str = DEFAULT_CODEC) -> ProbeResult:
+        """
+        Resolve `url` without downloading: title, duration, size of the format that would be
+        fetched and the number of entries. The info is cached (see InfoCache) and reused by
+        `download_batch` with the same `normalization` and `codec`, so probing first costs
+        nothing extra. Raises DownloadError on failure.
+        """
+
+        selector = format_selector(output_format(codec).codec, normalization) if normalization else None
+        key = self._info_key(url, noplaylist, selector)
+        info = self.infos.get(key, max_age) if self.infos is not None else None
+        cached = info is not None
+        if info is None:
+            with self._session(selector) as session:
+                recorder = ErrorRecorder(self.logger)
+                session.bind(noplaylist=noplaylist, ignoreerrors=True, logger=recorder)
+                info = self._extract(session.ydl, url, noplaylist, selector)
+                if info is None:
+                    raise yt_dlp.utils.DownloadError(recorder.last or f"Could not resolve {url}")
+
+        if info.get('_type') in ('playlist', 'multi_video'):
+            entries = [e for e in info.get('entries') or [] if e]
+        else:
+            entries = [info]
+        durations = [e.get('duration') for e in entries]
+        sizes = [self._estimated_size(e) for e in entries]
+        return ProbeResult(url, info.get('title') or "", info.get('extractor_key'),
+                           self.source_id(info) if len(entries) == 1 and entries[0] is info else None,
+                           sum(d for d in durations if d) or None,
+                           sum(sizes) if sizes and None not in sizes else None,
+                           len(entries), cached)
+
+    @staticmethod
+    def _estimated_size(info: Dict[str, Any]) -> Optional[int]:
+        """Bytes of the format(s) yt-dlp selected: reported sizes, else bitrate x duration."""
+        total = 0
+        for f in info.get('requested_formats') or [info]:
+            size = f.get('filesize') or f.get('filesize_approx')
+            if not size:
+                rate = f.get('abr') or f.get('tbr')  # kbit/s
+                if not rate or not info.get('duration'):
+                    return None
+                size = rate * 1000 / 8 * info['duration']
+            total += size
+        return int(total)
+
+    @staticmethod
+    def _content_length(ydl: yt_dlp.YoutubeDL, info: Dict[str, Any]) -> Optional[int]:
+        try:
+            with ydl.urlopen(Request(info['url'], headers=info.get('http_headers') or {}, method='HEAD')) as r:
+                length = r.headers.get('Content-Length')
+        except Exception:
+            return None
+        return int(length) if length and length.isdigit() else None
+
+    def _info_key(self, url: str, noplaylist: bool, selector: Optional[str] = None) -> str:
+        return cache_key("info", canonical_id(url) + (" noplaylist" if noplaylist else ""), selector or self.FORMAT)
+
+    def _resolve(self, ydl: yt_dlp.YoutubeDL, url: str, noplaylist: bool,
+                 selector: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """extract_info(download=False) for `url`, from the info cache when fresh; also says if it was cached."""
+        if self.infos is not None:
+            info = self.infos.get(self._info_key(url, noplaylist, selector))
+            if info is not None:
+                self.logger.info(f"[probe] Reusing resolved metadata for {url}")
+                return info, True
+        return self._extract(ydl, url, noplaylist, selector), False
+
+    def _extract(self, ydl: yt_dlp.YoutubeDL, url: str, noplaylist: bool,
+                 selector: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        extract_info(download=False) for `url`, sanitized and put in the info cache. Probes and
+        downloads both resolve through here, so a cached info looks the same whoever stored it.
+        """
+        info = ydl.extract_info(url, download=False)
+        if info is None:
+            return None
+        info = ydl.sanitize_info(info)
+        if info.get('direct') and not self._estimated_size(info):
+            # Direct links carry no size in their info; the server's Content-Length does
+            info['filesize'] = self._content_length(ydl, info)
+        if self.infos is not None:
+            self.infos.put(self._info_key(url, noplaylist, selector), info)
+        return info
+
+    def download_batch(self, urls: Iterable[str], normalization: str,
+                       on_result: Optional[Callable[[DownloadResult], None]] = None,
+                       cancel_event: Optional[threading.Event] = None,
+                       noplaylist: bool = False, work_dir: Optional[str] = None,
+                       job: Optional[int] = None, output_dir: Optional[str] = None,
+                       name_template: Optional[str] = None, codec: Optional[str] = None) -> List[DownloadResult]:
+        """
+        Download a list of URLs (each may be a playlist) through one pooled YoutubeDL session.
+        Files come out as `codec` (see formats.py, MP3 by default); with Normalization.OFF,
+        sources already in that codec are remuxed instead of re-encoded.
+
+        Every finished file is reported to `on_result` as soon as it is ready,
+        and failures are reported per entry instead of aborting the batch.
+        Each file lands in its own temp subdirectory so `move_file` can clean it up individually.
+        With an `output_dir`, ffmpeg instead writes straight into a staging file there and the
+        result is renamed to its final name (see naming.publish), so nothing is copied afterwards.
+        That name comes from `name_template` (see naming.render_name), '{title}' by default.
+        With a `work_dir` (see `job_dir`) the layout is deterministic, so running the same
+        batch again after an interruption continues from the partial files left behind.
+        Progress, stage and result events go to `self.events`, tagged with `job`.
+        Returns all results in completion order.
+        """
+
+        results: List[DownloadResult] = []
+        reporter = ProgressReporter(self.events, job)
+        template = validate_template(name_template or DEFAULT_TEMPLATE)
+        output = output_format(codec or DEFAULT_CODEC)
+        selector = format_selector(output.codec, normalization)
+
+        def emit(result: DownloadResult):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+            # After on_result, so subscribers see where the caller put the file
+            reporter.result(result)
+
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+            tmpdir = work_dir
+        else:
+            tmpdir = tempfile.mkdtemp(prefix=TEMP_PREFIX)
+            self._running_tmpdirs.add(tmpdir)
+        self._claim(tmpdir)
+
+        try:
+            with self._session(selector) as session:
+                session.bind(progress_hooks=[self._cancel_hook(cancel_event), reporter.progress_hook],
+                             postprocessor_hooks=[reporter.postprocessor_hook],
+                             noplaylist=noplaylist,
+                             ignoreerrors=True)
+                ydl = session.ydl
+                for n, url in enumerate(urls):
+                    # Cache hits never reach a progress hook, so look at the flag between entries too
+                    self._check_cancelled(cancel_event)
+                    if work_dir:
+                        url_dir = os.path.join(work_dir, f"{n:04d}")
+                        os.makedirs(url_dir, exist_ok=True)
+                    else:
+                        url_dir = tempfile.mkdtemp(dir=tmpdir)
+                    session.set_outtmpl(os.path.join(url_dir, '%(playlist_index|0)s-%(id)s', '%(title)s.%(ext)s'))
+                    # noplaylist changes what a URL resolves to, so it is part of the URL key
+                    url_key = self._cache_key("url", normalize_url(url) + (" noplaylist" if noplaylist else ""),
+                                              normalization, output, selector)
+                    reporter.at(url)
+                    if self._emit_cached(url_key, url, 0, url_dir, emit, reporter, output_dir, template):
+                        continue
+                    url_source_keys = self._source_cache_keys(
+                        "url", normalize_url(url) + (" noplaylist" if noplaylist else ""), selector)
+                    if self._emit_from_source(url_source_keys, url, url_dir, normalization, emit, [url_key], reporter,
+                                              output_dir, template, output, selector):
+                        continue
+                    # youtu.be/x, watch?v=x and shorts/x are one video: try the id cache before resolving
+                    known_id = canonical_id(url)
+                    if self._emit_cached(self._cache_key("id", known_id, normalization, output, selector), url, 0,
+                                         url_dir, emit, reporter, output_dir, template):
+                        continue
+                    if self._emit_from_source(self._source_cache_keys("id", known_id, selector), url, url_dir,
+                                              normalization, emit, [url_key], reporter, output_dir, template,
+                                              output, selector):
+                        continue
+
+                    # Resolve the URL (and playlist entries) once, then fetch entry by entry.
+                    # With ignoreerrors yt-dlp only logs why, so keep what it logs for the results
+                    recorder = ErrorRecorder(self.logger)
+                    try:
+                        with session.override(logger=recorder):
+                            info, from_cache = self._resolve(ydl, url, noplaylist, selector)
+                    except yt_dlp.utils.DownloadCancelled:
+                        raise
+                    except Exception as e:
+                        emit(DownloadResult(url, error=str(e)))
+                        continue
+                    if info is None:
+                        emit(DownloadResult(url, error=recorder.last or "Extraction failed"))
+                        continue
+
+                    if info.get('_type') in ('playlist', 'multi_video'):
+                        entries = list(info.get('entries') or [])
+                    else:
+                        entries = [info]
+                    # A playlist URL maps to many files, so only single videos are cached by URL
+                    single = len(entries) == 1 and entries[0] is info
+                    # Entries that failed to resolve logged one error each, in playlist order
+                    entry_errors = iter(recorder.errors)
+
+                    for i, entry in enumerate(entries, start=1):
+                        self._check_cancelled(cancel_event)
+                        index = int((entry or {}).get('playlist_index') or (i if len(entries) > 1 else 0))
+                        if entry is None:
+                            emit(DownloadResult(url, index=index, error=next(entry_errors, "Extraction failed")))
+                            continue
+                        reporter.at(url, index, entry.get('extractor_key'))
+                        id_key = self._cache_key("id", self.source_id(entry), normalization, output, selector)
+                        if self._emit_cached(id_key, url, index, url_dir, emit, reporter, output_dir, template):
+                            continue
+                        timer = reporter.timer()
+                        try:
+                            try:
+                                path = self._fetch(session, entry, normalization, timer, cancel_event,
+                                                   url_source_keys[:1] if single else [], reporter, output_dir,
+                                                   output, selector)
+                            except yt_dlp.utils.DownloadCancelled:
+                                raise
+                            except Exception as e:
+                                if not from_cache:
+                                    raise
+                                # Stream URLs in cached metadata may have expired: resolve again, retry once
+                                self.logger.warning(f"[probe] Download with cached metadata failed ({e}), retrying")
+                                self.infos.discard(self._info_key(url, noplaylist, selector))
+                                entry = ydl.extract_info(entry.get('webpage_url') or url, download=False) or entry
+                                timer = reporter.timer()
+                                path = self._fetch(session, entry, normalization, timer, cancel_event,
+                                                   url_source_keys[:1] if single else [], reporter, output_dir,
+                                                   output, selector)
+                            if output_dir:
+                                path = self._publish(path, output_dir, template, naming_fields(entry))
+                        except yt_dlp.utils.DownloadCancelled:
+                            raise
+                        except Exception as e:
+                            emit(DownloadResult(url, index=index, title=entry.get('title') or "", error=str(e)))
+                            continue
+                        self.logger.info(f"Timings for {entry.get('title') or url}: {timer.summary()}")
+                        meta = self._source_meta(entry)
+                        # Cached under the intended name, not the '(2)' publish may have picked
+                        filename = os.path.splitext(os.path.basename(ydl.prepare_filename(entry)))[0] + output.ext
+                        source_id = self.source_id(entry)
+                        self._remember(id_key, path, entry.get('title') or "", [url_key] if single else [],
+                                       {**meta, "naming": naming_fields(entry), "source_id": source_id}, filename)
+                        emit(DownloadResult(url, index=index, path=path, title=entry.get('title') or "",
+                                            timings=dict(timer.stages), elapsed=timer.total, source_id=source_id,
+                                            **meta))
+        finally:
+            self._running_tmpdirs.discard(tmpdir)
+            if output_dir and not work_dir:
+                # Results already live in output_dir, nobody will move_file out of here
+                shutil.rmtree(tmpdir, ignore_errors=True)
+            elif not work_dir:
+                # Files not moved out yet keep their folders; move_file removes those later
+                self._prune(tmpdir)
+
+        return results
+
+    def iter_batch(self, urls: Iterable[str], normalization: str,
+                   cancel_event: Optional[threading.Event] = None,
+                   codec: Optional[str] = None) -> Iterator[DownloadResult]:
+        """Generator flavour of `download_batch`: yields results while the batch keeps running."""
+
+        results: "queue.Queue" = queue.Queue()
+        done = object()
+        failure = []
+
+        def run():
+            try:
+                self.download_batch(urls, normalization, on_result=results.put, cancel_event=cancel_event,
+                                    codec=codec)
+            except Exception as e:
+                failure.append(e)
+            finally:
+                results.put(done)
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield item
+        if failure:
+            raise failure[0]
+
+    # --- cache ---
+    def _cache_key(self, kind: str, source: str, normalization: str, output: Optional[OutputFormat] = None,
+                   selector: Optional[str] = None) -> str:
+        return cache_key(kind, source, selector or self.FORMAT, (output or output_format(DEFAULT_CODEC)).codec,
+                         normalization)
+
+    def _source_cache_key(self, kind: str, source: str, selector: Optional[str] = None) -> str:
+        return cache_key("source", kind, source, selector or self.FORMAT)
+
+    def _source_cache_keys(self, kind: str, source: str, selector: Optional[str] = None) -> List[str]:
+        """Source keys to look up, first the one `selector` stores under: any cached source beats a download."""
+        keys = [self._source_cache_key(kind, source, selector)]
+        if selector and selector != self.FORMAT:
+            keys.append(self._source_cache_key(kind, source))
+        return keys
+
+    def _cached_source(self, keys: List[str]) -> Optional[CacheEntry]:
+        if self.sources is None:
+            return None
+        for key in keys:
+            source = self.sources.get(key)
+            if source is not None:
+                return source
+        return None
+
+    @staticmethod
+    def _source_meta(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Descriptive fields kept with cache entries so cache hits report them too."""
+        return {"extractor": entry.get('extractor_key'), "duration": entry.get('duration')}
+
+    def _remember(self, key: str, path: str, title: str, aliases: List[str],
+                  meta: Optional[Dict[str, Any]] = None, filename: Optional[str] = None) -> None:
+        if self.cache is not None:
+            self.cache.put(key, path, title, aliases, meta=meta, filename=filename)
+
+    def _remember_source(self, entry: Dict[str, Any], raw: str, filename: str, aliases: List[str],
+                         selector: Optional[str] = None) -> None:
+        if self.sources is None:
+            return
+        meta = {"source_id": self.source_id(entry), "stats_key": self.source_key(entry), **self._source_meta(entry),
+                "naming": naming_fields(entry), "acodec": entry.get('acodec')}
+        self.sources.put(self._source_cache_key("id", self.source_id(entry), selector), raw, entry.get('title') or "",
+                         aliases, meta=meta, filename=filename)
+
+    def _transcode_cached_source(self, source: CacheEntry, dest_dir: str, normalization: str,
+                                 timer: StageTimer, output_dir: Optional[str] = None,
+                                 output: Optional[OutputFormat] = None) -> str:
+        output = output or output_format(DEFAULT_CODEC)
+        with timer.stage("cache"):
+            raw = self.sources.materialize(source, dest_dir)
+        copy = can_copy(source.meta, output, normalization)
+        self.logger.info(f"[cache] {'Remuxing' if copy else 'Converting'} cached source {source.filename} "
+                         f"to {output.codec} ({normalization} normalization)")
+        return self._transcode_file(raw, normalization, source.meta.get("stats_key", ""), timer, output_dir,
+                                    output, copy)
+
+    def _emit_from_source(self, keys: List[str], url: str, tmpdir: str, normalization: str,
+                          emit: Callable[[DownloadResult], None], aliases: List[str],
+                          reporter: Optional[ProgressReporter] = None, output_dir: Optional[str] = None,
+                          template: str = DEFAULT_TEMPLATE, output: Optional[OutputFormat] = None,
+                          selector: Optional[str] = None) -> bool:
+        """Re-encode the first cached source of `keys` without touching the network; False on a miss."""
+
+        source = self._cached_source(keys)
+        if source is None:
+            return False
+        output = output or output_format(DEFAULT_CODEC)
+        timer = reporter.timer() if reporter else StageTimer()
+        try:
+            path = self._transcode_cached_source(source, tempfile.mkdtemp(prefix="source-", dir=tmpdir),
+                                                 normalization, timer, output_dir, output)
+        except Exception as e:
+            self.logger.warning(f"[cache] Cached source unusable, downloading again: {e}")
+            return False
+        fields = source.meta.get("naming") or {"title": source.title}
+        if output_dir:
+            try:
+                path = self._publish(path, output_dir, template, fields)
+            except Exception as e:
+                emit(DownloadResult(url, title=source.title, error=str(e)))
+                return True
+        meta = {"extractor": source.meta.get("extractor"), "duration": source.meta.get("duration")}
+        source_id = source.meta.get("source_id")
+        self._remember(self._cache_key("id", source_id or "", normalization, output, selector), path,
+                       source.title, aliases, {**meta, "naming": fields, "source_id": source_id},
+                       os.path.splitext(source.filename)[0] + output.ext)
+        emit(DownloadResult(url, path=path, title=source.title, timings=dict(timer.stages),
+                            elapsed=timer.total, source_id=source_id, **meta))
+        return True
+
+    @staticmethod
+    def _publish(staged: str, output_dir: str, template: str, fields: Dict[str, str]) -> str:
+        """Give a staging file its templated name in `output_dir`; the staging file is gone either way."""
+        try:
+            return publish(staged, output_dir, render_name(template, fields, os.path.splitext(staged)[1]))
+        except BaseException:
+            if os.path.exists(staged):
+                os.remove(staged)
+            raise
+
+    def _emit_cached(self, key: str, url: str, index: int, tmpdir: str,
+                     emit: Callable[[DownloadResult], None], reporter: Optional[ProgressReporter] = None,
+                     output_dir: Optional[str] = None, template: str = DEFAULT_TEMPLATE) -> bool:
+        """
+        Serve `key` from the cache into a fresh subdirectory of `tmpdir` (or `output_dir`); False on a miss.
+        A cache object that vanished or can't be read counts as a miss; failing to save the file is
+        reported as this entry's error.
+        """
+
+        if self.cache is None:
+            return False
+        timer = reporter.timer() if reporter else StageTimer()
+        with timer.stage("cache"):
+            try:
+                entry = self.cache.get(key)
+            except Exception as e:
+                self.logger.warning(f"[cache] Lookup failed, downloading instead: {e}")
+                return False
+            if entry is None:
+                return False
+            staged = None
+            try:
+                if output_dir:
+                    # materialize clones when it can, which needs the name to be free
+                    staged = staging_path(output_dir, os.path.splitext(entry.filename)[1] or ".mp3")
+                    os.remove(staged)
+                    staged = self.cache.materialize(entry, output_dir, os.path.basename(staged))
+                else:
+                    path = self.cache.materialize(entry, tempfile.mkdtemp(prefix="cached-", dir=tmpdir))
+            except FileNotFoundError as e:
+                # Evicted between lookup and copy
+                self.logger.warning(f"[cache] {entry.filename} is gone, downloading instead: {e}")
+                return False
+            except Exception as e:
+                if staged and os.path.exists(staged):
+                    os.remove(staged)
+                emit(DownloadResult(url, index=index, title=entry.title, error=str(e)))
+                return True
+            if output_dir:
+                fields = entry.meta.get("naming") or {"title": os.path.splitext(entry.filename)[0]}
+                try:
+                    path = self._publish(staged, output_dir, template, fields)
+                except Exception as e:
+                    emit(DownloadResult(url, index=index, title=entry.title, error=str(e)))
+                    return True
+        self.logger.info(f"[cache] Reusing {entry.filename} ({timer.summary()})")
+        emit(DownloadResult(url, index=index, path=path, title=entry.title, timings=dict(timer.stages),
+                            elapsed=timer.total, extractor=entry.meta.get("extractor"),
+                            duration=entry.meta.get("duration"), source_id=entry.meta.get("source_id")))
+        return True
+
+    # --- pipeline stages ---
+    def _fetch(self, session: Session, entry: Dict[str, Any], normalization: str,
+               timer: StageTimer, cancel_event: Optional[threading.Event],
+               source_aliases: Optional[List[str]] = None, reporter: Optional[ProgressReporter] = None,
+               output_dir: Optional[str] = None, output: Optional[OutputFormat] = None,
+               selector: Optional[str] = None) -> str:
+        """
+        Produce the output file (normalized MP3 by default) for one resolved entry: re-encode a cached
+        source if there is one, otherwise download it (streaming into ffmpeg when the source allows it)
+        and cache the source. With an `output_dir` the file is an unpublished staging file there
+        (see `_publish`).
+        """
+
+        ydl = session.ydl
+        output = output or output_format(DEFAULT_CODEC)
+        source = self._cached_source(self._source_cache_keys("id", self.source_id(entry), selector))
+        if source is not None:
+            return self._transcode_cached_source(source, os.path.dirname(ydl.prepare_filename(entry)),
+                                                 normalization, timer, output_dir, output)
+
+        copy = can_copy(entry, output, normalization)
+        if copy:
+            self.logger.info(f"[format] Source is already {entry.get('acodec')}, remuxing to {output.ext} "
+                             f"without re-encoding")
+        entry_dir = os.path.dirname(ydl.prepare_filename(entry))
+        # An unknown codec is checked on the downloaded file, so a possible remux rules out streaming
+        if self.streaming and self._streamable(entry) and copy is not None and not self._has_partials(entry_dir):
+            return self._stream(ydl, entry, normalization, timer, cancel_event, source_aliases or [], reporter,
+                                output_dir, output, copy, selector)
+
+        # ignoreerrors is only wanted while resolving playlists; surface download errors here
+        watcher = ThrottleWatcher(self.logger)
+        try:
+            with session.override(ignoreerrors=False, logger=watcher,
+                                  concurrent_fragment_downloads=self.fragments.current):
+                with timer.stage("download"):
+                    info = ydl.process_ie_result(dict(entry), download=True)
+        finally:
+            self._adapt_fragments(entry, watcher.throttled)
+
+        raw = self._downloaded_path(info)
+        if not raw or not os.path.exists(raw):
             raise FileNotFoundError("Downloaded file not found")
+        self._remember_source(info, raw, os.path.basename(raw), source_aliases or [], selector)
+        return self._transcode_file(raw, normalization, self.source_key(info), timer, output_dir, output, copy)
+
+    def _adapt_fragments(self, entry: Dict[str, Any], throttled: bool) -> None:
+        """Feed the outcome of a segmented download back into the fragment concurrency controller."""
+
+        if entry.get('protocol') in ('http', 'https', None) or not self.fragments.adaptive:
+            return
+        before = self.fragments.current
+        after = self.fragments.on_throttled() if throttled else self.fragments.on_success()
+        if after != before:
+            reason = "throttling detected" if throttled else "no throttling"
+            self.logger.info(f"[fragments] {reason}, concurrency {before} -> {after}")
+
+    @staticmethod
+    def _has_partials(directory: str) -> bool:
+        """True if an earlier, interrupted run left yt-dlp partial files that file mode can resume."""
+        try:
+            return any(name.endswith(('.part', '.ytdl')) or '.part-Frag' in name for name in os.listdir(directory))
+        except FileNotFoundError:
+            return False
+
+    def _streamable(self, entry: Dict[str, Any]) -> bool:
+        return (entry.get('protocol') in ('http', 'https')
+                and bool(entry.get('url'))
+                and not entry.get('requested_formats')
+                and entry.get('ext') in self.STREAMABLE_EXTS)
+
+    def _stream(self, ydl: yt_dlp.YoutubeDL, entry: Dict[str, Any], normalization: str,
+                timer: StageTimer, cancel_event: Optional[threading.Event], source_aliases: List[str],
+                reporter: Optional[ProgressReporter] = None, output_dir: Optional[str] = None,
+                output: Optional[OutputFormat] = None, copy: bool = False, selector: Optional[str] = None) -> str:
+        """
+        Pipe the source into ffmpeg while it downloads, so total time tends to max(download, encode).
+        When the source cache is enabled the bytes are teed to disk and cached afterwards.
+        """
+
+        output = output or output_format(DEFAULT_CODEC)
+        stem = os.path.splitext(ydl.prepare_filename(entry))[0]
+        ext = entry.get('ext') or 'bin'
+        dest = staging_path(output_dir, output.ext) if output_dir else stem + output.ext
+        raw = stem + '.source.' + ext if self.sources is not None else None
+        os.makedirs(os.path.dirname(stem), exist_ok=True)
+        self.logger.info(f"[stream] Piping {entry.get('format_id')} ({entry.get('ext')}) into ffmpeg")
+
+        total = entry.get('filesize') or entry.get('filesize_approx')
+
+        def chunks():
+            response = ydl.urlopen(Request(entry['url'], headers=entry.get('http_headers') or {}))
+            tee = open(raw, 'wb') if raw else None
+            try:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise yt_dlp.utils.DownloadCancelled()
+                    data = response.read(self.STREAM_CHUNK_SIZE)
+                    if not data:
+                        if reporter is not None:
+                            reporter.chunk(0, total, finished=True)
+                        break
+                    if tee is not None:
+                        tee.write(data)
+                    if reporter is not None:
+                        reporter.chunk(len(data), total)
+                    yield data
+            finally:
+                response.close()
+                if tee is not None:
+                    tee.close()
+
+        try:
+            self.transcoder.encode_stream(chunks(), dest, normalization, self.source_key(entry), timer,
+                                          output=output, copy=copy)
+            if raw:
+                self._remember_source(entry, raw, os.path.basename(stem) + '.' + ext, source_aliases, selector)
+        except BaseException:
+            # A partial encode is of no use to anyone, in output_dir or in the batch's temp dir
+            if os.path.exists(dest):
+                os.remove(dest)
+            raise
+        finally:
+            if raw and os.path.exists(raw):
+                os.remove(raw)
+        return dest
+
+    def _transcode_file(self, raw: str, normalization: str, source_key: str, timer: StageTimer,
+                        output_dir: Optional[str] = None, output: Optional[OutputFormat] = None,
+                        copy: Optional[bool] = False) -> str:
+        """Encode (or remux) `raw` into `output`; `copy=None` means the source codec is read from the file."""
+        output = output or output_format(DEFAULT_CODEC)
+        if copy is None:
+            copy = can_copy({"acodec": self.transcoder.audio_codec(raw)}, output, normalization)
+            if copy:
+                self.logger.info(f"[format] {os.path.basename(raw)} is already {output.codec}, remuxing "
+                                 f"without re-encoding")
+        dest = os.path.splitext(raw)[0] + output.ext
+        if output_dir:
+            out = staging_path(output_dir, output.ext)
+            try:
+                self.transcoder.normalize(raw, out, normalization, source_key, timer, output, copy)
+            except BaseException:
+                os.remove(out)
+                raise
+            os.remove(raw)
+            return out
+        out = dest + '.part' + output.ext if dest == raw else dest
+        self.transcoder.normalize(raw, out, normalization, source_key, timer, output, copy)
+        os.remove(raw)
+        if out != dest:
+            os.replace(out, dest)
+        return dest
+
+    @staticmethod
+    def _downloaded_path(info: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not info:
+            return None
+        downloads = info.get('requested_downloads') or []
+        if downloads:
+            return downloads[0].get('filepath')
+        return info.get('filepath')
+
+    @staticmethod
+    def source_id(info: Dict[str, Any]) -> str:
+        """Identifies a video independent of the chosen format, e.g. 'Youtube:dQw4w9WgXcQ'."""
+        if info.get('extractor_key') == 'Generic':
+            # Generic ids are just the file name stem, which is not unique across sites
+            return f"Generic:{canonical_url(info.get('webpage_url') or info.get('url') or '')}"
+        return f"{info.get('extractor_key')}:{info.get('id')}"
+
+    @staticmethod
+    def source_key(info: Dict[str, Any]) -> str:
+        """Identifies one concrete source stream, used to cache loudness measurements."""
+        return f"{Downloader.source_id(info)}:{info.get('format_id')}"
+
+    @staticmethod
+    def _cancel_hook(cancel_event: Optional[threading.Event]):
+        def hook(d):
+            Downloader._check_cancelled(cancel_event)
+        return hook
+
+    @staticmethod
+    def _check_cancelled(cancel_event: Optional[threading.Event]) -> None:
+        if cancel_event is not None and cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled()
+
+    # --- persistent work dirs ---
+    def job_dir(self, job_id: int) -> Optional[str]:
+        """Stable work directory for a journaled job, or None when no `work_root` is configured."""
+        if not self.work_root:
+            return None
+        return os.path.join(self.work_root, f"job-{job_id}")
+
+    @staticmethod
+    def _claim(directory: str) -> None:
+        """Mark `directory` as in use by this process, so no other process's janitor removes it."""
+        with open(os.path.join(directory, OWNER_FILE), "w", encoding="utf-8") as f:
+            f.write(str(os.getpid()))
+
+    @staticmethod
+    def _owner_alive(directory: str) -> bool:
+        try:
+            with open(os.path.join(directory, OWNER_FILE), "r", encoding="utf-8") as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return False
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # alive, just someone else's
+        return True
+
+    @staticmethod
+    def _prune(directory: str) -> None:
+        """Remove `directory` and its subfolders if nothing but owner markers is left in them."""
+        for root, dirs, files in os.walk(directory, topdown=False):
+            if files == [OWNER_FILE]:
+                os.remove(os.path.join(root, OWNER_FILE))
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+
+    def reclaim_orphans(self, keep: Iterable[str] = (), min_age: float = 600.0) -> int:
+        """
+        Janitor: delete work dirs under `work_root` that are not in `keep` (the dirs of jobs
+        still to be resumed) and leftover temp dirs of earlier runs. Directories whose owner
+        process (another app instance, the CLI, daemon or server) is still running and those
+        touched within `min_age` seconds are left alone. Returns how many directories were deleted.
+        """
+
+        keep = {os.path.abspath(k) for k in keep if k}
+        now = time.time()
+        candidates = []
+        if self.work_root and os.path.isdir(self.work_root):
+            candidates += [os.path.join(self.work_root, d) for d in os.listdir(self.work_root)]
+        tmp_root = tempfile.gettempdir()
+        candidates += [os.path.join(tmp_root, d) for d in os.listdir(tmp_root) if d.startswith(TEMP_PREFIX)]
+
+        removed = 0
+        for path in candidates:
+            if os.path.abspath(path) in keep or not os.path.isdir(path):
+                continue
+            try:
+                if now - os.path.getmtime(path) < min_age:
+                    continue
+            except OSError:
+                continue
+            if self._owner_alive(path):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def close(self):
+        """Release pooled YoutubeDL sessions (closes their HTTP connections and cookie jars)."""
+        self.pool.close()
+        if self.infos is not None:
+            self.infos.close()
 
-        
     def move_file(self, src_path: str, dest_path: str):
-        """Move a file from src_path to dest_path, overwriting if needed."""
-        
-        shutil.move(src_path, dest_path)
-        shutil.rmtree(os.path.dirname(src_path), ignore_errors=True)
-        return dest_path
\ No newline at end of file
+        """
+        Move a file from src_path to dest_path, overwriting if needed.
+
+        On the same filesystem this is a rename. Across filesystems the copy goes
+        to a staging file next to `dest_path` first, so an existing file there is
+        only ever replaced by a complete one.
+        """
+
+        try:
+            os.replace(src_path, dest_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            staged = staging_path(os.path.dirname(dest_path) or ".", os.path.splitext(dest_path)[1])
+            try:
+                shutil.copyfile(src_path, staged)
+                os.replace(staged, dest_path)
+            except BaseException:
+                if os.path.exists(staged):
+                    os.remove(staged)
+                raise
+        src_dir = os.path.dirname(src_path)
+        shutil.rmtree(src_dir, ignore_errors=True)
+        # And the batch's temp dir once its last file was moved out
+        parent = os.path.dirname(src_dir)
+        while os.path.basename(parent) and not os.path.basename(parent).startswith(TEMP_PREFIX):
+            parent = os.path.dirname(parent)
+        if os.path.basename(parent).startswith(TEMP_PREFIX) and parent not in self._running_tmpdirs:
+            self._prune(parent)
+        return dest_path
@@ -0,0 +1,312 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Type
+
+from transcoder import StageTimer
+
+_logger = logging.getLogger(__name__)
+
+
+# --- events ---
+class DownloadEvent(object):
+    """Base of everything `Downloader` publishes; `job` is the id passed to download_batch."""
+
+    __slots__ = ("job", "url", "index", "extractor", "ts")
+    kind = "event"
+
+    def __init__(self, job: Optional[int], url: str, index: int = 0, extractor: Optional[str] = None) -> None:
+        self.job = job
+        self.url = url
+        self.index = index
+        self.extractor = extractor
+        self.ts = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {"kind": self.kind}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name != "ts":
+                    d[name] = getattr(self, name)
+        return d
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} job={self.job} #{self.index} {self.url!r}>"
+
+
+class ProgressEvent(DownloadEvent):
+    """Bytes moved for one entry; `total_bytes`, `speed` and `eta` are None when unknown."""
+
+    __slots__ = ("status", "downloaded_bytes", "total_bytes", "speed", "eta",
+                 "fragment_index", "fragment_count")
+    kind = "progress"
+
+    def __init__(self, job, url, index=0, extractor=None, status: str = "downloading",
+                 downloaded_bytes: int = 0, total_bytes: Optional[int] = None,
+                 speed: Optional[float] = None, eta: Optional[float] = None,
+                 fragment_index: Optional[int] = None, fragment_count: Optional[int] = None) -> None:
+        super().__init__(job, url, index, extractor)
+        self.status = status
+        self.downloaded_bytes = downloaded_bytes
+        self.total_bytes = total_bytes
+        self.speed = speed
+        self.eta = eta
+        self.fragment_index = fragment_index
+        self.fragment_count = fragment_count
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if not self.total_bytes:
+            return None
+        return min(1.0, self.downloaded_bytes / self.total_bytes)
+
+
+class StageEvent(DownloadEvent):
+    """A pipeline stage (download, measure, encode, a yt-dlp postprocessor...) started or finished."""
+
+    __slots__ = ("stage", "state", "elapsed")
+    kind = "stage"
+
+    def __init__(self, job, url, index=0, extractor=None, stage: str = "", state: str = "started",
+                 elapsed: Optional[float] = None) -> None:
+        super().__init__(job, url, index, extractor)
+        self.stage = stage
+        self.state = state
+        self.elapsed = elapsed
+
+
+class ResultEvent(DownloadEvent):
+    """One entry is done; `result` is the DownloadResult handed to on_result."""
+
+    __slots__ = ("result",)
+    kind = "result"
+
+    def __init__(self, job, url, index=0, extractor=None, result=None) -> None:
+        super().__init__(job, url, index, extractor)
+        self.result = result
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = super().to_dict()
+        result = d.pop("result")
+        if result is not None:
+            d.update(path=result.path, title=result.title, error=result.error, elapsed=result.elapsed)
+        return d
+
+
+# --- bus ---
+class EventBus:
+    """
+    Synchronous pub/sub: `publish` calls every matching subscriber on the publishing thread.
+
+    Subscribers run on download threads, so they should be quick and hand UI
+    work off to the main thread. A failing subscriber never breaks a download.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[Callable[[DownloadEvent], None], Tuple[Type[DownloadEvent], ...]]] = []
+
+    def subscribe(self, callback: Callable[[DownloadEvent], None], *kinds: Type[DownloadEvent]) -> None:
+        """Receive events of the given classes (all events when none are given)."""
+        with self._lock:
+            self._subscribers = self._subscribers + [(callback, kinds or (DownloadEvent,))]
+
+    def unsubscribe(self, callback: Callable[[DownloadEvent], None]) -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] != callback]
+
+    def publish(self, event: DownloadEvent) -> None:
+        for callback, kinds in self._subscribers:
+            if isinstance(event, kinds):
+                try:
+                    callback(event)
+                except Exception:
+                    _logger.debug("Event subscriber %r failed on %r", callback, event, exc_info=True)
+
+
+class ProgressReporter:
+    """
+    Turns one batch's yt-dlp hooks, stage timers and streamed chunks into events on `bus`.
+
+    The batch loop points it at the entry being worked on (`at`) before each step.
+    """
+
+    def __init__(self, bus: EventBus, job: Optional[int] = None) -> None:
+        self.bus = bus
+        self.job = job
+        self.url = ""
+        self.index = 0
+        self.extractor: Optional[str] = None
+        self._streamed = 0
+        self._stream_started = 0.0
+
+    def at(self, url: str, index: int = 0, extractor: Optional[str] = None) -> "ProgressReporter":
+        self.url = url
+        self.index = index
+        self.extractor = extractor
+        self._streamed = 0
+        self._stream_started = time.monotonic()
+        return self
+
+    def timer(self) -> StageTimer:
+        return StageTimer(listener=self.stage)
+
+    def stage(self, name: str, state: str, elapsed: Optional[float] = None) -> None:
+        self.bus.publish(StageEvent(self.job, self.url, self.index, self.extractor, name, state, elapsed))
+
+    def result(self, result) -> None:
+        self.bus.publish(ResultEvent(self.job, result.url, result.index, result.extractor or self.extractor, result))
+
+    # --- yt-dlp hooks ---
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if d.get("status") not in ("downloading", "finished"):
+            return
+        self.bus.publish(ProgressEvent(
+            self.job, self.url, self.index, self.extractor, d["status"],
+            d.get("downloaded_bytes") or 0, d.get("total_bytes") or d.get("total_bytes_estimate"),
+            d.get("speed"), d.get("eta"), d.get("fragment_index"), d.get("fragment_count")))
+
+    def postprocessor_hook(self, d: Dict[str, Any]) -> None:
+        if d.get("status") in ("started", "finished"):
+            self.stage(f"postprocess {d.get('postprocessor')}", d["status"])
+
+    # --- streaming mode, where bytes bypass yt-dlp's downloaders ---
+    def chunk(self, size: int, total: Optional[int] = None, finished: bool = False) -> None:
+        self._streamed += size
+        elapsed = time.monotonic() - self._stream_started
+        speed = self._streamed / elapsed if elapsed > 0 else None
+        eta = (total - self._streamed) / speed if total and speed else None
+        self.bus.publish(ProgressEvent(self.job, self.url, self.index, self.extractor,
+                                       "finished" if finished else "downloading",
+                                       self._streamed, total, speed, eta))
+
+
+# --- metrics ---
+class _Rate:
+    __slots__ = ("bytes", "seconds")
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def per_second(self) -> Optional[float]:
+        return self.bytes / self.seconds if self.seconds > 0 else None
+
+
+class ThroughputMetrics:
+    """
+    Aggregates a bus into per-job and global bytes/sec, per-extractor
+    throughput (to spot slow sources) and time spent per stage.
+
+    Global throughput is measured over the last `window` seconds; per-job and
+    per-extractor rates are bytes over the time spent downloading. Finished
+    jobs are kept until `max_jobs` newer ones push them out.
+    """
+
+    def __init__(self, bus: Optional[EventBus] = None, window: float = 5.0, max_jobs: int = 100) -> None:
+        self.window = window
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._last: Dict[Tuple[Optional[int], str, int], Tuple[float, int, Optional[int]]] = {}
+        self._jobs: "OrderedDict[Optional[int], _Rate]" = OrderedDict()
+        self._extractors: Dict[str, _Rate] = {}
+        self._stages: Dict[str, List[float]] = {}
+        if bus is not None:
+            bus.subscribe(self.record)
+
+    def record(self, event: DownloadEvent) -> None:
+        with self._lock:
+            if isinstance(event, ProgressEvent):
+                self._record_progress(event)
+            elif isinstance(event, StageEvent) and event.state == "finished" and event.elapsed is not None:
+                stats = self._stages.setdefault(event.stage, [0, 0.0])
+                stats[0] += 1
+                stats[1] += event.elapsed
+            elif isinstance(event, ResultEvent):
+                self._last.pop((event.job, event.url, event.index), None)
+
+    def _record_progress(self, event: ProgressEvent) -> None:
+        key = (event.job, event.url, event.index)
+        last_ts, last_bytes, _ = self._last.get(key, (event.ts, 0, None))
+        # yt-dlp restarts the count per file (e.g. video then audio of one entry)
+        delta = event.downloaded_bytes - last_bytes if event.downloaded_bytes >= last_bytes else event.downloaded_bytes
+        seconds = event.ts - last_ts
+        if event.status == "finished":
+            self._last.pop(key, None)
+        else:
+            self._last[key] = (event.ts, event.downloaded_bytes, event.total_bytes)
+
+        self._samples.append((event.ts, delta))
+        self._trim(event.ts)
+        job = self._jobs.get(event.job)
+        if job is None:
+            job = self._jobs[event.job] = _Rate()
+            if len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        for rate in (job, self._extractors.setdefault(event.extractor or "unknown", _Rate())):
+            rate.bytes += delta
+            rate.seconds += seconds
+
+    def _trim(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    def bytes_per_sec(self, job: Optional[int] = None) -> Optional[float]:
+        """Global throughput over the window, or one job's average while downloading."""
+        with self._lock:
+            if job is not None:
+                rate = self._jobs.get(job)
+                return rate.per_second if rate else None
+            now = time.monotonic()
+            self._trim(now)
+            if not self._samples:
+                return None
+            span = max(1.0, now - self._samples[0][0])
+            return sum(size for _, size in self._samples) / span
+
+    def extractor_bytes_per_sec(self, extractor: Optional[str]) -> Optional[float]:
+        """Average throughput seen from one extractor (site) so far, None before its first bytes."""
+        with self._lock:
+            rate = self._extractors.get(extractor or "unknown")
+            return rate.per_second if rate else None
+
+    def fraction(self) -> Optional[float]:
+        """Share of known bytes done over everything in flight, None when no size is known."""
+        with self._lock:
+            known = [(done, total) for _, done, total in self._last.values() if total]
+        if not known:
+            return None
+        return min(1.0, sum(d for d, _ in known) / sum(t for _, t in known))
+
+    def snapshot(self) -> Dict[str, Any]:
+        global_rate = self.bytes_per_sec()
+        with self._lock:
+            return {
+                "bytes_per_sec": global_rate,
+                "jobs": {job: {"bytes": r.bytes, "bytes_per_sec": r.per_second} for job, r in self._jobs.items()},
+                "extractors": {name: {"bytes": r.bytes, "bytes_per_sec": r.per_second}
+                               for name, r in self._extractors.items()},
+                "stages": {name: {"count": n, "seconds": secs, "mean": secs / n}
+                           for name, (n, secs) in self._stages.items()},
+            }
+
+    def forget(self, job: Optional[int]) -> None:
+        with self._lock:
+            self._jobs.pop(job, None)
+            for key in [k for k in self._last if k[0] == job]:
+                del self._last[key]
+
+
+def format_rate(bytes_per_sec: Optional[float]) -> str:
+    """Human readable throughput, e.g. '3.2 MB/s'; empty when unknown."""
+    if not bytes_per_sec:
+        return ""
+    value, unit = float(bytes_per_sec), "B/s"
+    for unit in ("B/s", "KB/s", "MB/s", "GB/s"):
+        if value < 1000 or unit == "GB/s":
+            break
+        value /= 1000
+    return f"{value:.0f} {unit}" if unit == "B/s" else f"{value:.1f} {unit}"
@@ -0,0 +1,75 @@
+"""
+Output formats and the cheapest way to produce each one from a source.
+
+Loudness normalization has to decode, filter and re-encode, so with it on
+every job is one ffmpeg encode. With normalization off, a source that is
+already in the output codec is stream-copied into the output container (no
+decode, no encode), and anything else is encoded once without filters. In
+that case the yt-dlp format selector also prefers sources in the output codec,
+falling back to the best audio there is.
+"""
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from models import Normalization
+
+OUTPUT_CODECS = ("mp3", "aac", "opus", "flac")
+DEFAULT_CODEC = "mp3"
+
+# What yt-dlp fetches when nothing can be copied anyway
+DEFAULT_SELECTOR = "bestaudio/best"
+
+MP3_ENCODER_ARGS = ['-c:a', 'libmp3lame', '-q:a', '0']
+COPY_ARGS = ['-c:a', 'copy']
+
+
+class OutputFormat(object):
+    """One output codec: file extension, ffmpeg encoder arguments and the source codecs it can copy."""
+
+    __slots__ = ("codec", "ext", "encoder_args", "source_codecs")
+
+    def __init__(self, codec: str, ext: str, encoder_args: List[str], source_codecs: Tuple[str, ...]):
+        self.codec = codec
+        self.ext = ext
+        self.encoder_args = encoder_args
+        self.source_codecs = source_codecs  # yt-dlp acodec prefixes, e.g. 'mp4a' for 'mp4a.40.2'
+
+    def __repr__(self) -> str:
+        return f"<OutputFormat {self.codec} ({self.ext})>"
+
+
+FORMATS: Dict[str, OutputFormat] = {
+    "mp3": OutputFormat("mp3", ".mp3", MP3_ENCODER_ARGS, ("mp3",)),
+    "aac": OutputFormat("aac", ".m4a", ['-c:a', 'aac', '-b:a', '256k'], ("mp4a", "aac")),
+    "opus": OutputFormat("opus", ".opus", ['-c:a', 'libopus', '-b:a', '160k'], ("opus",)),
+    "flac": OutputFormat("flac", ".flac", ['-c:a', 'flac'], ("flac",)),
+}
+
+
+def output_format(codec: str) -> OutputFormat:
+    """The OutputFormat for `codec`, or ValueError listing the supported ones."""
+    try:
+        return FORMATS[codec]
+    except KeyError:
+        raise ValueError(f"Unknown output codec {codec!r}; use one of {', '.join(OUTPUT_CODECS)}") from None
+
+
+def format_selector(codec: str, normalization: str) -> str:
+    """yt-dlp 'format' for a job: sources in `codec` first when they can be copied, else DEFAULT_SELECTOR."""
+    if normalization != Normalization.OFF.value:
+        return DEFAULT_SELECTOR
+    preferred = "/".join(f"bestaudio[acodec^={c}]" for c in output_format(codec).source_codecs)
+    return f"{preferred}/{DEFAULT_SELECTOR}"
+
+
+def can_copy(source: Mapping[str, Any], output: OutputFormat, normalization: str) -> Optional[bool]:
+    """
+    True if the audio of `source` (a yt-dlp entry, or cached source meta with
+    'acodec') can go into `output` without re-encoding. None when that depends
+    on a codec the site didn't report (direct links): look at the file then.
+    """
+    if normalization != Normalization.OFF.value or source.get('requested_formats'):
+        return False
+    acodec = (source.get('acodec') or "").lower()
+    if not acodec:
+        return None
+    return acodec.split(".")[0] in output.source_codecs
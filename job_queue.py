@@ -0,0 +1,248 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class JobState(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised by a job target once it notices its cancel flag."""
+
+
+class Job(object):
+    """
+    One unit of work submitted to a JobQueue.
+
+    The target is called as `target(job, *args, **kwargs)` so long-running work
+    can poll `job.cancel_event` (or hand it down, e.g. to Downloader.download).
+    """
+
+    __slots__ = ("id", "target", "args", "kwargs", "priority", "on_done",
+                 "state", "result", "error", "submitted_at", "started_at",
+                 "finished_at", "cancel_event", "_done")
+
+    def __init__(self, id: int, target: Callable, args: tuple, kwargs: Dict[str, Any],
+                 priority: int = 0, on_done: Optional[Callable[["Job"], None]] = None):
+        self.id = id
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.on_done = on_done
+        self.state = JobState.PENDING
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self) -> bool:
+        """Request cancellation. Returns False if the job already finished."""
+        if self.finished:
+            return False
+        self.cancel_event.set()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def __repr__(self) -> str:
+        return f"<Job {self.id} {self.state.value} priority={self.priority}>"
+
+
+class JobQueue:
+    """
+    Bounded worker pool with priorities and cancellation.
+
+    Higher `priority` runs first; equal priorities run in submission order.
+    Worker threads are started lazily, up to `max_workers`, and the limit can
+    be changed at runtime with `set_max_workers`.
+    """
+
+    def __init__(self, max_workers: int = 4, name: str = "job") -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self.name = name
+        self._max_workers = max_workers
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = {}
+        self._workers: List[threading.Thread] = []
+        self._running = 0
+        self._cond = threading.Condition()
+        self._shutdown = False
+
+    # --- submission ---
+    def submit(self, target: Callable, *args, priority: int = 0,
+               on_done: Optional[Callable[[Job], None]] = None,
+               on_queued: Optional[Callable[[Job], None]] = None, **kwargs) -> Job:
+        """
+        Queue `target(job, *args, **kwargs)`. `on_queued(job)` is called before any worker
+        can start the job, with the queue locked, so it should only register the job somewhere.
+        """
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("JobQueue is shut down")
+            job = Job(next(self._ids), target, args, kwargs, priority, on_done)
+            self._jobs[job.id] = job
+            if on_queued is not None:
+                on_queued(job)
+            heapq.heappush(self._heap, (-priority, next(self._seq), job))
+            self._spawn_workers_locked()
+            self._cond.notify()
+            return job
+
+    def reprioritize(self, job_id: int, priority: int) -> bool:
+        """Change a pending job's priority (its place among equals is kept); False once it started."""
+        with self._cond:
+            for i, (_, seq, job) in enumerate(self._heap):
+                if job.id == job_id:
+                    job.priority = priority
+                    self._heap[i] = (-priority, seq, job)
+                    heapq.heapify(self._heap)
+                    return True
+            return False
+
+    def cancel(self, job_id: int) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        return job.cancel()
+
+    def cancel_all(self) -> None:
+        for job in list(self._jobs.values()):
+            job.cancel()
+
+    # --- introspection ---
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def active_count(self) -> int:
+        with self._cond:
+            return self._running
+
+    def forget(self, job_id: int) -> None:
+        """Drop a finished job from the registry so it can be garbage collected."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                del self._jobs[job_id]
+
+    # --- lifecycle ---
+    def set_max_workers(self, max_workers: int) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        with self._cond:
+            self._max_workers = max_workers
+            self._spawn_workers_locked()
+            # Surplus workers notice the new limit and exit when idle
+            self._cond.notify_all()
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = True) -> None:
+        with self._cond:
+            self._shutdown = True
+            if cancel_pending:
+                for job in self._jobs.values():
+                    if job.state is JobState.PENDING:
+                        job.cancel()
+            self._cond.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for t in workers:
+                t.join()
+
+    # --- workers ---
+    def _spawn_workers_locked(self) -> None:
+        wanted = min(self._max_workers, len(self._heap) + self._running)
+        while len(self._workers) < wanted:
+            t = threading.Thread(target=self._worker, name=f"{self.name}-worker-{len(self._workers) + 1}",
+                                 daemon=True)
+            self._workers.append(t)
+            t.start()
+
+    def _next_job(self) -> Optional[Job]:
+        me = threading.current_thread()
+        with self._cond:
+            while True:
+                if len(self._workers) > self._max_workers:
+                    self._workers.remove(me)
+                    return None
+                if self._heap:
+                    _, _, job = heapq.heappop(self._heap)
+                    self._running += 1
+                    return job
+                if self._shutdown:
+                    self._workers.remove(me)
+                    return None
+                self._cond.wait()
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+            self._notify_done(job)
+
+    def _run(self, job: Job) -> None:
+        if job.cancelled:
+            job.state = JobState.CANCELLED
+        else:
+            job.state = JobState.RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = job.target(job, *job.args, **job.kwargs)
+                job.state = JobState.DONE
+            except Exception as e:
+                job.error = e
+                if job.cancelled or isinstance(e, JobCancelled):
+                    job.state = JobState.CANCELLED
+                else:
+                    job.state = JobState.FAILED
+        job.finished_at = time.time()
+        job._done.set()
+
+    def _notify_done(self, job: Job) -> None:
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception:
+                _logger.exception("JobQueue %s: on_done callback failed for job %d", self.name, job.id)
@@ -0,0 +1,268 @@
+import contextlib
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# yt-dlp progress lines ("[download]  42.0% of 10.00MiB at ...") that supersede each other
+_PROGRESS_PATTERN = re.compile(r"^\s*\[download\]\s+~?\s*[\d.]+%")
+
+DEFAULT_CHANNEL = "main"
+
+
+def _utf16_len(text: str) -> int:
+    # Consumers (NSTextStorage) count UTF-16 code units, not code points
+    return len(text.encode("utf-16-le")) // 2
+
+
+class LogDelta:
+    """
+    What changed since a consumer's previous delivery.
+
+    `text` is appended to the end of the view, after `dropped` UTF-16 units
+    (lines that fell out of the ring buffer) are removed from its start.
+    `reset` means the view should be emptied first.
+    """
+
+    __slots__ = ("text", "dropped", "reset")
+
+    def __init__(self, text: str = "", dropped: int = 0, reset: bool = False) -> None:
+        self.text = text
+        self.dropped = dropped
+        self.reset = reset
+
+    def __bool__(self) -> bool:
+        return bool(self.text or self.dropped or self.reset)
+
+    def __repr__(self) -> str:
+        return f"<LogDelta +{len(self.text)} -{self.dropped}{' reset' if self.reset else ''}>"
+
+
+class LogChannel:
+    """yt-dlp-compatible logger that writes to one named channel of a LogPipeline."""
+
+    __slots__ = ("pipeline", "name")
+
+    def __init__(self, pipeline: "LogPipeline", name: str) -> None:
+        self.pipeline = pipeline
+        self.name = name
+
+    def debug(self, msg):
+        self.pipeline.write(f"{msg}", self.name)
+
+    def info(self, msg):
+        self.pipeline.write(f"[INFO] {msg}", self.name)
+
+    def warning(self, msg):
+        self.pipeline.write(f"[WARNING] {msg}", self.name)
+
+    def error(self, msg):
+        self.pipeline.write(f"[ERROR] {msg}", self.name)
+
+
+class ErrorRecorder:
+    """
+    yt-dlp logger proxy: forwards everything to `logger` and keeps the error messages.
+    With ignoreerrors, yt-dlp only logs why extraction failed; this keeps the reason.
+    """
+
+    __slots__ = ("logger", "errors")
+
+    def __init__(self, logger) -> None:
+        self.logger = logger
+        self.errors: List[str] = []
+
+    @property
+    def last(self) -> Optional[str]:
+        return self.errors[-1] if self.errors else None
+
+    def debug(self, msg):
+        self.logger.debug(msg)
+
+    def info(self, msg):
+        self.logger.info(msg)
+
+    def warning(self, msg):
+        self.logger.warning(msg)
+
+    def error(self, msg):
+        self.errors.append(str(msg))
+        self.logger.error(msg)
+
+
+class LogPipeline:
+    """
+    Bounded, rate-limited log sink shared by the UI and the download engine.
+
+    Lines are kept in a ring buffer of `capacity` lines, plus one ring per
+    channel (e.g. one per job). Writers never touch consumers: lines queue up
+    and a background thread delivers them at most `fps` times a second as a
+    LogDelta, so a consumer only ever appends. Within a frame, consecutive
+    progress lines of a channel collapse into the latest one.
+
+    The pipeline is itself a logger (debug/info/warning/error) writing to the
+    calling thread's channel, see `bind`.
+    """
+
+    def __init__(self, capacity: int = 5000, fps: float = 30.0, max_channels: int = 64,
+                 echo: bool = False) -> None:
+        self.capacity = capacity
+        self.interval = 1.0 / fps
+        self.max_channels = max_channels
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._deliver_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._local = threading.local()
+        self._ring: Deque[str] = deque(maxlen=capacity)
+        self._channels: "OrderedDict[str, Deque[str]]" = OrderedDict()
+        self._pending: List[Tuple[str, str]] = []
+        self._progress_at: Dict[str, int] = {}  # channel -> index of its coalescable line in _pending
+        self._reset = False
+        self._consumers: List[Callable[[LogDelta], None]] = []
+        self._last_flush = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # --- consumers ---
+    def subscribe(self, consumer: Callable[[LogDelta], None]) -> None:
+        """Call `consumer(delta)` from the delivery thread for every non-empty frame."""
+        with self._deliver_lock:
+            self._consumers.append(consumer)
+
+    def unsubscribe(self, consumer: Callable[[LogDelta], None]) -> None:
+        with self._deliver_lock:
+            if consumer in self._consumers:
+                self._consumers.remove(consumer)
+
+    # --- writing ---
+    def channel(self, name: str) -> LogChannel:
+        return LogChannel(self, name)
+
+    @contextlib.contextmanager
+    def bind(self, name: str):
+        """Route this thread's writes (including yt-dlp's, via debug/info/...) to channel `name`."""
+        previous = getattr(self._local, "channel", None)
+        self._local.channel = name
+        try:
+            yield self.channel(name)
+        finally:
+            self._local.channel = previous
+
+    def write(self, text: str, channel: Optional[str] = None) -> None:
+        line = str(text).lstrip("\r")
+        if channel is None:
+            channel = getattr(self._local, "channel", None) or DEFAULT_CHANNEL
+        if self.echo:
+            print(line)
+        progress = _PROGRESS_PATTERN.match(line) is not None
+        with self._lock:
+            if self._closed:
+                return
+            at = self._progress_at.pop(channel, None)
+            if progress and at is not None:
+                self._pending[at] = (channel, line)
+            else:
+                self._pending.append((channel, line))
+            if progress:
+                self._progress_at[channel] = len(self._pending) - 1 if at is None else at
+            self._start()
+        self._wake.set()
+
+    def debug(self, msg):
+        self.write(f"{msg}")
+
+    def info(self, msg):
+        self.write(f"[INFO] {msg}")
+
+    def warning(self, msg):
+        self.write(f"[WARNING] {msg}")
+
+    def error(self, msg):
+        self.write(f"[ERROR] {msg}")
+
+    def reset(self) -> None:
+        """Forget everything; consumers get a reset delta on the next frame."""
+        with self._lock:
+            self._ring.clear()
+            self._channels.clear()
+            self._pending = []
+            self._progress_at.clear()
+            self._reset = True
+            self._start()
+        self._wake.set()
+
+    # --- reading ---
+    def tail(self, channel: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Delivered lines, oldest first, of one channel or of everything."""
+        with self._lock:
+            ring = self._ring if channel is None else self._channels.get(channel, ())
+            lines = list(ring)
+        return lines[-limit:] if limit else lines
+
+    def text(self, channel: Optional[str] = None) -> str:
+        return "".join(line + "\n" for line in self.tail(channel))
+
+    # --- delivery ---
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            if self._closed:
+                return
+            delay = self._last_flush + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.flush()
+
+    def _take(self) -> Tuple[LogDelta, List[Callable[[LogDelta], None]]]:
+        with self._lock:
+            self._wake.clear()
+            pending, self._pending = self._pending, []
+            self._progress_at.clear()
+            reset, self._reset = self._reset, False
+            ring = self._ring
+            survivors = len(ring)  # lines consumers already have
+            dropped = 0
+            for channel, line in pending:
+                if len(ring) == self.capacity:
+                    if survivors:
+                        dropped += _utf16_len(ring[0]) + 1
+                        survivors -= 1
+                ring.append(line)
+                self._channel_ring(channel).append(line)
+            fresh = pending[-self.capacity:]
+            text = "".join(line + "\n" for _, line in fresh)
+            return LogDelta(text, dropped, reset), list(self._consumers)
+
+    def _channel_ring(self, name: str) -> Deque[str]:
+        ring = self._channels.get(name)
+        if ring is None:
+            ring = self._channels[name] = deque(maxlen=self.capacity)
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(name)
+        return ring
+
+    def flush(self) -> None:
+        """Deliver whatever is queued now instead of waiting for the next frame."""
+        with self._deliver_lock:
+            delta, consumers = self._take()
+            self._last_flush = time.monotonic()
+            if not delta:
+                return
+            for consumer in consumers:
+                consumer(delta)
+
+    def close(self) -> None:
+        """Deliver the last frame and stop the delivery thread."""
+        self.flush()
+        with self._lock:
+            self._closed = True
+        self._wake.set()
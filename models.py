@@ -1,25 +1,60 @@
 import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Iterable, List
+from enum import Enum
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+TIMESTAMP_FORMAT = "%d/%m/%y, %H:%M:%S"  # TODO: show user local time format
+
+
+class Normalization(Enum):
+    OFF = "Off"  # no loudness pass: sources can be copied instead of re-encoded
+    LOW = "Low"
+    MEDIUM = "Medium"
+    HIGH = "High"
+
 
 class MediaItem(object):
-    __slots__ = ("title", "timestamp", "isGroup")
-    def __init__(self, title="", timestamp="", isGroup=False):
+    """
+    One sidebar row: a group header or a history entry. For entries built from
+    a `ts`, the display string is only formatted when `timestamp` is first read.
+    """
+
+    __slots__ = ("title", "ts", "_timestamp", "isGroup", "id")
+
+    def __init__(self, title="", timestamp="", isGroup=False, ts=None, id=None):
         self.title = title
-        self.timestamp = timestamp
+        self.ts = ts
+        self._timestamp = timestamp  # None: format `ts` on first read
         self.isGroup = isGroup
+        self.id = id  # history row id, when the entry came from the database
+
+    @property
+    def timestamp(self) -> str:
+        if self._timestamp is None:
+            self._timestamp = datetime.fromtimestamp(self.ts).strftime(TIMESTAMP_FORMAT)
+        return self._timestamp
 
     @classmethod
     def group(cls, groupTitle):
         return cls(title=groupTitle, timestamp="", isGroup=True)
 
     @classmethod
-    def item(cls, title, timestamp):
-        return cls(title=title, timestamp=timestamp, isGroup=False)
-    
+    def item(cls, title, timestamp="", ts=None):
+        return cls(title, None if ts is not None and not timestamp else timestamp, False, ts)
+
+
 class HistoryFormatter:
+    """
+    Groups history rows (newest first, as MediaDB returns them) into age buckets.
 
-    _now = int(time.time())
+    Bucket boundaries are computed from `now` on every call — pass `now` to pin
+    the clock, otherwise the wall clock is read — so a long-running session
+    never groups against a stale time. Because the rows are already sorted by
+    ts, each bucket is a contiguous slice found by bisection instead of a scan
+    through every group per row.
+    """
 
     _DAY   = 24 * 60 * 60
     _WEEK  = 7  * _DAY
@@ -33,28 +68,259 @@ class HistoryFormatter:
         ("Last 365 days", (_MONTH, _YEAR)),
         ("Long time ago",( _YEAR, 10**12)),
     ]
+    _UPPER_AGES = [hi for _, (_, hi) in _GROUPS]
+
+    def __init__(self, now: Optional[float] = None) -> None:
+        self.now = now
 
-    def format(self, rows: Iterable[MediaItem]) -> List[MediaItem]:
-        
-        buckets: Dict[str, List[MediaItem]] = {label: [] for label, _ in self._GROUPS}
+    def _clock(self, now: Optional[float]) -> int:
+        if now is not None:
+            return int(now)
+        return int(self.now if self.now is not None else time.time())
 
-        for r in rows:
-            ts = int(r["ts"])
-            age = max(0, self._now - ts)  # guard against clock skew
-            for label, (lo, hi) in self._GROUPS:
-                if lo <= age < hi:
-                    buckets[label].append(
-                        MediaItem.item(r["file"], 
-                        datetime.fromtimestamp(ts).strftime("%d/%m/%y, %H:%M:%S"))) # TODO: show user local time format
-                    break
+    def label(self, ts: int, now: Optional[float] = None) -> Optional[str]:
+        age = max(0, self._clock(now) - int(ts))  # guard against clock skew
+        i = bisect_right(self._UPPER_AGES, age)
+        return self._GROUPS[i][0] if i < len(self._GROUPS) else None
 
+    def bucket_bounds(self, rows: Sequence[Mapping[str, Any]],
+                      now: Optional[float] = None) -> List[Tuple[str, int, int]]:
+        """(label, start, end) slices of `rows` per non-empty group, found by bisection on ts."""
+        now = self._clock(now)
+        key = lambda r: -int(r["ts"])
+        bounds = []
+        start = 0
+        for label, (_, hi) in self._GROUPS:
+            # age < hi  <=>  -ts < hi - now; rows are newest first, so -ts ascends
+            end = bisect_left(rows, hi - now, lo=start, key=key)
+            if end > start:
+                bounds.append((label, start, end))
+            start = end
+        return bounds
+
+    def format_page(self, rows: Sequence[Mapping[str, Any]], last_group: Optional[str] = None,
+                    now: Optional[float] = None) -> Tuple[List[MediaItem], Optional[str]]:
+        """
+        Incremental variant of `format` for rows arriving newest first, one page at a time.
+        `last_group` is the group the previous page ended in, so its header is not repeated.
+        Returns the items for this page and the group it ends in.
+        """
         out: List[MediaItem] = []
-        for label, _ in self._GROUPS:
-            group_rows = buckets[label]
-            if not group_rows:
-                continue
-            # newest first within the group
-            # group_rows.sort(key=lambda x: int(x["ts"]), reverse=True)
-            out.append(MediaItem.group(label))
-            out.extend(group_rows)
-        return out
+        for label, start, end in self.bucket_bounds(rows, now):
+            if label != last_group:
+                out.append(MediaItem.group(label))
+                last_group = label
+            out.extend([MediaItem(r["file"], None, False, r["ts"], r.get("id")) for r in rows[start:end]])
+        return out, last_group
+
+    def format(self, rows: Sequence[Mapping[str, Any]], now: Optional[float] = None) -> List[MediaItem]:
+        return self.format_page(rows, None, now)[0]
+
+
+class HistoryDiff(object):
+    """
+    Table update produced by HistoryModel: delete `removed` (row indexes before
+    the change), then insert `inserted` (row indexes after it). Rows in
+    neither list keep their content.
+    """
+
+    __slots__ = ("removed", "inserted")
+
+    def __init__(self, removed: Optional[List[int]] = None, inserted: Optional[List[int]] = None):
+        self.removed = sorted(removed or [])
+        self.inserted = sorted(inserted or [])
+
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.inserted)
+
+    def __repr__(self) -> str:
+        return f"<HistoryDiff -{self.removed} +{self.inserted}>"
+
+
+class HistoryModel:
+    """
+    Windowed, AppKit-free view of the history for the sidebar table.
+
+    The list is one sequence of entries, newest first, cut into age groups.
+    Only its shape is kept in memory: how many entries are newer than each
+    group boundary (from COUNT queries) and where the headers sit. Entries are
+    fetched a page at a time when a row is asked for and kept in a bounded LRU
+    of pages, so memory stays flat however long the history is.
+
+    Stored rows come from a snapshot bounded by the newest row at `reload`.
+    Entries added during the session are kept in memory in front of them
+    (`insert_recent`), so positions never shift while the write-behind writer
+    commits. Changes after `reload` — insertions, removals and entries aging
+    across group boundaries (`refresh`) — return a HistoryDiff touching only
+    the rows that changed: an aging entry keeps its row; only the headers
+    around it move.
+
+    `source` needs history_head, count_history_newer, count_history_between,
+    select_history_page, delete_history and delete_history_entry (see MediaDB).
+    """
+
+    RECENT_GROUP = "Just now"
+    RECENT_AGE = 15 * 60
+
+    def __init__(self, source, formatter: Optional[HistoryFormatter] = None,
+                 page_size: int = 100, max_pages: int = 16) -> None:
+        self.source = source
+        self.formatter = formatter or HistoryFormatter()
+        self.page_size = page_size
+        self.max_pages = max_pages
+        # (label, upper age bound) from newest to oldest
+        self.ladder: List[Tuple[str, int]] = [(self.RECENT_GROUP, self.RECENT_AGE)] + \
+            [(label, hi) for label, (_, hi) in self.formatter._GROUPS]
+        self.now = 0
+        self._before: Optional[Tuple[int, int]] = None
+        self._recent: List[MediaItem] = []
+        self._stored_newer: List[int] = [0] * len(self.ladder)  # stored rows with ts > now - hi, per rung
+        self._stored = 0
+        self._headers: List[Tuple[str, int]] = []  # (label, index of the group's first entry)
+        self._header_rows: List[int] = []
+        self._length = 0
+        self._pages: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self.page_loads = 0
+
+    # --- snapshot ---
+    def reload(self, now: Optional[float] = None) -> None:
+        """Re-read group counts from the source and drop cached pages and recent entries."""
+        self.now = int(now if now is not None else time.time())
+        head = self.source.history_head()
+        self._before = (head[0], head[1] + 1) if head else None
+        self._recent = []
+        self._pages.clear()
+        self._stored_newer = self.source.count_history_newer(
+            [self.now - hi for _, hi in self.ladder], self._before) if head else [0] * len(self.ladder)
+        self._stored = self._stored_newer[-1]
+        self._layout()
+
+    def _entries_newer(self, threshold: int) -> int:
+        """How many recent (in-memory) entries have ts > threshold; they are sorted newest first."""
+        return bisect_left(self._recent, -threshold, key=lambda item: -item.ts)
+
+    def _layout(self) -> None:
+        headers = []
+        previous = 0
+        for g, (label, hi) in enumerate(self.ladder):
+            total = self._entries_newer(self.now - hi) + self._stored_newer[g]
+            if total > previous:
+                headers.append((label, previous))
+            previous = total
+        self._headers = headers
+        self._header_rows = [first + n for n, (_, first) in enumerate(headers)]
+        self._length = len(self._recent) + self._stored + len(headers)
+
+    # --- table data source ---
+    def __len__(self) -> int:
+        return self._length
+
+    def _locate(self, row: int) -> Tuple[int, int]:
+        """(group number, entry index; -1 for the group header)."""
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+        g = bisect_right(self._header_rows, row) - 1
+        if row == self._header_rows[g]:
+            return g, -1
+        return g, row - g - 1
+
+    def _row_of_entry(self, entry: int) -> int:
+        return entry + bisect_right([first for _, first in self._headers], entry)
+
+    def is_group(self, row: int) -> bool:
+        return self._locate(row)[1] < 0
+
+    def item(self, row: int) -> MediaItem:
+        g, entry = self._locate(row)
+        if entry < 0:
+            return MediaItem.group(self._headers[g][0])
+        if entry < len(self._recent):
+            return self._recent[entry]
+        r = self._row(entry - len(self._recent))
+        return MediaItem(r["file"], None, False, r["ts"], r["id"])
+
+    def _row(self, index: int) -> Dict[str, Any]:
+        page, at = divmod(index, self.page_size)
+        rows = self._pages.get(page)
+        if rows is None:
+            rows = self._fetch(page)
+            self._pages[page] = rows
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page)
+        return rows[at]
+
+    def _fetch(self, page: int) -> List[Dict[str, Any]]:
+        self.page_loads += 1
+        previous = self._pages.get(page - 1)
+        if previous:
+            # Sequential scrolling: seek past the previous page's last row
+            last = previous[-1]
+            return self.source.select_history_page((last["ts"], last["id"]), self.page_size)
+        return self.source.select_history_page(self._before, self.page_size, page * self.page_size)
+
+    # --- incremental updates ---
+    def _diff(self, old_headers: List[Tuple[str, int]], removed_rows: List[int], inserted_entries: List[int],
+              shift: Callable[[str, int], int]) -> HistoryDiff:
+        """
+        Compare header placement before/after a change. `shift` maps an old header's first-entry
+        index into the new numbering, so a header that only slid along with its entries is kept.
+        """
+        old_rows = {(label, shift(label, first)): first + n for n, (label, first) in enumerate(old_headers)}
+        new_rows = {(label, first): first + n for n, (label, first) in enumerate(self._headers)}
+        removed = list(removed_rows) + [row for key, row in old_rows.items() if key not in new_rows]
+        inserted = [self._row_of_entry(e) for e in inserted_entries] + \
+            [row for key, row in new_rows.items() if key not in old_rows]
+        return HistoryDiff(removed, inserted)
+
+    def insert_recent(self, title: str, ts: Optional[int] = None) -> HistoryDiff:
+        """Add an entry newer than everything else (a download that just finished)."""
+        ts = int(ts if ts is not None else time.time())
+        old = self._headers
+        self._recent.insert(0, MediaItem.item(title, ts=ts))
+        self._layout()
+        label = self._headers[0][0]
+        # Every old header moves one entry down, except the one the new entry joined at the top
+        return self._diff(old, [], [0], lambda l, first: first if first == 0 and l == label else first + 1)
+
+    def remove(self, row: int) -> HistoryDiff:
+        """Remove the entry at `row` (deleting it from the source when it is stored)."""
+        g, entry = self._locate(row)
+        if entry < 0:
+            raise ValueError("Group headers can't be removed")
+        old = self._headers
+        if entry < len(self._recent):
+            item = self._recent.pop(entry)
+            self.source.delete_history_entry(item.title, item.ts)
+        else:
+            index = entry - len(self._recent)
+            r = self._row(index)
+            self.source.delete_history([r["id"]])
+            for n, (_, hi) in enumerate(self.ladder):
+                if r["ts"] > self.now - hi:
+                    self._stored_newer[n] -= 1
+            self._stored -= 1
+            # Later stored rows moved up by one: drop the pages at and after the removed row
+            page = index // self.page_size
+            for p in [p for p in self._pages if p >= page]:
+                del self._pages[p]
+        self._layout()
+        return self._diff(old, [row], [], lambda l, first: first - 1 if first > entry else first)
+
+    def refresh(self, now: Optional[float] = None) -> HistoryDiff:
+        """
+        Advance the clock and move group boundaries past the entries that aged into an older group.
+        Only the rows that crossed a boundary are counted, so this is O(changes), not O(history).
+        """
+        now = int(now if now is not None else time.time())
+        if now <= self.now:
+            return HistoryDiff()
+        if self._before is not None:
+            for g, (_, hi) in enumerate(self.ladder):
+                self._stored_newer[g] -= self.source.count_history_between(
+                    self.now - hi, now - hi, self._before)
+        self.now = now
+        old = self._headers
+        self._layout()
+        return self._diff(old, [], [], lambda l, first: first)
@@ -0,0 +1,158 @@
+import os
+import re
+import secrets
+import string
+import time
+from typing import Any, Dict, Mapping
+
+# Hidden, so a half-written file in the destination folder never looks like a finished one
+STAGING_PREFIX = ".mediaext-"
+# Staging files untouched this long were left by a crash, not by an encoder still writing them
+STALE_STAGING_AGE = 3600.0
+
+# Fields a file name template can use, e.g. "{uploader}/{date} {title}"
+NAME_FIELDS = ("title", "uploader", "date", "id")
+DEFAULT_TEMPLATE = "{title}"
+
+# Leaves room for ' (n)', the extension and the staging prefix within the usual 255 byte limit
+_MAX_NAME_BYTES = 200
+_SEPARATORS = {"/": "-", "\\": "-", ":": " -"}
+_UNSAFE = re.compile(r'[\x00-\x1f\x7f*?"<>|]')
+_SPACES = re.compile(r'\s+')
+
+
+def staging_path(directory: str, suffix: str = ".mp3") -> str:
+    """
+    A fresh, empty file in `directory` for an encoder to write into. It is on the
+    same filesystem as the final file, so `publish` is a rename, never a copy.
+    The suffix is kept last because ffmpeg picks the muxer from it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        path = os.path.join(directory, f"{STAGING_PREFIX}{secrets.token_hex(4)}.part{suffix}")
+        try:
+            # Not mkstemp, which is owner-only: the kernel applies the umask to 0o666 like for any new file
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return path
+
+
+def sweep_staging(directory: str, min_age: float = STALE_STAGING_AGE) -> int:
+    """Delete staging files that a crash left in `directory` (not its subfolders). Returns how many."""
+    cutoff = time.time() - min_age
+    removed = 0
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return 0
+    with entries:
+        for entry in entries:
+            if not (entry.name.startswith(STAGING_PREFIX) and ".part" in entry.name):
+                continue
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+# --- naming ---
+def naming_fields(info: Mapping[str, Any]) -> Dict[str, str]:
+    """The template fields of a yt-dlp info dict; unknown values are left out."""
+    fields = {
+        "title": info.get("title") or info.get("fulltitle"),
+        "uploader": info.get("uploader") or info.get("channel") or info.get("creator"),
+        "id": info.get("id"),
+    }
+    date = str(info.get("upload_date") or info.get("release_date") or "")
+    if len(date) == 8 and date.isdigit():
+        fields["date"] = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+    return {k: str(v) for k, v in fields.items() if v}
+
+
+def sanitize(component: str) -> str:
+    """
+    One path component that is safe on macOS, Linux and FAT/SMB volumes:
+    separators become dashes, control and reserved characters go, no leading
+    dot (hidden files, '..') and at most `_MAX_NAME_BYTES` of UTF-8.
+    """
+    text = component
+    for char, replacement in _SEPARATORS.items():
+        text = text.replace(char, replacement)
+    text = _SPACES.sub(" ", _UNSAFE.sub("", text))
+    text = text.strip().lstrip(".").strip()
+    encoded = text.encode("utf-8")
+    if len(encoded) > _MAX_NAME_BYTES:
+        text = encoded[:_MAX_NAME_BYTES].decode("utf-8", "ignore")
+    text = text.rstrip(". ")
+    return text or "untitled"
+
+
+def validate_template(template: str) -> str:
+    """Return `template` unchanged, or raise ValueError naming what is wrong with it."""
+    if not template.strip():
+        raise ValueError("The file name template is empty")
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise ValueError(f"Invalid file name template: {e}") from None
+    for _, field, _, _ in parsed:
+        if field is not None and field not in NAME_FIELDS:
+            raise ValueError(f"Unknown field {{{field}}}; use " + ", ".join(f"{{{f}}}" for f in NAME_FIELDS))
+    return template
+
+
+def render_name(template: str, fields: Mapping[str, str], ext: str = ".mp3") -> str:
+    """
+    Fill in `template` and return a relative path ending in `ext`. A '/' in the
+    template makes a subfolder; values can never add folders or leave the
+    destination. Missing fields render as 'Unknown'.
+    """
+    values = {name: sanitize(fields[name]) if fields.get(name) else "Unknown" for name in NAME_FIELDS}
+    try:
+        rendered = validate_template(template).format_map(values)
+    except (IndexError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid file name template: {e}") from None
+    parts = [sanitize(p) for p in rendered.split("/") if p.strip().strip(".")]
+    return os.path.join(*parts) + ext if parts else "untitled" + ext
+
+
+# --- placement ---
+def unique_path(directory: str, filename: str) -> str:
+    """`directory/filename`, or 'name (2).ext', 'name (3).ext'... if that is taken."""
+    dest = os.path.join(directory, filename)
+    stem, ext = os.path.splitext(filename)
+    n = 2
+    while os.path.lexists(dest):
+        dest = os.path.join(directory, f"{stem} ({n}){ext}")
+        n += 1
+    return dest
+
+
+def publish(staged: str, directory: str, filename: str) -> str:
+    """
+    Atomically give `staged` its final name in `directory`, without overwriting
+    anything: on a collision the next free 'name (n).ext' is taken. Hardlinking
+    fails instead of clobbering, so two jobs finishing the same title at once
+    both keep their file. `filename` may include subfolders. Returns the final path.
+    """
+    directory = os.path.dirname(os.path.join(directory, filename))
+    filename = os.path.basename(filename)
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        dest = unique_path(directory, filename)
+        try:
+            os.link(staged, dest)
+        except FileExistsError:
+            continue  # somebody took that name in between
+        except OSError:
+            # No hardlinks here (e.g. exFAT, SMB); a rename is still atomic, just not race-free
+            os.replace(staged, dest)
+            return dest
+        os.remove(staged)
+        return dest
+
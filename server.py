@@ -0,0 +1,432 @@
+"""
+Local HTTP/JSON API over an ExtractionService (asyncio, stdlib only).
+
+    POST   /jobs                 {"url": "..."} or {"urls": [...]}, optional "normalization",
+                                 "skip_duplicates" (already downloaded or queued URLs come back skipped)
+    GET    /jobs                 active and recently finished jobs
+    GET    /jobs/<id>
+    DELETE /jobs/<id>            cancel
+    GET    /events[?job=<id>]    server-sent events: progress, stage, result, job
+    GET    /history[?limit=&before=<ts>,<id>]
+    GET    /history/search?q=...[&limit=]
+    GET    /metrics              throughput and stage timings
+    GET    /probe?url=...        title, duration, estimated size and entries, without downloading
+                                 (&normalization=... to probe the format a job with it would fetch)
+
+Requests need "Authorization: Bearer <token>" (or ?token= for EventSource
+clients, which cannot set headers); without one, a token is generated (see
+ApiServer.token; `cli.py serve` prints it). Host and Origin must name this machine, so pages on other
+sites can't reach the API through the browser (DNS rebinding), and POST
+bodies must be application/json, which a cross-site form can't send.
+"""
+import asyncio
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from events import DownloadEvent
+from job_queue import Job
+from models import Normalization
+from service import ExtractionService
+from urls import validate_url
+
+MAX_BODY = 1024 * 1024
+MAX_HEADERS = 100
+IDLE_TIMEOUT = 30.0
+# Progress is coalesced per entry and pushed to event streams this often
+PROGRESS_INTERVAL = 0.2
+# Events a slow event-stream client may fall behind before it is disconnected
+CLIENT_BACKLOG = 256
+KEEPALIVE_INTERVAL = 15.0
+MAX_FINISHED_JOBS = 500
+
+# Names a Host or Origin may use besides the address the server listens on
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+            404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            415: "Unsupported Media Type", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class JobRegistry:
+    """Thread-safe view of submitted jobs, including the latest progress and per-entry results."""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS) -> None:
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._finished = 0
+
+    def add(self, job: Job, url: str, normalization: str) -> None:
+        with self._lock:
+            self._jobs[job.id] = {"job": job, "url": url, "normalization": normalization,
+                                  "stage": None, "progress": None, "results": []}
+
+    def record(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._jobs.get(event.get("job"))
+            if entry is None:
+                return
+            if event["kind"] == "progress":
+                entry["progress"] = {k: event[k] for k in ("index", "downloaded_bytes", "total_bytes",
+                                                           "speed", "eta", "fragment_index", "fragment_count")}
+            elif event["kind"] == "stage":
+                entry["stage"] = event["stage"] if event["state"] == "started" else None
+            elif event["kind"] == "result":
+                entry["results"].append({k: event.get(k) for k in ("index", "path", "title", "error", "elapsed")})
+
+    def finished(self, job: Job) -> None:
+        with self._lock:
+            self._finished += 1
+            while self._finished > self.max_finished:
+                oldest = next((i for i, e in self._jobs.items() if e["job"].finished), None)
+                if oldest is None:
+                    break
+                del self._jobs[oldest]
+                self._finished -= 1
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            return self._describe(entry) if entry else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._describe(e) for e in self._jobs.values()]
+
+    @staticmethod
+    def _describe(entry: Dict[str, Any]) -> Dict[str, Any]:
+        job: Job = entry["job"]
+        return {"id": job.id, "url": entry["url"], "normalization": entry["normalization"],
+                "state": job.state.value, "error": str(job.error) if job.error else None,
+                "submitted_at": job.submitted_at, "started_at": job.started_at,
+                "finished_at": job.finished_at, "stage": entry["stage"], "progress": entry["progress"],
+                "results": list(entry["results"])}
+
+
+class _Client:
+    __slots__ = ("job", "queue", "lagging")
+
+    def __init__(self, job: Optional[int]) -> None:
+        self.job = job
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=CLIENT_BACKLOG)
+        self.lagging = False
+
+    def offer(self, job: Optional[int], data: bytes) -> None:
+        if self.lagging or (self.job is not None and job != self.job):
+            return
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Dropping events silently would leave the client with a wrong picture
+            self.lagging = True
+
+
+class EventHub:
+    """
+    Fans events out to event-stream clients. Download threads call `publish`;
+    progress is coalesced to the latest value per entry and flushed every
+    PROGRESS_INTERVAL, everything else goes out immediately (after any
+    progress still pending for that job). Each event is encoded once.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self._clients: Set[_Client] = set()
+        self._lock = threading.Lock()
+        self._progress: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+
+    def publish(self, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            if payload["kind"] == "progress":
+                self._progress[(payload["job"], payload["index"])] = payload
+                return
+            pending = [self._progress.pop(k) for k in [k for k in self._progress if k[0] == payload.get("job")]]
+        self.loop.call_soon_threadsafe(self._broadcast, pending + [payload])
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            with self._lock:
+                pending, self._progress = list(self._progress.values()), {}
+            if pending:
+                self._broadcast(pending)
+
+    def _broadcast(self, payloads: List[Dict[str, Any]]) -> None:
+        for payload in payloads:
+            data = f"event: {payload['kind']}\ndata: {json.dumps(payload)}\n\n".encode()
+            for client in self._clients:
+                client.offer(payload.get("job"), data)
+
+    def attach(self, job: Optional[int] = None) -> _Client:
+        client = _Client(job)
+        self._clients.add(client)
+        return client
+
+    def detach(self, client: _Client) -> None:
+        self._clients.discard(client)
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+
+class ApiServer:
+    def __init__(self, service: ExtractionService, host: str = "127.0.0.1", port: int = 8787,
+                 token: Optional[str] = None, default_normalization: str = Normalization.HIGH.value) -> None:
+        self.service = service
+        self.host = host
+        self.port = port
+        self.generated_token = not token
+        self.token = token or secrets.token_urlsafe(24)
+        self.default_normalization = default_normalization
+        self.jobs = JobRegistry()
+        self.metrics = service.metrics
+        self.hub: Optional[EventHub] = None
+        self.started = time.time()
+
+    # --- engine side (download threads) ---
+    def _on_event(self, event: DownloadEvent) -> None:
+        payload = event.to_dict()
+        self.jobs.record(payload)
+        self.hub.publish(payload)
+
+    def _on_job_done(self, job: Job) -> None:
+        self.jobs.finished(job)
+        payload = self.jobs.get(job.id)
+        if payload is not None:
+            self.hub.publish(dict(payload, kind="job", job=job.id))
+
+    # --- lifecycle ---
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.hub = EventHub(loop)
+        self.service.downloader.events.subscribe(self._on_event)
+        self.service.on_job_done = self._on_job_done
+        hub_task = asyncio.ensure_future(self.hub.run())
+        await loop.run_in_executor(None, self.service.resume, lambda job: self.jobs.add(job, *job.args[:2]))
+        server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        self.service.logger.info(f"[api] Listening on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            hub_task.cancel()
+            self.service.downloader.events.unsubscribe(self._on_event)
+
+    # --- HTTP ---
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._respond(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    self._check_origin(headers)
+                    self._authorize(headers, query)
+                    if path == "/events":
+                        if method != "GET":
+                            raise HttpError(405, "Use GET")
+                        await self._stream_events(writer, query)
+                        break
+                    if method == "POST" and headers.get("content-type", "").split(";")[0].strip().lower() \
+                            != "application/json":
+                        raise HttpError(415, "Send the body as application/json")
+                    status, payload = await self._route(method, path, query, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split(" ", 2)
+        except ValueError as e:
+            raise HttpError(400, "Malformed request line") from e
+        headers: Dict[str, str] = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError as e:
+            raise HttpError(400, "Malformed Content-Length") from e
+        if length < 0:
+            raise HttpError(400, "Malformed Content-Length")
+        if length > MAX_BODY:
+            raise HttpError(413, "Body too large")
+        body = await asyncio.wait_for(reader.readexactly(length), IDLE_TIMEOUT) if length else b""
+        parts = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        if version.strip() != "HTTP/1.1" and headers.get("connection", "").lower() != "keep-alive":
+            headers["connection"] = "close"
+        return method.upper(), parts.path.rstrip("/") or "/", query, headers, body
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    def _check_origin(self, headers: Dict[str, str]) -> None:
+        host = urlsplit("//" + headers.get("host", "")).hostname
+        if "host" in headers and host not in LOOPBACK_HOSTS + (self.host,):
+            raise HttpError(403, f"Host {headers.get('host', '')!r} is not this server")
+        origin = headers.get("origin")
+        if origin is not None and urlsplit(origin).hostname not in LOOPBACK_HOSTS + (self.host,):
+            raise HttpError(403, f"Origin {origin!r} is not allowed")
+
+    def _authorize(self, headers: Dict[str, str], query: Dict[str, str]) -> None:
+        token = self.token.encode()
+        if not (secrets.compare_digest(headers.get("authorization", "").encode(), b"Bearer " + token)
+                or secrets.compare_digest(query.get("token", "").encode(), token)):
+            raise HttpError(401, "Missing or wrong token")
+
+    async def _route(self, method: str, path: str, query: Dict[str, str], body: bytes) -> Tuple[int, Any]:
+        loop = asyncio.get_running_loop()
+        parts = path.strip("/").split("/")
+        if parts[0] == "jobs" and len(parts) == 1:
+            if method == "GET":
+                return 200, {"jobs": self.jobs.list()}
+            if method == "POST":
+                return 202, {"jobs": await loop.run_in_executor(None, self._submit, self._json(body))}
+            raise HttpError(405, "Use GET or POST")
+        if parts[0] == "jobs" and len(parts) == 2:
+            job_id = self._int(parts[1], "job id")
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise HttpError(404, f"No job {job_id}")
+            if method == "GET":
+                return 200, job
+            if method == "DELETE":
+                self.service.queue.cancel(job_id)
+                return 202, self.jobs.get(job_id)
+            raise HttpError(405, "Use GET or DELETE")
+        if method != "GET":
+            raise HttpError(405, "Use GET")
+        if path == "/history":
+            before = None
+            if "before" in query:
+                ts, _, row_id = query["before"].partition(",")
+                before = (self._int(ts, "before"), self._int(row_id, "before"))
+            limit = min(self._int(query.get("limit", "100"), "limit"), 1000)
+            rows = await loop.run_in_executor(None, self.service.db.select_history_page, before, limit)
+            return 200, {"history": rows}
+        if path == "/history/search":
+            limit = min(self._int(query.get("limit", "50"), "limit"), 500)
+            rows = await loop.run_in_executor(None, self.service.db.search_history, query.get("q", ""), limit)
+            return 200, {"history": rows}
+        if path == "/metrics":
+            snapshot = self.metrics.snapshot()
+            snapshot["jobs"] = {str(k): v for k, v in snapshot["jobs"].items()}
+            snapshot.update(active=self.service.queue.active_count(), pending=self.service.queue.pending_count(),
+                            event_clients=self.hub.client_count, uptime=time.time() - self.started)
+            return 200, snapshot
+        if path == "/probe":
+            return 200, await loop.run_in_executor(None, self._probe, query.get("url", ""),
+                                                   query.get("normalization") or self.default_normalization)
+        raise HttpError(404, f"No route for {path}")
+
+    def _probe(self, url: str, normalization: str) -> Dict[str, Any]:
+        try:
+            url = validate_url(url)
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        if normalization not in [n.value for n in Normalization]:
+            raise HttpError(400, f"Unknown normalization {normalization!r}")
+        try:
+            return self.service.downloader.probe(url, normalization=normalization, codec=self.service.codec).to_dict()
+        except Exception as e:
+            raise HttpError(422, str(e)) from None
+
+    def _submit(self, request: Any) -> List[Dict[str, Any]]:
+        if not isinstance(request, dict):
+            raise HttpError(400, "Expected a JSON object")
+        urls = request.get("urls") or ([request["url"]] if request.get("url") else [])
+        if not urls or not all(isinstance(u, str) for u in urls):
+            raise HttpError(400, "Expected 'url' or 'urls' with http(s) URLs")
+        try:
+            urls = [validate_url(u) for u in urls]
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        normalization = request.get("normalization") or self.default_normalization
+        if normalization not in [n.value for n in Normalization]:
+            raise HttpError(400, f"Unknown normalization {normalization!r}")
+        jobs = []
+        for url in urls:
+            duplicate = self.service.duplicate_of(url) if request.get("skip_duplicates") else None
+            if duplicate is not None:
+                jobs.append({"url": url, "skipped": True, "duplicate_of": duplicate})
+                continue
+            # Registered before it can run, so a fast job can't finish before the registry knows it
+            job = self.service.submit(url, normalization,
+                                      on_queued=lambda job: self.jobs.add(job, url, normalization))
+            jobs.append(self.jobs.get(job.id))
+        return jobs
+
+    async def _stream_events(self, writer: asyncio.StreamWriter, query: Dict[str, str]) -> None:
+        job = self._int(query["job"], "job") if "job" in query else None
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        client = self.hub.attach(job)
+        try:
+            while not client.lagging:
+                try:
+                    data = await asyncio.wait_for(client.queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    data = b": keepalive\n\n"
+                writer.write(data)
+                await writer.drain()
+        finally:
+            self.hub.detach(client)
+
+    @staticmethod
+    def _json(body: bytes) -> Any:
+        try:
+            return json.loads(body or b"null")
+        except ValueError as e:
+            raise HttpError(400, "Body is not valid JSON") from e
+
+    @staticmethod
+    def _int(value: str, name: str) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError) as e:
+            raise HttpError(400, f"Bad {name}: {value!r}") from e
@@ -0,0 +1,290 @@
+import os
+import shutil
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from database import MediaDB, DB_FILENAME
+from downloader import Downloader, DownloadResult, ProbeResult
+from events import ThroughputMetrics
+from formats import DEFAULT_CODEC, output_format
+from job_queue import Job, JobQueue, JobState
+from logs import LogPipeline
+from naming import DEFAULT_TEMPLATE, sweep_staging
+from urls import canonical_id, canonical_url
+
+APP_ID = "felipediasazevedo.mediaext"
+
+# Job orders: as submitted, smallest source first, or shortest expected transfer first
+SCHEDULES = ("fifo", "shortest", "bandwidth")
+# Rate assumed for "bandwidth" until something has been downloaded
+_DEFAULT_BYTES_PER_SEC = 1_000_000
+# Cost of a job whose size could not be estimated: after everything else
+_UNKNOWN_COST = 2 ** 62
+# Where jobs wait until their probe is in: behind every probed job, so they can't jump the order
+_UNPROBED_PRIORITY = -_UNKNOWN_COST - 1
+
+
+def default_data_dir() -> str:
+    """Where the headless engine keeps its database and caches; the app's folder on macOS."""
+    if os.environ.get("MEDIAEXT_HOME"):
+        return os.environ["MEDIAEXT_HOME"]
+    if sys.platform == "darwin":
+        return os.path.expanduser(f"~/Library/Application Support/{APP_ID}")
+    base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "mediaext")
+
+
+class ExtractionService:
+    """
+    The app's download flow without the app: journaled jobs on a JobQueue,
+    files encoded straight into `output_dir` as `codec` (see formats.py),
+    named by `name_template` (see naming.render_name), and recorded in history.
+
+    `on_result(job, result)` is called on the worker thread for every entry,
+    with `result.path` pointing at the final location on success, and
+    `on_job_done(job)` once the job is finished and recorded.
+
+    URLs are deduplicated by canonical id (see urls.py): `duplicate_of` finds
+    an earlier download or a job in flight, and `submit(..., skip_duplicates=True)`
+    leaves those out. Duplicates that are submitted anyway come from the cache when
+    it still has them.
+
+    With a `schedule` other than "fifo", every URL is probed (see Downloader.probe)
+    while it waits, and pending jobs are reordered by expected size or, for
+    "bandwidth", by size over the throughput seen from that site. `max_bytes`
+    and `max_duration` (seconds) fail a job before anything is downloaded.
+    """
+
+    def __init__(self, data_dir: str, output_dir: str, logger: LogPipeline, workers: int = 4,
+                 fragment_concurrency: int = 4, adaptive_fragments: bool = True,
+                 name_template: str = DEFAULT_TEMPLATE, codec: str = DEFAULT_CODEC, schedule: str = "fifo",
+                 max_bytes: Optional[int] = None, max_duration: Optional[float] = None,
+                 on_result: Optional[Callable[[Job, DownloadResult], None]] = None,
+                 on_job_done: Optional[Callable[[Job], None]] = None) -> None:
+        if schedule not in SCHEDULES:
+            raise ValueError(f"Unknown schedule {schedule!r}; use one of {', '.join(SCHEDULES)}")
+        output_format(codec)  # ValueError for unknown codecs
+        os.makedirs(data_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.name_template = name_template
+        self.codec = codec
+        self.schedule = schedule
+        self.max_bytes = max_bytes
+        self.max_duration = max_duration
+        self.logger = logger
+        self.on_result = on_result
+        self.on_job_done = on_job_done
+        self.downloader = Downloader(logger, cache_dir=os.path.join(data_dir, "cache"),
+                                     work_root=os.path.join(data_dir, "partials"),
+                                     fragment_concurrency=fragment_concurrency,
+                                     adaptive_fragments=adaptive_fragments)
+        self.db = MediaDB(db_path=os.path.join(data_dir, DB_FILENAME), logger=logger)
+        swept = sweep_staging(output_dir)
+        if swept:
+            self.logger.info(f"Removed {swept} unfinished file(s) left in {output_dir}.")
+        self.queue = JobQueue(max_workers=workers, name="download")
+        self.probes = JobQueue(max_workers=4, name="probe") if schedule != "fifo" else None
+        self.metrics = ThroughputMetrics(self.downloader.events)
+        self._idle = threading.Condition()
+        self._outstanding = 0
+        self._stopping = False
+        self._inflight: Dict[str, int] = {}  # canonical id -> job id
+        self._backfilled = threading.Event()
+        # History rows from before canonical ids were recorded; needs the extractor table, so not inline
+        threading.Thread(target=self._backfill, name="canonical-backfill", daemon=True).start()
+
+    # --- submission ---
+    def duplicate_of(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        What `url` duplicates: {"job": id} while one is in flight, else its newest history row.
+        Until older history has canonical ids, rows without one match on the URL as given.
+
+        A playlist URL (including watch?v=...&list=...) names the playlist, e.g.
+        'YoutubeTab:<list id>', while history records each of its entries, so it only
+        matches the same playlist in flight; its entries aren't known without fetching it.
+        """
+        key = canonical_id(url)
+        with self._idle:
+            job_id = self._inflight.get(key)
+        if job_id is not None:
+            return {"job": job_id, "canonical_id": key}
+        urls = () if self._backfilled.is_set() else tuple(dict.fromkeys((url, canonical_url(url))))
+        row = self.db.find_history(key, urls)
+        return dict(row, canonical_id=key) if row else None
+
+    def submit(self, url: str, normalization: str, skip_duplicates: bool = False,
+               on_queued: Optional[Callable[[Job], None]] = None) -> Optional[Job]:
+        """
+        Queue `url`; with `skip_duplicates`, returns None instead if `duplicate_of` finds something.
+        `on_queued(job)` runs before the job can start, see JobQueue.submit.
+        """
+        if skip_duplicates:
+            duplicate = self.duplicate_of(url)
+            if duplicate is not None:
+                where = f"job {duplicate['job']}" if "job" in duplicate else duplicate["file"]
+                self.logger.info(f"Skipping {url}: already downloaded ({where})")
+                return None
+        journal_id = self.db.journal_add(url, normalization)
+        work_dir = self.downloader.job_dir(journal_id)
+        self.db.journal_update(journal_id, MediaDB.JOB_PENDING, work_dir=work_dir)
+        return self._submit(url, normalization, journal_id, work_dir, on_queued)
+
+    def resume(self, on_queued: Optional[Callable[[Job], None]] = None) -> List[Job]:
+        """Re-queue jobs interrupted by a crash or stop and reclaim temp dirs nobody will resume."""
+        unfinished = self.db.journal_unfinished()
+        removed = self.downloader.reclaim_orphans(keep=[j["work_dir"] for j in unfinished])
+        if removed:
+            self.logger.info(f"Reclaimed {removed} orphaned temp folder(s).")
+        jobs = []
+        for j in unfinished:
+            self.logger.info(f"Resuming interrupted download: {j['url']}")
+            jobs.append(self._submit(j["url"], j["normalization"], j["id"], j["work_dir"], on_queued))
+        return jobs
+
+    def _submit(self, url: str, normalization: str, journal_id: int, work_dir: Optional[str],
+                on_queued: Optional[Callable[[Job], None]] = None) -> Job:
+        key = canonical_id(url)
+        with self._idle:
+            self._outstanding += 1
+            job = self.queue.submit(self._download_job, url, normalization, journal_id, work_dir,
+                                    priority=_UNPROBED_PRIORITY if self.probes is not None else 0,
+                                    on_done=self._job_done, on_queued=on_queued)
+            self._inflight.setdefault(key, job.id)
+        self.logger.info(f"[job {job.id}] Extract queued: {url}")
+        if self.probes is not None:
+            self.probes.submit(self._probe_job, job.id, url, normalization,
+                               on_done=lambda p: self.probes.forget(p.id))
+        return job
+
+    # --- scheduling ---
+    def _probe_job(self, probe_job: Job, job_id: int, url: str, normalization: str) -> None:
+        try:
+            probe = self.downloader.probe(url, normalization=normalization, codec=self.codec)
+        except Exception as e:
+            self.logger.warning(f"[job {job_id}] Probe failed, scheduling it last: {e}")
+            self.queue.reprioritize(job_id, -_UNKNOWN_COST)
+            return
+        cost = self._cost(probe)
+        if self.queue.reprioritize(job_id, -cost):
+            size = _megabytes(probe.estimated_bytes) if probe.estimated_bytes else "unknown size"
+            self.logger.info(f"[job {job_id}] Scheduled ({self.schedule}): {probe.title or url}, {size}")
+
+    def _cost(self, probe: ProbeResult) -> int:
+        """Bytes ("shortest") or expected milliseconds ("bandwidth") a job will take; lower runs first."""
+        size = probe.estimated_bytes
+        if size is None:
+            return _UNKNOWN_COST
+        if self.schedule == "bandwidth":
+            rate = (self.metrics.extractor_bytes_per_sec(probe.extractor) or self.metrics.bytes_per_sec()
+                    or _DEFAULT_BYTES_PER_SEC)
+            return min(int(size / rate * 1000), _UNKNOWN_COST)
+        return min(size, _UNKNOWN_COST)
+
+    def _rejection(self, url: str, normalization: str) -> Optional[str]:
+        """Why `url` is over the size/duration limits, or None. Unknown sizes pass; the probe is cached."""
+        try:
+            probe = self.downloader.probe(url, normalization=normalization, codec=self.codec)
+        except Exception:
+            return None  # the download itself reports why the URL doesn't resolve
+        if self.max_duration and probe.duration and probe.duration > self.max_duration:
+            return f"Source rejected: {probe.duration / 60:.0f} min is over the {self.max_duration / 60:.0f} min limit"
+        size = probe.estimated_bytes
+        if self.max_bytes and size and size > self.max_bytes:
+            return f"Source rejected: {_megabytes(size)} is over the {_megabytes(self.max_bytes)} limit"
+        return None
+
+    # --- jobs ---
+    def _download_job(self, job: Job, url: str, normalization: str, journal_id: int,
+                      work_dir: Optional[str]) -> List[DownloadResult]:
+        with self.logger.bind(f"job {job.id}"):
+            self.db.journal_update(journal_id, MediaDB.JOB_RUNNING)
+            self.logger.info(f"[job {job.id}] Using normalization: {normalization}")
+
+            def finished(result: DownloadResult) -> None:
+                if result.ok:
+                    self._save(result, normalization)
+                    self.logger.info(f"[job {job.id}] Saved: {result.path}")
+                else:
+                    self.logger.error(f"[job {job.id}] Entry {result.index} failed: {result.error}")
+                if self.on_result is not None:
+                    self.on_result(job, result)
+
+            rejection = self._rejection(url, normalization) if self.max_bytes or self.max_duration else None
+            if rejection:
+                finished(DownloadResult(url, error=rejection))
+                raise RuntimeError(rejection)
+
+            results = self.downloader.download_batch([url], normalization, on_result=finished,
+                                                     cancel_event=job.cancel_event, work_dir=work_dir,
+                                                     job=job.id, output_dir=self.output_dir,
+                                                     name_template=self.name_template, codec=self.codec)
+            if not any(r.ok for r in results):
+                raise RuntimeError(results[0].error if results else "Nothing was downloaded")
+            return results
+
+    def _save(self, result: DownloadResult, normalization: str) -> None:
+        # The downloader already published the file under a free name in output_dir
+        self.db.insert_history_async(
+            os.path.basename(result.path), result.url, title=result.title, extractor=result.extractor,
+            duration=result.duration, normalization=normalization, timings=result.timings,
+            elapsed=result.elapsed, bytes=os.path.getsize(result.path),
+            canonical_id=result.source_id or canonical_id(result.url))
+
+    def _job_done(self, job: Job) -> None:
+        try:
+            if job.state is JobState.FAILED:
+                self.logger.error(f"[job {job.id}] Download failed: {job.error}")
+            elif job.state is JobState.CANCELLED:
+                self.logger.warning(f"[job {job.id}] Download cancelled.")
+            _, _, journal_id, work_dir = job.args
+            # Interrupted by close(): leave it journaled, with its partials, for resume()
+            if not (self._stopping and job.state is JobState.CANCELLED):
+                self.db.journal_update(journal_id, job.state.value, error=str(job.error) if job.error else None)
+                if work_dir:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                self.queue.forget(job.id)
+        finally:
+            with self._idle:
+                self._outstanding -= 1
+                key = canonical_id(job.args[0])
+                if self._inflight.get(key) == job.id:
+                    del self._inflight[key]
+                self._idle.notify_all()
+        if self.on_job_done is not None:
+            try:
+                self.on_job_done(job)
+            except Exception as e:
+                self.logger.error(f"[job {job.id}] on_job_done failed: {e}")
+
+    def _backfill(self) -> None:
+        try:
+            updated = self.db.backfill_canonical_ids(canonical_id)
+        except Exception as e:
+            self.logger.warning(f"Could not index older history for duplicate detection: {e}")
+            return
+        finally:
+            self._backfilled.set()
+        if updated:
+            self.logger.info(f"Indexed {updated} older history entries for duplicate detection.")
+
+    # --- lifecycle ---
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until every submitted job finished and was recorded; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def close(self) -> None:
+        """Stop all jobs (they stay journaled for `resume`), wait for them, then close storage."""
+        self._stopping = True
+        if self.probes is not None:
+            self.probes.shutdown(wait=True)
+        self.queue.cancel_all()
+        self.queue.shutdown(wait=True)
+        self.db.close()
+        self.downloader.close()
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / 1e6:.0f} MB" if size >= 1e8 else f"{size / 1e6:.3g} MB"
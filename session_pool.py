@@ -0,0 +1,215 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+import yt_dlp
+
+_MISSING = object()
+
+
+class Session(object):
+    """
+    One warm YoutubeDL instance plus the per-job state bound onto it.
+
+    Progress/post-processor hooks are installed once at creation and dispatch
+    to whatever the current job bound, so a session can be reused without
+    stacking hooks. Job-specific params (output template, playlist handling,
+    ...) are applied with `bind` and rolled back when the session is released.
+    """
+
+    def __init__(self, key: Hashable, opts: Dict[str, Any]) -> None:
+        self.key = key
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self._progress_hooks: List[Callable] = []
+        self._pp_hooks: List[Callable] = []
+        self._saved_params: Dict[str, Any] = {}
+
+        opts = dict(opts)
+        opts['progress_hooks'] = [self._on_progress]
+        opts['postprocessor_hooks'] = [self._on_postprocess]
+        self.ydl = yt_dlp.YoutubeDL(opts)
+
+    def _on_progress(self, d):
+        for hook in self._progress_hooks:
+            hook(d)
+
+    def _on_postprocess(self, d):
+        for hook in self._pp_hooks:
+            hook(d)
+
+    def bind(self, outtmpl: Optional[str] = None, progress_hooks: Optional[List[Callable]] = None,
+             postprocessor_hooks: Optional[List[Callable]] = None, **params) -> "Session":
+        """Attach job-specific output template, hooks and params until `unbind`."""
+
+        if outtmpl is not None:
+            self.set_outtmpl(outtmpl)
+        for name, value in params.items():
+            self._save(name, self.ydl.params.get(name, _MISSING))
+            self.ydl.params[name] = value
+        self._progress_hooks = list(progress_hooks or [])
+        self._pp_hooks = list(postprocessor_hooks or [])
+        return self
+
+    def set_outtmpl(self, outtmpl: str) -> None:
+        """Point the default output template somewhere else; can be called repeatedly while bound."""
+
+        current = self.ydl.params.get('outtmpl')
+        if isinstance(current, dict):
+            self._save('outtmpl', dict(current))
+            current['default'] = outtmpl
+        else:
+            self._save('outtmpl', current)
+            self.ydl.params['outtmpl'] = outtmpl
+
+    @contextmanager
+    def override(self, **params) -> Iterator["Session"]:
+        """
+        Change params for one step of a bound job (e.g. a single entry's download) and put the
+        job's values back afterwards. `unbind` still restores the originals if the step never returns.
+        """
+        previous = {name: self.ydl.params.get(name, _MISSING) for name in params}
+        for name, value in params.items():
+            self._save(name, previous[name])
+            self.ydl.params[name] = value
+        try:
+            yield self
+        finally:
+            for name, value in previous.items():
+                if value is _MISSING:
+                    self.ydl.params.pop(name, None)
+                else:
+                    self.ydl.params[name] = value
+
+    def _save(self, name: str, value: Any) -> None:
+        self._saved_params.setdefault(name, value)
+
+    def unbind(self) -> None:
+        for name, value in self._saved_params.items():
+            if value is _MISSING:
+                self.ydl.params.pop(name, None)
+            else:
+                self.ydl.params[name] = value
+        self._saved_params.clear()
+        self._progress_hooks = []
+        self._pp_hooks = []
+        self.uses += 1
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+
+class YoutubeDLPool:
+    """
+    Pool of warm YoutubeDL sessions keyed by option set (e.g. normalization + format).
+
+    Reusing a session keeps its extractor instances, HTTP handlers (and their
+    keep-alive connections) and cookie jar across jobs. Each session is used
+    by one job at a time; idle sessions are retired after `idle_timeout`
+    seconds or `max_uses` jobs, and at most `max_idle_per_key` are kept.
+    """
+
+    def __init__(self, max_idle_per_key: int = 2, idle_timeout: float = 300.0, max_uses: int = 200) -> None:
+        self.max_idle_per_key = max_idle_per_key
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self._idle: Dict[Hashable, List[Session]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def session(self, key: Hashable, opts_factory: Callable[[], Dict[str, Any]]) -> Iterator[Session]:
+        """Check out a session for `key`, creating one from `opts_factory()` if none is idle."""
+
+        s = self._acquire(key)
+        if s is None:
+            s = Session(key, opts_factory())
+            with self._lock:
+                self.created += 1
+        try:
+            yield s
+        except BaseException:
+            # A failed job may leave the session half-way through something; don't reuse it
+            s.unbind()
+            s.close()
+            raise
+        else:
+            s.unbind()
+            self._release(s)
+
+    def _acquire(self, key: Hashable) -> Optional[Session]:
+        expired: List[Session] = []
+        found = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            now = time.monotonic()
+            while idle:
+                s = idle.pop()
+                if now - s.last_used > self.idle_timeout:
+                    expired.append(s)
+                    continue
+                found = s
+                self.reused += 1
+                break
+        for s in expired:
+            s.close()
+        return found
+
+    def _release(self, s: Session) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(s.key, [])
+            if not self._closed and s.uses < self.max_uses and len(idle) < self.max_idle_per_key:
+                idle.append(s)
+                return
+        s.close()
+
+    def prune(self) -> int:
+        """Close sessions idle for longer than `idle_timeout`. Returns how many were closed."""
+
+        now = time.monotonic()
+        expired: List[Session] = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = [s for s in idle if now - s.last_used <= self.idle_timeout]
+                expired.extend(s for s in idle if now - s.last_used > self.idle_timeout)
+                self._idle[key] = keep
+        for s in expired:
+            s.close()
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "idle": sum(len(v) for v in self._idle.values()),
+                "keys": len(self._idle),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for s in sessions:
+            s.close()
+
+
+def pool_key(*parts: Any) -> Tuple:
+    """Build a hashable pool key from option values (dicts/lists are frozen)."""
+
+    def freeze(v):
+        if isinstance(v, dict):
+            return tuple(sorted((k, freeze(x)) for k, x in v.items()))
+        if isinstance(v, (list, tuple)):
+            return tuple(freeze(x) for x in v)
+        return v
+
+    return tuple(freeze(p) for p in parts)
@@ -3,19 +3,36 @@ from Cocoa import (
     NSView, NSTextField, 
     NSWindowStyleMaskTitled, NSWindowStyleMaskClosable,
     NSBackingStoreBuffered, NSMakeRect,
-    NSPopUpButton, NSWindowController, NSLayoutConstraint,
+    NSPopUpButton, NSButton, NSWindowController, NSLayoutConstraint,
     NSStackView,
     NSLayoutAttributeFirstBaseline, NSLayoutAttributeLeading,
     NSUserInterfaceLayoutOrientationHorizontal, NSUserInterfaceLayoutOrientationVertical,
-    NSLayoutConstraintOrientationHorizontal
+    NSLayoutConstraintOrientationHorizontal, NSOpenPanel, NSModalResponseOK, NSURL, NSBeep, NSColor,
+    NSLineBreakByTruncatingMiddle
 )
 import objc
-from user_defaults import UserDefaults, NORMALIZATION_OPTIONS
+from naming import NAME_FIELDS
+from user_defaults import (
+    UserDefaults, NORMALIZATION_OPTIONS, MAX_CONCURRENT_DOWNLOADS_OPTIONS, FRAGMENT_CONCURRENCY_OPTIONS, OUTPUT_CODECS
+)
+
+TEMPLATE_HINT = "Use " + " ".join(f"{{{f}}}" for f in NAME_FIELDS) + "; a / makes subfolders."
+
+
+def _formRow(label, control):
+    row = NSStackView.alloc().initWithFrame_(NSMakeRect(0,0,0,0))
+    row.setOrientation_(NSUserInterfaceLayoutOrientationHorizontal)
+    row.setAlignment_(NSLayoutAttributeFirstBaseline)  # baseline align label & popup
+    row.setSpacing_(12.0)
+    row.setTranslatesAutoresizingMaskIntoConstraints_(False)
+    row.addArrangedSubview_(label)
+    row.addArrangedSubview_(control)
+    return row
 
 
 class SettingsContent(NSView):
     def init(self):
-        self = objc.super(SettingsContent, self).initWithFrame_(NSMakeRect(0, 0, 520, 240))
+        self = objc.super(SettingsContent, self).initWithFrame_(NSMakeRect(0, 0, 520, 372))
         if self is None: 
             return None
         
@@ -33,15 +50,67 @@ class SettingsContent(NSView):
         normalization = self.userDefaults.getNormalization()
         self.popup.selectItemWithTitle_(normalization)
 
+        # --- Form row: output format ---
+        self.codecLabel = NSTextField.labelWithString_("Format:")
+
+        self.codecPopup = NSPopUpButton.alloc().initWithFrame_pullsDown_(NSMakeRect(0,0,0,0), False)
+        self.codecPopup.addItemsWithTitles_(list(OUTPUT_CODECS))
+        self.codecPopup.setTarget_(self)
+        self.codecPopup.setAction_("codecChanged:")
+        self.codecPopup.selectItemWithTitle_(self.userDefaults.getOutputCodec())
+
+        # --- Form row: concurrent downloads ---
+        self.concurrencyLabel = NSTextField.labelWithString_("Concurrent downloads:")
+
+        self.concurrencyPopup = NSPopUpButton.alloc().initWithFrame_pullsDown_(NSMakeRect(0,0,0,0), False)
+        self.concurrencyPopup.addItemsWithTitles_([str(i) for i in MAX_CONCURRENT_DOWNLOADS_OPTIONS])
+        self.concurrencyPopup.setTarget_(self)
+        self.concurrencyPopup.setAction_("concurrencyChanged:")
+        self.concurrencyPopup.selectItemWithTitle_(str(self.userDefaults.getMaxConcurrentDownloads()))
+
+        # --- Form row: parallel fragments (HLS/DASH) ---
+        self.fragmentsLabel = NSTextField.labelWithString_("Parallel fragments:")
+
+        self.fragmentsPopup = NSPopUpButton.alloc().initWithFrame_pullsDown_(NSMakeRect(0,0,0,0), False)
+        self.fragmentsPopup.addItemsWithTitles_([str(i) for i in FRAGMENT_CONCURRENCY_OPTIONS])
+        self.fragmentsPopup.setTarget_(self)
+        self.fragmentsPopup.setAction_("fragmentsChanged:")
+        self.fragmentsPopup.selectItemWithTitle_(str(self.userDefaults.getFragmentConcurrency()))
+
+        self.adaptiveCheckbox = NSButton.checkboxWithTitle_target_action_(
+            "Back off when throttled", self, "adaptiveFragmentsChanged:"
+        )
+        self.adaptiveCheckbox.setState_(1 if self.userDefaults.getAdaptiveFragments() else 0)
+
+        # --- Form rows: where and how finished files are saved ---
+        self.saveFolderLabel = NSTextField.labelWithString_("Save to:")
+        self.saveFolderPath = NSTextField.labelWithString_(self.userDefaults.getSaveFolder())
+        self.saveFolderPath.setLineBreakMode_(NSLineBreakByTruncatingMiddle)
+        self.saveFolderPath.setTextColor_(NSColor.secondaryLabelColor())
+        self.saveFolderButton = NSButton.buttonWithTitle_target_action_("Choose…", self, "chooseSaveFolder:")
+
+        self.askCheckbox = NSButton.checkboxWithTitle_target_action_(
+            "Ask where to save each file", self, "askWhereToSaveChanged:"
+        )
+        self.askCheckbox.setState_(1 if self.userDefaults.getAskWhereToSave() else 0)
+
+        self.templateLabel = NSTextField.labelWithString_("File name:")
+        self.templateField = NSTextField.textFieldWithString_(self.userDefaults.getFileNameTemplate())
+        self.templateField.setTarget_(self)
+        self.templateField.setAction_("templateChanged:")
+        self.templateHint = NSTextField.labelWithString_(TEMPLATE_HINT)
+        self.templateHint.setTextColor_(NSColor.secondaryLabelColor())
+
         # --- Stack views ---
-        # Horizontal row for label + popup (like a SwiftUI HStack)
-        self.formRow = NSStackView.alloc().initWithFrame_(NSMakeRect(0,0,0,0))
-        self.formRow.setOrientation_(NSUserInterfaceLayoutOrientationHorizontal)
-        self.formRow.setAlignment_(NSLayoutAttributeFirstBaseline)  # baseline align label & popup
-        self.formRow.setSpacing_(12.0)
-        self.formRow.setTranslatesAutoresizingMaskIntoConstraints_(False)
-        self.formRow.addArrangedSubview_(self.label)
-        self.formRow.addArrangedSubview_(self.popup)
+        # Horizontal rows for label + popup (like a SwiftUI HStack)
+        self.formRow = _formRow(self.label, self.popup)
+        self.codecRow = _formRow(self.codecLabel, self.codecPopup)
+        self.concurrencyRow = _formRow(self.concurrencyLabel, self.concurrencyPopup)
+        self.fragmentsRow = _formRow(self.fragmentsLabel, self.fragmentsPopup)
+        self.fragmentsRow.addArrangedSubview_(self.adaptiveCheckbox)
+        self.saveFolderRow = _formRow(self.saveFolderLabel, self.saveFolderPath)
+        self.saveFolderRow.addArrangedSubview_(self.saveFolderButton)
+        self.templateRow = _formRow(self.templateLabel, self.templateField)
 
         # Vertical container (like a SwiftUI VStack)
         self.vstack = NSStackView.alloc().initWithFrame_(NSMakeRect(0,0,0,0))
@@ -55,11 +124,22 @@ class SettingsContent(NSView):
         # Add a bit more space before the separator
 
         self.vstack.addArrangedSubview_(self.formRow)
+        self.vstack.addArrangedSubview_(self.codecRow)
+        self.vstack.addArrangedSubview_(self.concurrencyRow)
+        self.vstack.addArrangedSubview_(self.fragmentsRow)
+        self.vstack.setCustomSpacing_afterView_(16.0, self.fragmentsRow)
+        self.vstack.addArrangedSubview_(self.saveFolderRow)
+        self.vstack.addArrangedSubview_(self.askCheckbox)
+        self.vstack.addArrangedSubview_(self.templateRow)
+        self.vstack.addArrangedSubview_(self.templateHint)
 
         # Add to view + constraints
         self.addSubview_(self.vstack)
         # Make subviews use Auto Layout
-        for v in (self.label, self.popup):
+        for v in (self.label, self.popup, self.codecLabel, self.codecPopup, self.concurrencyLabel, self.concurrencyPopup,
+                  self.fragmentsLabel, self.fragmentsPopup, self.adaptiveCheckbox,
+                  self.saveFolderLabel, self.saveFolderPath, self.saveFolderButton, self.askCheckbox,
+                  self.templateLabel, self.templateField, self.templateHint):
             v.setTranslatesAutoresizingMaskIntoConstraints_(False)
 
         NSLayoutConstraint.activateConstraints_([
@@ -69,14 +149,23 @@ class SettingsContent(NSView):
             self.vstack.topAnchor().constraintEqualToAnchor_constant_(self.topAnchor(), 24.0),
             self.vstack.bottomAnchor().constraintLessThanOrEqualToAnchor_constant_(self.bottomAnchor(), -24.0),
 
-            # Give the popup a sensible min width
+            # Give the popups a sensible min width
             self.popup.widthAnchor().constraintGreaterThanOrEqualToConstant_(140.0),
+            self.codecPopup.widthAnchor().constraintEqualToAnchor_(self.popup.widthAnchor()),
+            self.concurrencyPopup.widthAnchor().constraintEqualToAnchor_(self.popup.widthAnchor()),
+            self.fragmentsPopup.widthAnchor().constraintEqualToAnchor_(self.popup.widthAnchor()),
+            self.saveFolderPath.widthAnchor().constraintLessThanOrEqualToConstant_(260.0),
+            self.templateField.widthAnchor().constraintGreaterThanOrEqualToConstant_(260.0),
         ])
 
-        # Hugging/compression so the popup doesn't squish the label
-        self.label.setContentHuggingPriority_forOrientation_(251, NSLayoutConstraintOrientationHorizontal)
-        self.label.setContentCompressionResistancePriority_forOrientation_(751, NSLayoutConstraintOrientationHorizontal)
-        self.popup.setContentHuggingPriority_forOrientation_(250, NSLayoutConstraintOrientationHorizontal)
+        # Hugging/compression so the popups don't squish the labels
+        for label, popup in ((self.label, self.popup), (self.codecLabel, self.codecPopup),
+                             (self.concurrencyLabel, self.concurrencyPopup),
+                             (self.fragmentsLabel, self.fragmentsPopup), (self.saveFolderLabel, self.saveFolderPath),
+                             (self.templateLabel, self.templateField)):
+            label.setContentHuggingPriority_forOrientation_(251, NSLayoutConstraintOrientationHorizontal)
+            label.setContentCompressionResistancePriority_forOrientation_(751, NSLayoutConstraintOrientationHorizontal)
+            popup.setContentHuggingPriority_forOrientation_(250, NSLayoutConstraintOrientationHorizontal)
 
         return self
 
@@ -85,6 +174,45 @@ class SettingsContent(NSView):
         title = sender.titleOfSelectedItem()
         self.userDefaults.setNormalization(title)
 
+    def codecChanged_(self, sender):
+        self.userDefaults.setOutputCodec(sender.titleOfSelectedItem())
+
+    def concurrencyChanged_(self, sender):
+        self.userDefaults.setMaxConcurrentDownloads(int(sender.titleOfSelectedItem()))
+
+    def fragmentsChanged_(self, sender):
+        self.userDefaults.setFragmentConcurrency(int(sender.titleOfSelectedItem()))
+
+    def adaptiveFragmentsChanged_(self, sender):
+        self.userDefaults.setAdaptiveFragments(sender.state() == 1)
+
+    def chooseSaveFolder_(self, sender):
+        panel = NSOpenPanel.openPanel()
+        panel.setCanChooseFiles_(False)
+        panel.setCanChooseDirectories_(True)
+        panel.setCanCreateDirectories_(True)
+        panel.setPrompt_("Choose")
+        panel.setDirectoryURL_(NSURL.fileURLWithPath_(self.userDefaults.getSaveFolder()))
+        if panel.runModal() != NSModalResponseOK:
+            return
+        path = panel.URL().path()
+        self.userDefaults.setSaveFolder(path)
+        self.saveFolderPath.setStringValue_(path)
+
+    def askWhereToSaveChanged_(self, sender):
+        self.userDefaults.setAskWhereToSave(sender.state() == 1)
+
+    def templateChanged_(self, sender):
+        try:
+            self.userDefaults.setFileNameTemplate(sender.stringValue().strip())
+        except ValueError as e:
+            NSBeep()
+            self.templateHint.setStringValue_(str(e))
+            self.templateHint.setTextColor_(NSColor.systemRedColor())
+            return
+        self.templateHint.setStringValue_(TEMPLATE_HINT)
+        self.templateHint.setTextColor_(NSColor.secondaryLabelColor())
+
 class SettingsWindowController(NSWindowController):
     shared = None
 
@@ -96,7 +224,7 @@ class SettingsWindowController(NSWindowController):
 
     def init(self):
         win = NSWindow.alloc().initWithContentRect_styleMask_backing_defer_(
-            NSMakeRect(0, 0, 400, 200), 
+            NSMakeRect(0, 0, 520, 372),
             (NSWindowStyleMaskTitled | NSWindowStyleMaskClosable), 
             NSBackingStoreBuffered, 
             False
@@ -0,0 +1,33 @@
+import os
+
+from cache import FileCache
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_put_and_materialize_do_not_share_the_file(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    src = _write(str(tmp_path / "song.mp3"), b"audio" * 1000)
+    entry = cache.put("k", src, title="Song")
+    assert os.stat(src).st_ino != os.stat(entry.path).st_ino
+    _write(src, b"edited" * 1000)  # the user retags the saved file
+    out = cache.materialize(cache.get("k"), str(tmp_path / "out"))
+    with open(out, "rb") as f:
+        assert f.read() == b"audio" * 1000
+    assert os.stat(out).st_ino != os.stat(entry.path).st_ino
+    cache.close()
+
+
+def test_get_drops_objects_changed_on_disk(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    entry = cache.put("k", _write(str(tmp_path / "a.mp3"), b"x" * 100))
+    assert cache.get("k") is not None
+    _write(entry.path, b"y" * 100)  # same size; the new mtime forces a rehash
+    os.utime(entry.path, ns=(0, os.stat(entry.path).st_mtime_ns + 10**9))
+    assert cache.get("k") is None
+    assert not os.path.exists(entry.path)
+    cache.close()
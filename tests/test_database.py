@@ -0,0 +1,144 @@
+import sqlite3
+
+from database import SCHEMA_VERSION, MediaDB, migrate
+from urls import canonical_id
+
+# The schema MediaDB created before it was versioned (user_version 0)
+BASELINE_SCHEMA = """
+    CREATE TABLE history (
+        id   INTEGER PRIMARY KEY AUTOINCREMENT,
+        file TEXT    NOT NULL,
+        url  TEXT    NOT NULL,
+        ts   INTEGER NOT NULL
+    );
+    CREATE INDEX idx_history_ts ON history(ts);
+"""
+
+
+def _baseline_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO history (file, url, ts) VALUES (?, ?, ?)", [
+        ("Lo-Fi Mix.mp3", "https://www.youtube.com/watch?v=abcdefghijk&feature=share", 1000),
+        ("Talk.mp3", "https://example.com/talk.mp3", 2000),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def _columns(db, table):
+    return {r[1] for r in db.conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_migrates_baseline_db_to_current(tmp_path):
+    path = str(tmp_path / "media.db")
+    _baseline_db(path)
+    db = MediaDB(path)
+    assert db.schema_version == SCHEMA_VERSION == 5
+    assert db.conn.execute("PRAGMA user_version").fetchone()[0] == 5
+    assert {"title", "duration", "bytes", "extractor", "normalization", "timings", "elapsed",
+            "canonical_id"} <= _columns(db, "history")
+    assert [r["file"] for r in db.select_history()] == ["Talk.mp3", "Lo-Fi Mix.mp3"]
+    # Old rows are searchable and get canonical ids from the backfill
+    assert [r["file"] for r in db.search_history("lo fi")] == ["Lo-Fi Mix.mp3"]
+    assert db.find_history(canonical_id("https://youtu.be/abcdefghijk")) is None
+    assert db.backfill_canonical_ids(canonical_id) == 2
+    assert db.find_history(canonical_id("https://youtu.be/abcdefghijk"))["file"] == "Lo-Fi Mix.mp3"
+    db.close()
+
+
+def test_find_history_matches_unindexed_rows_by_url(tmp_path):
+    path = str(tmp_path / "media.db")
+    _baseline_db(path)
+    db = MediaDB(path)
+    key = canonical_id("https://example.com/talk.mp3")
+    assert db.find_history(key) is None
+    assert db.find_history(key, ["https://example.com/talk.mp3"])["file"] == "Talk.mp3"
+    db.backfill_canonical_ids(canonical_id)
+    # Indexed rows only match on their canonical id
+    assert db.find_history("Generic:other", ["https://example.com/talk.mp3"]) is None
+    assert db.find_history(key)["file"] == "Talk.mp3"
+    db.close()
+
+
+def test_new_rows_after_migration(tmp_path):
+    path = str(tmp_path / "media.db")
+    _baseline_db(path)
+    db = MediaDB(path)
+    db.insert_history("New.mp3", "https://example.com/new", 3000, title="New Song",
+                      timings={"download": 1.5}, canonical_id="x")
+    assert [r["file"] for r in db.search_history("song")] == ["New.mp3"]
+    assert db.find_history("x")["title"] == "New Song"
+    db.close()
+
+
+def test_migrate_is_idempotent(tmp_path):
+    path = str(tmp_path / "media.db")
+    _baseline_db(path)
+    MediaDB(path).close()
+    conn = sqlite3.connect(path)
+    assert migrate(conn) == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM history").fetchone()[0] == 2
+    conn.close()
+
+
+def test_updating_canonical_id_leaves_search_index_alone(tmp_path):
+    db = MediaDB(str(tmp_path / "media.db"))
+    db.insert_history("A.mp3", "https://example.com/a", 1000)
+    if db.fts:
+        trigger = db.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'history_au'").fetchone()[0]
+        assert "UPDATE OF file, title, url" in trigger
+    db.backfill_canonical_ids(canonical_id)
+    assert [r["file"] for r in db.search_history("a")] == ["A.mp3"]
+    db.close()
+
+
+class _Logger:
+    def __init__(self):
+        self.errors = []
+
+    def error(self, message):
+        self.errors.append(message)
+
+
+def test_history_writer_saves_the_good_rows_of_a_failed_batch(tmp_path):
+    logger = _Logger()
+    db = MediaDB(str(tmp_path / "media.db"), logger=logger)
+    db.insert_history_async("a.mp3", "https://example.com/a", 1000)
+    db.insert_history_async("b.mp3", None, 2000)  # url is NOT NULL
+    db.insert_history_async("c.mp3", "https://example.com/c", 3000)
+    assert db.flush(5)
+    assert [r["file"] for r in db.select_history()] == ["c.mp3", "a.mp3"]
+    assert len(logger.errors) == 1 and "b.mp3" in logger.errors[0]
+    db.close()
+
+
+def _search_db(tmp_path):
+    db = MediaDB(str(tmp_path / "media.db"))
+    for n, (file, title) in enumerate([
+        ("The Beatles - Help.mp3", "Help!"),
+        ("Lo-Fi Beats to Study.mp3", "lofi beats"),
+        ("Jazz Piano Session.mp3", None),
+        ("Piano Cover.mp3", "Piano cover of a jazz standard"),
+    ]):
+        db.insert_history(file, f"https://example.com/{n}", 1000 + n, title=title)
+    return db
+
+
+def test_search_ranks_by_bm25_inside_fts(tmp_path):
+    db = _search_db(tmp_path)
+    assert [r["file"] for r in db.search_history("lo fi")] == ["Lo-Fi Beats to Study.mp3"]
+    # Rows with all terms come first; jazz is only in the title of the cover, so it ranks second
+    assert [r["file"] for r in db.search_history("jazz piano")] == ["Jazz Piano Session.mp3", "Piano Cover.mp3"]
+    assert len(db.search_history("piano", limit=1)) == 1
+    db.close()
+
+
+def test_search_tolerates_typos(tmp_path):
+    db = _search_db(tmp_path)
+    if not db.trigram:
+        return  # SQLite without the trigram tokenizer
+    assert [r["file"] for r in db.search_history("beatels")][0] == "The Beatles - Help.mp3"
+    assert {r["file"] for r in db.search_history("jaz pianno")} == {"Jazz Piano Session.mp3", "Piano Cover.mp3"}
+    assert db.search_history("qqqqzzzz") == []
+    db.close()
@@ -0,0 +1,102 @@
+import functools
+import http.server
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+
+import pytest
+import yt_dlp
+
+from downloader import Downloader
+from events import ProgressEvent
+from logs import LogPipeline
+from models import Normalization
+from transcoder import find_ffmpeg
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    downloader = Downloader(LogPipeline(), cache_dir=str(tmp_path / "cache"))
+    yield downloader
+    downloader.close()
+
+
+@pytest.fixture
+def site(tmp_path):
+    """A local web server with one direct link, tone.mp3; yields its base URL."""
+    root = tmp_path / "site"
+    root.mkdir()
+    subprocess.run([find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', 'sine=frequency=440:duration=30', str(root / "tone.mp3")], check=True)
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(root))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_failed_extraction_reports_yt_dlp_error(downloader):
+    url = f"http://127.0.0.1:{_closed_port()}/a.mp3"
+    [result] = downloader.download_batch([url], Normalization.OFF.value)
+    assert not result.ok
+    assert "Connection refused" in result.error
+    with pytest.raises(yt_dlp.utils.DownloadError, match="Connection refused"):
+        downloader.probe(url)
+
+
+def test_download_caches_the_size_probe_would_have_found(downloader, site, tmp_path):
+    url = f"{site}/tone.mp3"
+    [result] = downloader.download_batch([url], Normalization.OFF.value, output_dir=str(tmp_path / "out"))
+    assert result.ok, result.error
+    probe = downloader.probe(url, normalization=Normalization.OFF.value)
+    assert probe.cached
+    assert probe.size == os.path.getsize(tmp_path / "site" / "tone.mp3")
+
+
+def test_cancel_is_seen_between_cached_entries(downloader, site, tmp_path):
+    url = f"{site}/tone.mp3"
+    out = str(tmp_path / "out")
+    assert downloader.download_batch([url], Normalization.OFF.value, output_dir=out)[0].ok
+    cancel = threading.Event()
+    served = []
+
+    def on_result(result):
+        served.append(result)
+        cancel.set()
+
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        downloader.download_batch([url, url], Normalization.OFF.value, on_result=on_result,
+                                  cancel_event=cancel, output_dir=out)
+    assert len(served) == 1
+
+
+def test_download_removes_its_temp_dir_when_there_is_no_file(downloader, site, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+    os.makedirs(tempfile.tempdir)
+    cancel = threading.Event()
+
+    def on_progress(event):
+        cancel.set()
+
+    # Cancelled after the first streamed chunk, with ffmpeg already writing the output
+    downloader.events.subscribe(on_progress, ProgressEvent)
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        downloader.download(f"{site}/tone.mp3", Normalization.OFF.value, cancel_event=cancel)
+    with pytest.raises(yt_dlp.utils.DownloadError):
+        downloader.download(f"http://127.0.0.1:{_closed_port()}/a.mp3", Normalization.OFF.value)
+    assert os.listdir(tempfile.tempdir) == []
+    # A file that was produced stays until the caller moves it out
+    downloader.events.unsubscribe(on_progress)
+    cancel.clear()
+    path = downloader.download(f"{site}/tone.mp3", Normalization.OFF.value)
+    downloader.move_file(path, str(tmp_path / "tone.mp3"))
+    assert os.listdir(tempfile.tempdir) == []
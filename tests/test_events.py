@@ -0,0 +1,75 @@
+import logging
+import time
+
+from events import EventBus, ProgressEvent, ResultEvent, StageEvent, ThroughputMetrics
+
+
+def _progress(ts, downloaded, job=1, total=None, status="downloading", extractor="Site", index=0):
+    event = ProgressEvent(job, "https://example.com/a", index, extractor, status=status,
+                          downloaded_bytes=downloaded, total_bytes=total)
+    event.ts = ts
+    return event
+
+
+def test_rates_per_job_extractor_and_globally():
+    metrics = ThroughputMetrics(window=5.0)
+    start = time.monotonic() - 3
+    for ts, downloaded in ((start, 0), (start + 1, 1000), (start + 2, 3000)):
+        metrics.record(_progress(ts, downloaded, total=6000))
+    # yt-dlp counts from zero again for the next file of the same entry
+    metrics.record(_progress(start + 3, 1000, total=6000))
+    assert metrics.bytes_per_sec(1) == 4000 / 3
+    assert metrics.extractor_bytes_per_sec("Site") == 4000 / 3
+    assert metrics.extractor_bytes_per_sec("Other") is None
+    assert 4000 / 4 <= metrics.bytes_per_sec() <= 4000 / 3
+    assert metrics.fraction() == 1000 / 6000
+    metrics.record(StageEvent(1, "https://example.com/a", stage="encode", state="finished", elapsed=2.0))
+    metrics.record(StageEvent(1, "https://example.com/a", stage="encode", state="finished", elapsed=4.0))
+    assert metrics.snapshot()["stages"]["encode"] == {"count": 2, "seconds": 6.0, "mean": 3.0}
+
+
+def test_old_samples_leave_the_global_window():
+    metrics = ThroughputMetrics(window=5.0)
+    start = time.monotonic() - 60
+    metrics.record(_progress(start, 0))
+    metrics.record(_progress(start + 1, 5000))
+    assert metrics.bytes_per_sec() is None
+    assert metrics.bytes_per_sec(1) == 5000
+
+
+def test_forget_drops_a_job_and_its_entries_in_flight():
+    metrics = ThroughputMetrics()
+    now = time.monotonic()
+    metrics.record(_progress(now - 1, 0, job=1, total=100))
+    metrics.record(_progress(now, 50, job=1, total=100))
+    metrics.record(_progress(now, 10, job=2, total=100))
+    assert metrics.fraction() == 60 / 200
+    metrics.forget(1)
+    assert metrics.bytes_per_sec(1) is None and 1 not in metrics.snapshot()["jobs"]
+    assert metrics.fraction() == 10 / 100
+    # A finished entry no longer counts as in flight
+    metrics.record(ResultEvent(2, "https://example.com/a", 0))
+    assert metrics.fraction() is None
+
+
+def test_old_jobs_are_pushed_out():
+    metrics = ThroughputMetrics(max_jobs=2)
+    for job in (1, 2, 3):
+        metrics.record(_progress(time.monotonic(), 10, job=job))
+    assert sorted(metrics.snapshot()["jobs"]) == [2, 3]
+
+
+def test_failing_subscriber_is_logged_and_others_still_run(caplog):
+    bus = EventBus()
+    seen = []
+
+    def broken(event):
+        raise RuntimeError("subscriber bug")
+
+    bus.subscribe(broken)
+    bus.subscribe(seen.append, ProgressEvent)
+    with caplog.at_level(logging.DEBUG, logger="events"):
+        bus.publish(_progress(time.monotonic(), 10))
+        bus.publish(StageEvent(1, "https://example.com/a", stage="encode"))
+    assert len(seen) == 1
+    assert len(caplog.records) == 2 and caplog.records[0].exc_info[0] is RuntimeError
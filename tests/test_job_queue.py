@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from job_queue import JobCancelled, JobQueue, JobState
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def test_higher_priority_runs_first_and_ties_keep_submission_order(queue):
+    release = threading.Event()
+    blocker = queue.submit(lambda job: release.wait(5))
+    _wait_for(lambda: blocker.state is JobState.RUNNING)
+    order = []
+    jobs = [queue.submit(lambda job, name: order.append(name), name, priority=priority)
+            for name, priority in (("low", 0), ("high", 5), ("mid", 1), ("high too", 5))]
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+    assert order == ["high", "high too", "mid", "low"]
+
+
+def test_cancelling_a_pending_job_skips_it(queue):
+    release = threading.Event()
+    queue.submit(lambda job: release.wait(5))
+    ran = []
+    job = queue.submit(lambda job: ran.append(job.id))
+    assert queue.cancel(job.id)
+    release.set()
+    assert job.wait(5)
+    assert job.state is JobState.CANCELLED and ran == []
+    assert not job.cancel()  # already finished
+
+
+def test_cancelling_a_running_job_is_seen_by_its_target(queue):
+    def target(job):
+        if job.cancel_event.wait(5):
+            raise JobCancelled()
+
+    job = queue.submit(target)
+    _wait_for(lambda: job.state is JobState.RUNNING)
+    assert queue.cancel(job.id)
+    assert job.wait(5)
+    assert job.state is JobState.CANCELLED
+
+
+def test_set_max_workers_grows_and_shrinks_the_pool(queue):
+    release = threading.Event()
+    running = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def target(job):
+        with lock:
+            running.append(job.id)
+            peak[0] = max(peak[0], len(running))
+        release.wait(5)
+        with lock:
+            running.remove(job.id)
+
+    jobs = [queue.submit(target) for _ in range(3)]
+    _wait_for(lambda: queue.active_count() == 1)
+    queue.set_max_workers(3)
+    _wait_for(lambda: queue.active_count() == 3)
+    queue.set_max_workers(1)
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+
+    # The surplus workers exit once idle: one job at a time again
+    release.clear()
+    peak[0] = 0
+    jobs = [queue.submit(target) for _ in range(3)]
+    _wait_for(lambda: queue.active_count() == 1)
+    time.sleep(0.05)
+    assert queue.active_count() == 1 and queue.pending_count() == 2
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+    assert peak[0] == 1
+
+
+def test_on_queued_runs_before_the_job_can_start(queue):
+    seen = []
+
+    def on_queued(job):
+        time.sleep(0.05)  # a free worker would have started the job by now
+        seen.append(job.state)
+
+    job = queue.submit(lambda job: None, on_queued=on_queued)
+    assert job.wait(5)
+    assert seen == [JobState.PENDING] and job.state is JobState.DONE
+
+
+def test_failing_on_done_is_logged(queue, caplog):
+    def on_done(job):
+        raise ValueError("boom")
+
+    with caplog.at_level(logging.ERROR, logger="job_queue"):
+        job = queue.submit(lambda job: None, on_done=on_done)
+        assert job.wait(5)
+        _wait_for(lambda: caplog.records)
+    assert f"job {job.id}" in caplog.records[0].getMessage()
+    assert caplog.records[0].exc_info[0] is ValueError
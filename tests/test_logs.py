@@ -0,0 +1,60 @@
+from logs import LogPipeline
+
+
+class _View:
+    """What a consumer (NSTextStorage) shows after applying every delta, counted in UTF-16 units."""
+
+    def __init__(self):
+        self.text = ""
+        self.deltas = []
+
+    def __call__(self, delta):
+        self.deltas.append(delta)
+        data = b"" if delta.reset else self.text.encode("utf-16-le")
+        self.text = data[2 * delta.dropped:].decode("utf-16-le") + delta.text
+
+
+def _pipeline(capacity):
+    # One frame per 100 s, so only the test's flush() calls deliver
+    pipeline = LogPipeline(capacity=capacity, fps=0.01)
+    pipeline.flush()
+    view = _View()
+    pipeline.subscribe(view)
+    return pipeline, view
+
+
+def test_deltas_drop_exactly_what_fell_out_of_the_ring():
+    pipeline, view = _pipeline(capacity=3)
+    pipeline.write("🎵 first")  # two UTF-16 units for the emoji
+    pipeline.write("second")
+    pipeline.flush()
+    assert view.text == "🎵 first\nsecond\n"
+    for i in range(5):
+        pipeline.write(f"line {i}")
+    pipeline.flush()
+    # More new lines than the ring holds: everything old goes, only the newest three arrive
+    assert view.deltas[-1].dropped == len("🎵 first\nsecond\n") + 1
+    assert view.text == pipeline.text() == "line 2\nline 3\nline 4\n"
+    pipeline.write("line 5")
+    pipeline.flush()
+    assert view.deltas[-1].dropped == len("line 2\n")
+    assert view.text == pipeline.text() == "line 3\nline 4\nline 5\n"
+    pipeline.close()
+
+
+def test_progress_lines_coalesce_per_channel_within_a_frame():
+    pipeline, view = _pipeline(capacity=100)
+    for pct in (10, 20, 30):
+        pipeline.write(f"[download]  {pct}.0% of 1.00MiB", "a")
+        pipeline.write(f"[download]  {pct + 1}.0% of 2.00MiB", "b")
+    pipeline.write("[INFO] done", "a")
+    pipeline.write("[download]  40.0% of 1.00MiB", "a")
+    pipeline.flush()
+    assert view.text.splitlines() == ["[download]  30.0% of 1.00MiB", "[download]  31.0% of 2.00MiB",
+                                      "[INFO] done", "[download]  40.0% of 1.00MiB"]
+    assert pipeline.tail("b") == ["[download]  31.0% of 2.00MiB"]
+    pipeline.reset()
+    pipeline.write("again")
+    pipeline.flush()
+    assert view.deltas[-1].reset and view.text == "again\n"
+    pipeline.close()
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from database import MediaDB
+from models import HistoryFormatter, HistoryModel
+
+NOW = 1_700_000_000
+DAY = 24 * 60 * 60
+
+
+def _rows(ages, now=NOW):
+    return [{"id": n, "file": f"f{n}", "ts": now - age} for n, age in enumerate(sorted(ages))]
+
+
+# --- HistoryFormatter ---
+@pytest.mark.parametrize("age, label", [
+    (0, "Last 24 hours"),
+    (DAY - 1, "Last 24 hours"),
+    (DAY, "Last 7 days"),
+    (7 * DAY - 1, "Last 7 days"),
+    (7 * DAY, "Last 30 days"),
+    (30 * DAY, "Last 365 days"),
+    (365 * DAY - 1, "Last 365 days"),
+    (365 * DAY, "Long time ago"),
+    (-60, "Last 24 hours"),  # clock skew: from the future
+])
+def test_label_boundaries(age, label):
+    assert HistoryFormatter(NOW).label(NOW - age) == label
+
+
+def test_bucket_bounds_match_label_per_row():
+    rng = random.Random(13)
+    ages = [rng.choice([0, DAY - 1, DAY, 7 * DAY, 30 * DAY, 365 * DAY]) + rng.randrange(3) for _ in range(300)]
+    rows = _rows(ages)
+    formatter = HistoryFormatter()
+    bounds = formatter.bucket_bounds(rows, NOW)
+    assert [start for _, start, _ in bounds][0] == 0 and bounds[-1][2] == len(rows)
+    for label, start, end in bounds:
+        assert start < end
+        assert {formatter.label(r["ts"], NOW) for r in rows[start:end]} == {label}
+
+
+def test_format_page_continues_the_previous_group():
+    rows = _rows([10, 20, 2 * DAY, 3 * DAY])
+    formatter = HistoryFormatter(NOW)
+    whole = formatter.format(rows)
+    first, last_group = formatter.format_page(rows[:3])
+    second, _ = formatter.format_page(rows[3:], last_group)
+    assert [(i.title, i.isGroup) for i in first + second] == [(i.title, i.isGroup) for i in whole]
+    assert [i.title for i in whole if i.isGroup] == ["Last 24 hours", "Last 7 days"]
+
+
+def test_clock_is_read_per_call():
+    formatter = HistoryFormatter()
+    ts = NOW - 10
+    assert formatter.label(ts, NOW) == "Last 24 hours"
+    assert formatter.label(ts, NOW + 2 * DAY) == "Last 7 days"
+
+
+# --- HistoryModel ---
+def _snapshot(model):
+    return [(item.isGroup, item.title) for item in (model.item(row) for row in range(len(model)))]
+
+
+def _apply(rows, diff, model):
+    """Replay `diff` on the table rows the way NSTableView would, fetching inserted rows from `model`."""
+    rows = list(rows)
+    for row in reversed(diff.removed):
+        del rows[row]
+    for row in diff.inserted:
+        item = model.item(row)
+        rows.insert(row, (item.isGroup, item.title))
+    return rows
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_model_diffs_replay_to_a_fresh_reload(tmp_path, seed):
+    rng = random.Random(seed)
+    db = MediaDB(str(tmp_path / "media.db"))
+    ages = [rng.choice([60, 2 * DAY, 10 * DAY, 100 * DAY, 400 * DAY]) + rng.randrange(DAY) for _ in range(120)]
+    for n, age in enumerate(ages):
+        db.insert_history(f"stored-{n}", "u", NOW - age)
+    model = HistoryModel(db, page_size=16, max_pages=3)
+    model.reload(NOW)
+    shown = _snapshot(model)
+    now = NOW
+    for step in range(60):
+        op = rng.random()
+        if op < 0.35:
+            title = f"recent-{step}"
+            db.insert_history(title, "u", now)
+            diff = model.insert_recent(title, now)
+        elif op < 0.7:
+            entries = [row for row in range(len(model)) if not model.is_group(row)]
+            if not entries:
+                continue
+            diff = model.remove(rng.choice(entries))
+        else:
+            now += rng.choice([1, 15 * 60, DAY, 6 * DAY, 40 * DAY])
+            diff = model.refresh(now)
+        shown = _apply(shown, diff, model)
+        assert shown == _snapshot(model), (step, diff)
+        fresh = HistoryModel(db)
+        fresh.reload(model.now)
+        assert [g for g, t in shown] == [g for g, t in _snapshot(fresh)]
+        assert sorted(t for g, t in shown if not g) == sorted(t for g, t in _snapshot(fresh) if not g)
+        assert [t for g, t in shown if g] == [t for g, t in _snapshot(fresh) if g]
+    db.close()
+
+
+def test_model_pages_stay_bounded(tmp_path):
+    db = MediaDB(str(tmp_path / "media.db"))
+    for n in range(500):
+        db.insert_history(f"f{n}", "u", NOW - n * 3600)
+    model = HistoryModel(db, page_size=20, max_pages=4)
+    model.reload(NOW)
+    assert len(model) == 500 + 4  # "Just now" through "Last 30 days"
+    titles = [model.item(row).title for row in range(len(model)) if not model.is_group(row)]
+    assert titles == [f"f{n}" for n in range(500)]
+    assert len(model._pages) <= 4
+    db.close()
@@ -0,0 +1,35 @@
+import os
+import stat
+import time
+
+from naming import STAGING_PREFIX, publish, render_name, staging_path, sweep_staging
+
+
+def test_staging_file_gets_the_umask_permissions(tmp_path):
+    old = os.umask(0o027)
+    try:
+        path = staging_path(str(tmp_path), ".opus")
+    finally:
+        os.umask(old)
+    name = os.path.basename(path)
+    assert name.startswith(STAGING_PREFIX) and name.endswith(".part.opus")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+def test_sweep_removes_only_stale_staging_files(tmp_path):
+    stale, fresh = staging_path(str(tmp_path)), staging_path(str(tmp_path))
+    old = time.time() - 2 * 3600
+    os.utime(stale, (old, old))
+    kept = tmp_path / "song.mp3"
+    kept.write_bytes(b"x")
+    os.utime(kept, (old, old))
+    assert sweep_staging(str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(fresh), "song.mp3"])
+
+
+def test_publish_takes_the_next_free_name(tmp_path):
+    first = publish(staging_path(str(tmp_path)), str(tmp_path), render_name("{uploader}/{title}", {"title": "a/b"}))
+    second = publish(staging_path(str(tmp_path)), str(tmp_path), render_name("{uploader}/{title}", {"title": "a/b"}))
+    assert first == str(tmp_path / "Unknown" / "a-b.mp3")
+    assert second == str(tmp_path / "Unknown" / "a-b (2).mp3")
+    assert [n for n in os.listdir(tmp_path) if n.startswith(STAGING_PREFIX)] == []
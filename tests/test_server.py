@@ -0,0 +1,132 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue
+from logs import LogPipeline
+from server import ApiServer, JobRegistry
+from service import ExtractionService
+
+TOKEN = "test-token"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def api(tmp_path):
+    service = ExtractionService(str(tmp_path / "data"), str(tmp_path / "out"), LogPipeline(), workers=1)
+    server = ApiServer(service, port=_free_port(), token=TOKEN)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    serving = asyncio.run_coroutine_threadsafe(server.serve(), loop)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", server.port), timeout=1).close()
+            break
+        except OSError:
+            assert time.monotonic() < deadline, "server did not start"
+            time.sleep(0.05)
+    yield server
+    serving.cancel()
+    asyncio.run_coroutine_threadsafe(_cancel_tasks(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    service.close()
+
+
+async def _cancel_tasks():
+    # Connection handlers still waiting on keep-alive or event-stream clients
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _request(server, method, path, body=None, headers=None, token=TOKEN):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    headers = dict(headers or {})
+    if token is not None:
+        headers.setdefault("Authorization", f"Bearer {token}")
+    if body is not None:
+        headers.setdefault("Content-Type", "application/json")
+        body = json.dumps(body)
+    conn.request(method, path, body, headers)
+    response = conn.getresponse()
+    payload = json.loads(response.read())
+    conn.close()
+    return response.status, payload
+
+
+def test_requests_need_the_token(api):
+    assert _request(api, "GET", "/jobs", token=None)[0] == 401
+    assert _request(api, "GET", "/jobs", token="wrong")[0] == 401
+    assert _request(api, "GET", "/jobs", headers={"Authorization": "Bearer é"}, token=None)[0] == 401
+    assert _request(api, "GET", "/jobs") == (200, {"jobs": []})
+    assert _request(api, "GET", f"/jobs?token={TOKEN}", token=None)[0] == 200
+
+
+def test_other_hosts_and_origins_are_rejected(api):
+    assert _request(api, "GET", "/jobs", headers={"Host": "evil.example"})[0] == 403
+    assert _request(api, "GET", "/jobs", headers={"Host": f"localhost:{api.port}",
+                                                  "Origin": "http://evil.example"})[0] == 403
+    assert _request(api, "GET", "/jobs", headers={"Host": f"localhost:{api.port}",
+                                                  "Origin": f"http://127.0.0.1:{api.port}"})[0] == 200
+    assert _request(api, "POST", "/jobs", {"url": "https://example.com/a.mp3"},
+                    headers={"Content-Type": "text/plain"})[0] == 415
+
+
+def test_a_finished_job_reaches_the_event_stream(api):
+    conn = http.client.HTTPConnection("127.0.0.1", api.port, timeout=10)
+    conn.request("GET", f"/events?token={TOKEN}")
+    stream = conn.getresponse()
+    deadline = time.monotonic() + 5
+    while api.hub.client_count == 0:
+        assert time.monotonic() < deadline, "event stream not attached"
+        time.sleep(0.01)
+    # Nothing listens on this port, so the job fails as soon as it starts
+    status, payload = _request(api, "POST", "/jobs", {"url": f"http://127.0.0.1:{_free_port()}/a.mp3"})
+    assert status == 202
+    job_id = payload["jobs"][0]["id"]
+    event = None
+    while event is None:
+        line = stream.readline().decode()
+        assert line, "event stream closed"
+        if line.startswith("data: "):
+            data = json.loads(line[6:])
+            if data["kind"] == "job":
+                event = data
+    conn.close()
+    assert (event["job"], event["state"]) == (job_id, "failed")
+    assert _request(api, "GET", f"/jobs/{job_id}")[1]["state"] == "failed"
+    assert api.jobs._finished == 1
+
+
+def test_registry_evicts_the_oldest_finished_jobs():
+    queue = JobQueue(max_workers=2)
+    release = threading.Event()
+    registry = JobRegistry(max_finished=2)
+    running = queue.submit(lambda job: release.wait(10))
+    registry.add(running, "https://example.com/running", "high")
+    done = []
+    for i in range(3):
+        job = queue.submit(lambda job: None)
+        registry.add(job, f"https://example.com/{i}", "high")
+        done.append(job)
+    for job in done:
+        job.wait(10)
+        registry.finished(job)
+    assert [j["id"] for j in registry.list()] == [running.id, done[1].id, done[2].id]
+    release.set()
+    queue.shutdown()
@@ -0,0 +1,24 @@
+import threading
+
+from logs import LogPipeline
+from service import ExtractionService
+
+
+def _service(tmp_path, **kwargs):
+    return ExtractionService(str(tmp_path / "data"), str(tmp_path / "out"), LogPipeline(), workers=1, **kwargs)
+
+
+def test_duplicate_of_does_not_wait_for_the_backfill(tmp_path, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(ExtractionService, "_backfill", lambda self: release.wait(10) and self._backfilled.set())
+    # A history row from before canonical ids were recorded
+    service = _service(tmp_path)
+    service.db.insert_history("Talk.mp3", "https://example.com/talk.mp3?utm_source=x", 1000)
+    service.db.conn.execute("UPDATE history SET canonical_id = NULL")
+    service.db.conn.commit()
+    try:
+        assert service.duplicate_of("https://example.com/talk.mp3?utm_source=x")["file"] == "Talk.mp3"
+        assert service.duplicate_of("https://example.com/other.mp3") is None
+    finally:
+        release.set()
+        service.close()
@@ -0,0 +1,60 @@
+import pytest
+
+from session_pool import YoutubeDLPool
+
+PARAMS = ("ignoreerrors", "logger", "concurrent_fragment_downloads")
+
+
+class _Logger:
+    def debug(self, msg): pass
+    def info(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): pass
+
+
+JOB_LOGGER, STEP_LOGGER = _Logger(), _Logger()
+
+
+def _params(session):
+    return {name: session.ydl.params.get(name, "missing") for name in PARAMS}
+
+
+@pytest.fixture
+def pool():
+    pool = YoutubeDLPool()
+    yield pool
+    pool.close()
+
+
+def _opts():
+    return {"logger": JOB_LOGGER, "concurrent_fragment_downloads": 2, "quiet": True}
+
+
+def test_override_restores_the_job_params_and_release_the_originals(pool):
+    with pool.session("k", _opts) as session:
+        original = _params(session)
+        session.bind(ignoreerrors=True)
+        bound = _params(session)
+        with session.override(ignoreerrors=False, logger=STEP_LOGGER, concurrent_fragment_downloads=8):
+            assert _params(session) == {"ignoreerrors": False, "logger": STEP_LOGGER,
+                                        "concurrent_fragment_downloads": 8}
+        assert _params(session) == bound
+        with pytest.raises(ValueError):
+            with session.override(ignoreerrors=False, logger=STEP_LOGGER, concurrent_fragment_downloads=8):
+                raise ValueError("download failed")
+        assert _params(session) == bound == dict(original, ignoreerrors=True)
+    with pool.session("k", _opts) as reused:
+        assert reused is session and pool.stats()["reused"] == 1
+        assert _params(reused) == original == {"ignoreerrors": "missing", "logger": JOB_LOGGER,
+                                               "concurrent_fragment_downloads": 2}
+
+
+def test_session_failing_inside_override_is_not_reused(pool):
+    with pytest.raises(ValueError):
+        with pool.session("k", _opts) as session:
+            session.bind(ignoreerrors=True)
+            with session.override(ignoreerrors=False, logger=STEP_LOGGER):
+                raise ValueError("download failed")
+    assert _params(session) == {"ignoreerrors": "missing", "logger": JOB_LOGGER, "concurrent_fragment_downloads": 2}
+    with pool.session("k", _opts) as fresh:
+        assert fresh is not session and pool.stats()["created"] == 2
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench import STARTUP_FORBIDDEN
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for PyObjC so the UI modules import anywhere: any Cocoa name is a
+# subclassable class or a callable that returns more of the same.
+COCOA_STUB = """
+import sys, types
+
+class _Any:
+    def __init__(self, *args, **kwargs): pass
+    def __call__(self, *args, **kwargs): return _Any()
+    def __getattr__(self, name): return _Any()
+    def __or__(self, other): return self
+    __ror__ = __or__
+
+class _Class:
+    def __init_subclass__(cls, **kwargs): pass
+    @classmethod
+    def alloc(cls): return _Any()
+
+_names = {}
+
+def _lookup(name):
+    if name not in _names:
+        _names[name] = type(name, (_Class,), {}) if name[:2] in ("NS", "UN") else _Any()
+    return _names[name]
+
+for module in ("Cocoa", "AppKit", "Foundation", "UserNotifications", "objc", "PyObjCTools"):
+    stub = types.ModuleType(module)
+    stub.__getattr__ = _lookup
+    sys.modules[module] = stub
+"""
+
+UI_MODULES = ("app", "menu", "settings", "notifications", "user_defaults")
+
+
+def test_ui_modules_leave_the_engine_unimported():
+    code = COCOA_STUB + f"""
+import json
+for module in {UI_MODULES!r}:
+    __import__(module)
+print(json.dumps(sorted(name for name in {STARTUP_FORBIDDEN!r} if name in sys.modules)))
+"""
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert json.loads(proc.stdout.splitlines()[-1]) == []
@@ -0,0 +1,55 @@
+import re
+import subprocess
+
+import pytest
+
+from formats import FORMATS, OUTPUT_CODECS
+from models import Normalization
+from transcoder import LOUDNORM_SAMPLE_RATE, LoudnormStatsCache, Transcoder, find_ffmpeg
+
+_SAMPLE_RATE = re.compile(rb'Audio: .*?, (\d+) Hz')
+
+
+@pytest.fixture(scope="module")
+def ffmpeg():
+    pytest.importorskip("imageio_ffmpeg")
+    return find_ffmpeg()
+
+
+@pytest.fixture(scope="module")
+def source(ffmpeg, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("src") / "tone.wav")
+    subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', 'sine=frequency=440:sample_rate=44100:duration=2', path], check=True)
+    return path
+
+
+def _sample_rate(ffmpeg, path):
+    proc = subprocess.run([ffmpeg, '-hide_banner', '-i', path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return int(_SAMPLE_RATE.search(proc.stderr).group(1))
+
+
+def _chunks(path, size=8192):
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+@pytest.mark.parametrize("codec", OUTPUT_CODECS)
+def test_normalized_file_output_is_resampled(ffmpeg, source, tmp_path, codec):
+    output = FORMATS[codec]
+    dest = str(tmp_path / ("out" + output.ext))
+    Transcoder(ffmpeg).normalize(source, dest, Normalization.HIGH.value, output=output)
+    assert _sample_rate(ffmpeg, dest) == LOUDNORM_SAMPLE_RATE
+
+
+@pytest.mark.parametrize("codec", OUTPUT_CODECS)
+def test_normalized_stream_output_is_resampled(ffmpeg, source, tmp_path, codec):
+    output = FORMATS[codec]
+    transcoder = Transcoder(ffmpeg, LoudnormStatsCache())
+    # First run is single-pass loudnorm and caches the stats, the second applies them
+    for name in ("single", "two-pass"):
+        dest = str(tmp_path / (name + output.ext))
+        transcoder.encode_stream(_chunks(source), dest, Normalization.HIGH.value, source_key="tone", output=output)
+        assert _sample_rate(ffmpeg, dest) == LOUDNORM_SAMPLE_RATE
+    assert transcoder.stats_cache.get("tone", Normalization.HIGH.value) is not None
@@ -0,0 +1,288 @@
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from formats import COPY_ARGS, FORMATS, OutputFormat
+from models import Normalization
+
+# EBU R128 targets per normalization profile: integrated loudness, true peak, loudness range
+LOUDNORM_TARGETS: Dict[str, Tuple[float, float, float]] = {
+    Normalization.LOW.value: (-16.0, -1.5, 11.0),
+    Normalization.MEDIUM.value: (-14.0, -1.0, 7.0),
+    Normalization.HIGH.value: (-13.0, -1.0, 6.0),
+}
+
+# loudnorm upsamples to 192 kHz internally and leaves its output there; every
+# output codec takes 48 kHz, which is also what opus runs at natively
+LOUDNORM_SAMPLE_RATE = 48000
+
+_ffmpeg_path: Optional[str] = None
+
+_LOUDNORM_JSON = re.compile(r'\{[^{}]*"input_i"[^{}]*\}', re.S)
+_AUDIO_STREAM = re.compile(rb'Stream #\d+:\d+.*?: Audio: (\w+)')
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def find_ffmpeg(cache_path: Optional[str] = None) -> str:
+    """
+    Path of the ffmpeg binary. imageio_ffmpeg's lookup imports the package and runs
+    `ffmpeg -version`, so the answer is memoized per process and, with `cache_path`,
+    kept in a small JSON file for the next launch (re-resolved if the binary moved).
+    """
+    global _ffmpeg_path
+    if _ffmpeg_path and os.access(_ffmpeg_path, os.X_OK):
+        return _ffmpeg_path
+    # Set by the app bundle to its own copy; nothing to look up then
+    path = os.environ.get("IMAGEIO_FFMPEG_EXE")
+    if not path and cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                path = json.load(f).get("path")
+        except (OSError, ValueError, AttributeError):
+            path = None
+    if not path or not os.access(path, os.X_OK):
+        import imageio_ffmpeg
+        path = imageio_ffmpeg.get_ffmpeg_exe()
+        if cache_path:
+            try:
+                with open(cache_path, "w", encoding="utf-8") as f:
+                    json.dump({"path": path}, f)
+            except OSError:
+                pass
+    _ffmpeg_path = path
+    return path
+
+
+class StageTimer:
+    """
+    Wall-clock time per pipeline stage, e.g. download / measure / encode.
+    `listener(name, "started"|"finished", elapsed)` is told about every stage as it runs.
+    """
+
+    def __init__(self, listener: Optional[Callable[[str, str, Optional[float]], None]] = None) -> None:
+        self.stages: Dict[str, float] = {}
+        self.listener = listener
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.listener is not None:
+            self.listener(name, "started", None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if self.listener is not None:
+                self.listener(name, "finished", elapsed)
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+
+    def summary(self) -> str:
+        parts = [f"{name} {secs:.2f}s" for name, secs in self.stages.items()]
+        return ", ".join(parts) + f" (total {self.total:.2f}s)"
+
+
+class LoudnormStatsCache:
+    """
+    Measured loudnorm stats per source (first pass output), so a source is only analysed once.
+    Persisted as JSON when `path` is given, otherwise kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, str]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+
+    @staticmethod
+    def _key(source_key: str, normalization: str) -> str:
+        return f"{normalization}|{source_key}"
+
+    def get(self, source_key: str, normalization: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            return self._data.get(self._key(source_key, normalization))
+
+    def put(self, source_key: str, normalization: str, stats: Dict[str, str]) -> None:
+        with self._lock:
+            self._data[self._key(source_key, normalization)] = stats
+            if self.path:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f)
+                os.replace(tmp, self.path)
+
+
+class Transcoder:
+    """
+    ffmpeg stage turning a downloaded audio stream into a loudness-normalized file
+    in one of the formats of formats.py (MP3 by default).
+
+    - `normalize` runs true two-pass loudnorm on a file (measure, then linear
+      correction), skipping the first pass when stats for the source are cached.
+    - `encode_stream` feeds bytes to ffmpeg's stdin while they are still being
+      downloaded. With cached stats it applies the two-pass correction in that
+      single run; otherwise it falls back to single-pass loudnorm and measures
+      the source in the same process so the next run can use two-pass values.
+
+    With Normalization.OFF there is no loudness pass: both just encode, or
+    with `copy=True` remux the source's audio without decoding it.
+    """
+
+    def __init__(self, ffmpeg_path: str, stats_cache: Optional[LoudnormStatsCache] = None, logger=None) -> None:
+        self.ffmpeg_path = ffmpeg_path
+        self.stats_cache = stats_cache if stats_cache is not None else LoudnormStatsCache()
+        self.logger = logger
+
+    # --- filters ---
+    @staticmethod
+    def _targets(normalization: str) -> str:
+        i, tp, lra = LOUDNORM_TARGETS[normalization]
+        return f"I={i}:TP={tp}:LRA={lra}"
+
+    def single_pass_filter(self, normalization: str) -> str:
+        return f"loudnorm={self._targets(normalization)}"
+
+    def measure_filter(self, normalization: str) -> str:
+        return f"loudnorm={self._targets(normalization)}:print_format=json"
+
+    def two_pass_filter(self, normalization: str, measured: Dict[str, str]) -> str:
+        return (f"loudnorm={self._targets(normalization)}"
+                f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+                f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+                f":offset={measured['target_offset']}:linear=true")
+
+    # --- file mode ---
+    def measure(self, src: str, normalization: str) -> Dict[str, str]:
+        """First loudnorm pass: analyse `src` and return ffmpeg's measured stats."""
+
+        cmd = [self.ffmpeg_path, '-hide_banner', '-nostats', '-i', src, '-vn',
+               '-af', self.measure_filter(normalization), '-f', 'null', '-']
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode != 0:
+            raise TranscodeError(self._tail(proc.stderr))
+        return self._parse_stats(proc.stderr)
+
+    def audio_codec(self, src: str) -> Optional[str]:
+        """ffmpeg's name for the codec of the first audio stream in `src`, e.g. 'opus' or 'aac'."""
+        proc = subprocess.run([self.ffmpeg_path, '-hide_banner', '-i', src],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        match = _AUDIO_STREAM.search(proc.stderr)
+        return match.group(1).decode() if match else None
+
+    @staticmethod
+    def _codec_args(output: Optional[OutputFormat], copy: bool) -> List[str]:
+        return COPY_ARGS if copy else (output or FORMATS["mp3"]).encoder_args
+
+    def encode(self, src: str, dest: str, audio_filter: Optional[str],
+               output: Optional[OutputFormat] = None, copy: bool = False) -> None:
+        filter_args = ['-af', audio_filter, '-ar', str(LOUDNORM_SAMPLE_RATE)] if audio_filter else []
+        cmd = [self.ffmpeg_path, '-hide_banner', '-nostats', '-y', '-i', src, '-vn',
+               *filter_args, *self._codec_args(output, copy), dest]
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode != 0:
+            raise TranscodeError(self._tail(proc.stderr))
+
+    def normalize(self, src: str, dest: str, normalization: str, source_key: Optional[str] = None,
+                  timer: Optional[StageTimer] = None, output: Optional[OutputFormat] = None,
+                  copy: bool = False) -> str:
+        timer = timer or StageTimer()
+        if normalization == Normalization.OFF.value:
+            with timer.stage("remux" if copy else "encode"):
+                self.encode(src, dest, None, output, copy)
+            return dest
+        measured = self.stats_cache.get(source_key, normalization) if source_key else None
+        if measured is None:
+            with timer.stage("measure"):
+                measured = self.measure(src, normalization)
+            if source_key:
+                self.stats_cache.put(source_key, normalization, measured)
+        with timer.stage("encode"):
+            self.encode(src, dest, self.two_pass_filter(normalization, measured), output)
+        return dest
+
+    # --- streaming mode ---
+    def encode_stream(self, chunks: Iterable[bytes], dest: str, normalization: str,
+                      source_key: Optional[str] = None, timer: Optional[StageTimer] = None,
+                      cancel_event: Optional[threading.Event] = None, output: Optional[OutputFormat] = None,
+                      copy: bool = False) -> str:
+        """Encode while `chunks` is still being produced; see the class docstring for the loudnorm strategy."""
+
+        timer = timer or StageTimer()
+        off = normalization == Normalization.OFF.value
+        measured = self.stats_cache.get(source_key, normalization) if source_key and not off else None
+        if off:
+            filter_args = ['-map', '0:a']
+        elif measured is not None:
+            filter_args = ['-af', self.two_pass_filter(normalization, measured), '-map', '0:a',
+                           '-ar', str(LOUDNORM_SAMPLE_RATE)]
+        else:
+            graph = (f"[0:a]asplit=2[enc][ana];"
+                     f"[enc]{self.single_pass_filter(normalization)}[out];"
+                     f"[ana]{self.measure_filter(normalization)},anullsink")
+            filter_args = ['-filter_complex', graph, '-map', '[out]', '-ar', str(LOUDNORM_SAMPLE_RATE)]
+
+        cmd = [self.ffmpeg_path, '-hide_banner', '-nostats', '-y', '-i', 'pipe:0', '-vn',
+               *filter_args, *self._codec_args(output, copy), dest]
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+        # Drain stderr concurrently so ffmpeg never blocks on a full pipe
+        stderr: List[bytes] = []
+        reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+        reader.start()
+
+        try:
+            with timer.stage("stream"):
+                for chunk in chunks:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise TranscodeError("Cancelled")
+                    proc.stdin.write(chunk)
+                proc.stdin.close()
+            with timer.stage("encode tail"):
+                proc.wait()
+        except BrokenPipeError:
+            proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            reader.join()
+
+        log = b"".join(stderr)
+        if proc.returncode != 0:
+            raise TranscodeError(self._tail(log))
+        if measured is None and source_key and not off:
+            try:
+                self.stats_cache.put(source_key, normalization, self._parse_stats(log))
+            except TranscodeError:
+                pass
+        return dest
+
+    # --- helpers ---
+    @staticmethod
+    def _parse_stats(stderr: bytes) -> Dict[str, str]:
+        matches = _LOUDNORM_JSON.findall(stderr.decode("utf-8", "replace"))
+        if not matches:
+            raise TranscodeError("loudnorm did not report measurements")
+        return json.loads(matches[-1])
+
+    @staticmethod
+    def _tail(stderr: bytes, lines: int = 5) -> str:
+        text = stderr.decode("utf-8", "replace").strip().splitlines()
+        return "\n".join(text[-lines:]) or "ffmpeg failed"
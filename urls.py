@@ -0,0 +1,115 @@
+"""
+Offline URL handling: validation, canonical URLs and canonical ids.
+
+A canonical id names the video a URL points at, independent of the URL's
+spelling, e.g. 'Youtube:dQw4w9WgXcQ' for youtu.be links, shorts and
+watch?v= URLs alike. It has the same form as `Downloader.source_id`, so it
+can be looked up in history and in the download cache before anything is
+fetched. yt-dlp is imported lazily, on the first canonical_id call.
+"""
+import functools
+import threading
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from cache import normalize_url
+
+# Query parameters that only say where a link was shared from
+TRACKING_PARAMS = frozenset((
+    "fbclid", "gclid", "dclid", "yclid", "msclkid", "igshid", "igsh", "mc_cid", "mc_eid",
+    "_hsenc", "_hsmi", "ref_src",
+))
+_YOUTUBE_TRACKING_PARAMS = frozenset(("feature", "pp"))
+_YOUTUBE_HOSTS = frozenset(("youtube.com", "m.youtube.com", "music.youtube.com", "www.youtube.com"))
+# Share-tracking names that other sites use for real parameters, so only dropped on these hosts
+_SHARE_TRACKING_PARAMS = frozenset(("si", "ref_url"))
+_SHARE_TRACKING_HOSTS = _YOUTUBE_HOSTS | {"youtu.be", "spotify.com", "open.spotify.com", "play.spotify.com"}
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+_extractors = None
+_extractors_lock = threading.Lock()
+
+
+def validate_url(text: str) -> str:
+    """Return the trimmed URL, or raise ValueError saying why it can't be downloaded."""
+    url = text.strip()
+    if not url or any(c.isspace() for c in url):
+        raise ValueError("Please enter a single URL.")
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in ("http", "https"):
+        raise ValueError("Only http:// and https:// URLs are supported.")
+    if not parts.hostname or "." not in parts.hostname.strip("."):
+        raise ValueError(f"{url} has no valid host name.")
+    return url
+
+
+def canonical_url(url: str) -> str:
+    """
+    `url` without tracking parameters, default ports or fragment, and with
+    YouTube's short and mobile forms rewritten to www.youtube.com/watch?v=.
+    Only rewrites that need no network request are done.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    netloc = parts.netloc.lower()
+    if netloc.endswith(_DEFAULT_PORTS.get(scheme, "\0")):
+        netloc = netloc[:-len(_DEFAULT_PORTS[scheme])]
+    path = parts.path
+    tracking = TRACKING_PARAMS | _SHARE_TRACKING_PARAMS if host in _SHARE_TRACKING_HOSTS else TRACKING_PARAMS
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in tracking]
+
+    if host == "youtu.be" and path.strip("/"):
+        query.insert(0, ("v", path.strip("/").split("/")[0]))
+        netloc, path = "www.youtube.com", "/watch"
+    elif host in _YOUTUBE_HOSTS:
+        netloc = "www.youtube.com"
+        query = [(k, v) for k, v in query if k not in _YOUTUBE_TRACKING_PARAMS]
+        if path.startswith(("/shorts/", "/live/")) and path.count("/") >= 2:
+            query.insert(0, ("v", path.split("/")[2]))
+            path = "/watch"
+    return normalize_url(urlunsplit((scheme, netloc, path, urlencode(query), "")))
+
+
+def _extractor_classes():
+    global _extractors
+    with _extractors_lock:
+        if _extractors is None:
+            from yt_dlp.extractor import gen_extractor_classes  # the whole extractor table
+            _extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic"]
+        return _extractors
+
+
+def match_extractor(url: str) -> Optional[Tuple[str, str]]:
+    """
+    (extractor key, id) of the first yt-dlp extractor that claims `url` and can tell its id from
+    the URL alone, without any network access. When the extractors that claim it can't (pages
+    whose id is only known after fetching them), the first one's key with `url` as the id.
+    """
+    claimed = None
+    for ie in _extractor_classes():
+        if ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            if video_id:
+                return ie.ie_key(), video_id
+            claimed = claimed or ie.ie_key()
+    return (claimed, url) if claimed else None
+
+
+@functools.lru_cache(maxsize=4096)
+def canonical_id(url: str) -> str:
+    """
+    'Extractor:id' for URLs a site extractor recognizes ('Extractor:<canonical url>' when
+    the id isn't in the URL), otherwise 'Generic:<canonical url>' like `Downloader.source_id`
+    uses for direct links.
+    """
+    url = canonical_url(url)
+    match = match_extractor(url)
+    if match is not None:
+        return f"{match[0]}:{match[1]}"
+    return f"Generic:{url}"
+
+
+def warm_up() -> None:
+    """Compile the extractors' URL patterns now, so the first real lookup is fast."""
+    match_extractor("https://example.invalid/")
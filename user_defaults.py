@@ -1,14 +1,25 @@
-from enum import Enum
+import os
+
 from Cocoa import NSUserDefaults
+from formats import DEFAULT_CODEC, OUTPUT_CODECS
+from models import Normalization  # lives in models so the engine can use it without Cocoa
+from naming import DEFAULT_TEMPLATE, validate_template
 
+NORMALIZATION_KEY = "NormalizationFrequency"
+NORMALIZATION_OPTIONS = [Normalization.OFF, Normalization.LOW, Normalization.MEDIUM, Normalization.HIGH]
 
-class Normalization(Enum):
-    LOW = "Low"
-    MEDIUM = "Medium"
-    HIGH = "High"
+OUTPUT_CODEC_KEY = "OutputCodec"
 
-NORMALIZATION_KEY = "NormalizationFrequency"
-NORMALIZATION_OPTIONS = [Normalization.LOW, Normalization.MEDIUM, Normalization.HIGH]
+MAX_CONCURRENT_DOWNLOADS_KEY = "MaxConcurrentDownloads"
+MAX_CONCURRENT_DOWNLOADS_OPTIONS = [1, 2, 4, 8, 16]
+
+FRAGMENT_CONCURRENCY_KEY = "FragmentConcurrency"
+FRAGMENT_CONCURRENCY_OPTIONS = [1, 2, 4, 8, 16]
+ADAPTIVE_FRAGMENTS_KEY = "AdaptiveFragmentConcurrency"
+
+SAVE_FOLDER_KEY = "SaveFolder"
+ASK_WHERE_TO_SAVE_KEY = "AskWhereToSave"
+FILE_NAME_TEMPLATE_KEY = "FileNameTemplate"
 
 class UserDefaults():
     @staticmethod
@@ -21,4 +32,80 @@ class UserDefaults():
     
     def setNormalization(self, normalization: str):
         defaults = NSUserDefaults.standardUserDefaults()
-        defaults.setObject_forKey_(normalization, NORMALIZATION_KEY)
\ No newline at end of file
+        defaults.setObject_forKey_(normalization, NORMALIZATION_KEY)
+
+    def getOutputCodec(self) -> str:
+        defaults = NSUserDefaults.standardUserDefaults()
+        codec = defaults.stringForKey_(OUTPUT_CODEC_KEY)
+        return codec if codec in OUTPUT_CODECS else DEFAULT_CODEC
+
+    def setOutputCodec(self, codec: str):
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setObject_forKey_(codec, OUTPUT_CODEC_KEY)
+
+    @staticmethod
+    def _getDefaultMaxConcurrentDownloads():
+        return 4
+
+    def getMaxConcurrentDownloads(self) -> int:
+        defaults = NSUserDefaults.standardUserDefaults()
+        return int(defaults.integerForKey_(MAX_CONCURRENT_DOWNLOADS_KEY)) or self._getDefaultMaxConcurrentDownloads()
+
+    def setMaxConcurrentDownloads(self, value: int):
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setInteger_forKey_(int(value), MAX_CONCURRENT_DOWNLOADS_KEY)
+
+    @staticmethod
+    def _getDefaultFragmentConcurrency():
+        return 4
+
+    def getFragmentConcurrency(self) -> int:
+        defaults = NSUserDefaults.standardUserDefaults()
+        return int(defaults.integerForKey_(FRAGMENT_CONCURRENCY_KEY)) or self._getDefaultFragmentConcurrency()
+
+    def setFragmentConcurrency(self, value: int):
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setInteger_forKey_(int(value), FRAGMENT_CONCURRENCY_KEY)
+
+    def getAdaptiveFragments(self) -> bool:
+        defaults = NSUserDefaults.standardUserDefaults()
+        if defaults.objectForKey_(ADAPTIVE_FRAGMENTS_KEY) is None:
+            return True
+        return bool(defaults.boolForKey_(ADAPTIVE_FRAGMENTS_KEY))
+
+    def setAdaptiveFragments(self, value: bool):
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setBool_forKey_(bool(value), ADAPTIVE_FRAGMENTS_KEY)
+
+    @staticmethod
+    def _getDefaultSaveFolder():
+        return os.path.expanduser("~/Downloads")
+
+    def getSaveFolder(self) -> str:
+        defaults = NSUserDefaults.standardUserDefaults()
+        return defaults.stringForKey_(SAVE_FOLDER_KEY) or self._getDefaultSaveFolder()
+
+    def setSaveFolder(self, path: str):
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setObject_forKey_(path, SAVE_FOLDER_KEY)
+
+    def getAskWhereToSave(self) -> bool:
+        defaults = NSUserDefaults.standardUserDefaults()
+        return bool(defaults.boolForKey_(ASK_WHERE_TO_SAVE_KEY))
+
+    def setAskWhereToSave(self, value: bool):
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setBool_forKey_(bool(value), ASK_WHERE_TO_SAVE_KEY)
+
+    def getFileNameTemplate(self) -> str:
+        defaults = NSUserDefaults.standardUserDefaults()
+        template = defaults.stringForKey_(FILE_NAME_TEMPLATE_KEY) or DEFAULT_TEMPLATE
+        try:
+            return validate_template(template)
+        except ValueError:
+            return DEFAULT_TEMPLATE
+
+    def setFileNameTemplate(self, template: str):
+        """Raises ValueError (and stores nothing) if the template is invalid."""
+        defaults = NSUserDefaults.standardUserDefaults()
+        defaults.setObject_forKey_(validate_template(template), FILE_NAME_TEMPLATE_KEY)